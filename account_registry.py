@@ -0,0 +1,58 @@
+# account_registry.py - Общий справочник счетов и валют для окон и диалогов
+
+from typing import List, Optional, Tuple
+from PyQt6 import QtCore
+import database as db
+
+
+class AccountRegistry(QtCore.QObject):
+    """Справочник счетов и валют, загружаемый из базы при первом обращении.
+
+    Диалоги добавления транзакции и счетов берут списки отсюда, поэтому их
+    открытие не выполняет запросов к базе (при работе через сервер API -
+    запросов HTTP). Справочник перечитывается после добавления счета и
+    загрузки курсов в этом окне, а также после фиксации изменений базы другим
+    клиентом: счета и курсы не попадают в журнал изменений, поэтому сигнал
+    changed выдается, только если перечитанные списки отличаются от прежних.
+    """
+
+    # Справочник перечитан и изменился
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._accounts: Optional[List[Tuple]] = None
+        self._currencies: List[str] = []
+
+    def reload(self) -> None:
+        """Повторное чтение справочника из базы (если он уже загружался)"""
+        if self._accounts is None:
+            return
+        accounts = db.get_all_accounts()
+        currencies = db.get_currencies()
+        if accounts == self._accounts and currencies == self._currencies:
+            return
+        self._accounts = accounts
+        self._currencies = currencies
+        self.changed.emit()
+
+    def _ensure_loaded(self) -> None:
+        if self._accounts is None:
+            self._accounts = db.get_all_accounts()
+            self._currencies = db.get_currencies()
+
+    def accounts(self) -> List[Tuple]:
+        """Счета: (id, name, currency)"""
+        self._ensure_loaded()
+        return self._accounts
+
+    def currencies(self) -> List[str]:
+        """Базовая валюта и валюты, для которых загружены курсы"""
+        self._ensure_loaded()
+        return self._currencies
+
+    def add(self, name: str, currency: str) -> int:
+        """Добавление счета; возвращает его ID"""
+        account_id = db.add_account(name, currency)
+        self.reload()
+        return account_id
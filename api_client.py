@@ -0,0 +1,162 @@
+# api_client.py - Работа приложения через сервер API вместо локального файла базы
+#
+# Запуск клиента: python main.py --server http://127.0.0.1:8765
+# (или переменная окружения FINANCE_SERVER; ключ доступа - --token или FINANCE_SERVER_TOKEN)
+
+import http.client
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote, urlsplit
+import database as db
+from api_server import READ_METHODS, TOKEN_HEADER, WRITE_METHODS
+
+# Функции database.py, которым нужен локальный файл базы
+SERVER_ONLY = ('iter_export_rows', 'open_connection', 'open_reader_connection', 'set_busy_timeout',
+               'set_journal_mode')
+# Ответов на чтение, хранимых для проверки по ETag
+CACHE_SIZE = 256
+# Аргументы длиннее этого передаются в теле POST, без кэширования по ETag
+MAX_QUERY_LENGTH = 2000
+
+_client: Optional["ApiClient"] = None
+
+
+def _plain(value):
+    """Аргументы в виде, пригодном для JSON: кортежи, множества и генераторы - списки"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return [_plain(item) for item in value]
+
+
+class ApiClient:
+    """Вызов функций database.py на сервере API.
+
+    Соединение HTTP держится открытым между запросами. Результаты чтения
+    запоминаются вместе с ETag: при неизменной базе сервер отвечает 304
+    и результат берется из кэша без передачи данных.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30, token: Optional[str] = None):
+        url = urlsplit(base_url)
+        if url.scheme != "http" or not url.hostname:
+            raise ValueError(f"Ожидается адрес вида http://host:port, получен {base_url}")
+        self._host = url.hostname
+        self._port = url.port or 80
+        self._timeout = timeout
+        self._token = token
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._lock = threading.Lock()
+        # путь запроса -> (ETag, результат)
+        self._cache: "OrderedDict[str, tuple[str, object]]" = OrderedDict()
+        self.not_modified = 0
+
+    def request(self, method: str, path: str, data=None, headers: Optional[dict] = None):
+        """Запрос к серверу: (код ответа, заголовки, разобранный JSON или None)"""
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8") if data is not None else None
+        headers = dict(headers or {})
+        if self._token:
+            headers[TOKEN_HEADER] = self._token
+        if body is not None:
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        with self._lock:
+            # Сервер мог закрыть простаивавшее соединение - один повтор с новым
+            for attempt in range(2):
+                if self._connection is None:
+                    self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+                try:
+                    self._connection.request(method, path, body, headers)
+                    response = self._connection.getresponse()
+                    payload = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    self._connection.close()
+                    self._connection = None
+                    if attempt:
+                        raise
+        result = json.loads(payload.decode("utf-8")) if payload else None
+        if response.status >= 400:
+            message = result.get('error') if isinstance(result, dict) else response.reason
+            raise RuntimeError(f"Сервер API: {message}")
+        return response.status, response.headers, result
+
+    def call(self, name: str, *args, **kwargs):
+        """Вызов функции database.py на сервере"""
+        args, kwargs = _plain(args), _plain(kwargs)
+        if name in READ_METHODS:
+            query = f"args={quote(json.dumps(args))}&kwargs={quote(json.dumps(kwargs))}"
+            if len(query) <= MAX_QUERY_LENGTH:
+                return self._cached_get(f"/api/rpc/{name}?{query}")
+        elif name not in WRITE_METHODS:
+            raise RuntimeError(f"Функция {name} недоступна через сервер API")
+        _, _, result = self.request("POST", f"/api/rpc/{name}", {'args': args, 'kwargs': kwargs})
+        return result['result']
+
+    def _cached_get(self, path: str):
+        cached = self._cache.get(path)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        status, response_headers, result = self.request("GET", path, headers=headers)
+        if status == http.client.NOT_MODIFIED and cached:
+            self.not_modified += 1
+            self._cache.move_to_end(path)
+            return cached[1]
+        result = result['result']
+        etag = response_headers.get("ETag")
+        if etag:
+            self._cache[path] = (etag, result)
+            self._cache.move_to_end(path)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def status(self) -> dict:
+        """Состояние сервера (заодно проверка, что он доступен)"""
+        return self.request("GET", "/api/status")[2]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def _remote(client: ApiClient, name: str):
+    def call(*args, **kwargs):
+        return client.call(name, *args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+def _unavailable(name: str):
+    def call(*args, **kwargs):
+        raise RuntimeError(f"{name}: недоступно при работе через сервер API")
+    call.__name__ = name
+    return call
+
+
+def install(base_url: str, token: Optional[str] = None) -> ApiClient:
+    """Перевод модуля database на работу через сервер.
+
+    Функции database.py, доступные на сервере, заменяются вызовами API, поэтому
+    остальной код приложения работает без изменений. initialize только проверяет
+    доступность сервера: файл базы открывает сервер.
+    """
+    global _client
+    client = ApiClient(base_url, token=token)
+    client.status()
+    for name in READ_METHODS | WRITE_METHODS:
+        setattr(db, name, _remote(client, name))
+    for name in SERVER_ONLY:
+        setattr(db, name, _unavailable(name))
+    db.initialize = lambda db_file=None: client.status()
+    db.close_connection = client.close
+    _client = client
+    return client
+
+
+def active() -> Optional[ApiClient]:
+    """Клиент, через который работает приложение, или None при работе с локальной базой"""
+    return _client
@@ -0,0 +1,632 @@
+# api_server.py - Локальный HTTP/JSON API над database.py (режим сервера без интерфейса)
+#
+# Запуск: python cli.py serve [--host 127.0.0.1] [--port 8765] [--readers 4] [--token ...]
+#
+# Все изменения выполняет один поток-писатель с единственным соединением
+# database.py; запросы на запись, пришедшие одновременно, собираются в пачки.
+# Чтение идет через пул отдельных соединений только для чтения (база
+# переводится в режим WAL, поэтому читатели не ждут писателя). Ответы на GET
+# помечаются ETag по версии данных SQLite: повторный запрос с If-None-Match
+# при неизменной базе получает 304 без выполнения запроса. Если сервер слушает
+# не только локальный адрес, каждый запрос должен нести общий ключ доступа в
+# заголовке X-Finance-Token: через /api/rpc доступны архивирование, сжатие и
+# удаление файлов архивов.
+
+import hmac
+import ipaddress
+import itertools
+import inspect
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import database as db
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Соединений только для чтения в пуле
+READER_COUNT = 4
+# Наибольшее число запросов на запись, выполняемых одной пачкой
+MAX_BATCH = 64
+# Сколько ответов на GET хранится в кэше сервера
+RESPONSE_CACHE_SIZE = 256
+# Сколько запрос на запись ждет своей очереди, секунд
+WRITE_TIMEOUT = 60
+# Заголовок с ключом доступа
+TOKEN_HEADER = "X-Finance-Token"
+
+# Функции database.py, доступные клиентам через /api/rpc.
+# Чтение выполняется пулом читателей, остальное - писателем (в том числе
+# остатки и поиск дубликатов: они дописывают контрольные точки и отпечатки)
+READ_METHODS = frozenset({
+    'count_duplicates', 'count_transactions', 'get_all_accounts', 'get_all_categories',
+    'get_all_transactions', 'get_archivable_years', 'get_archived_years', 'get_budget_status',
+    'get_budgets', 'get_category_breakdown', 'get_category_name', 'get_category_token_counts',
+    'get_changes_since', 'get_currencies', 'get_data_stamp', 'get_data_version', 'get_description_stats',
+    'get_first_change_seq', 'get_last_change_seq', 'get_monthly_income_expense', 'get_monthly_statistics',
+    'get_recurring_rules', 'get_report', 'get_storage_stats', 'get_transaction_fields', 'get_transactions_by_ids',
+    'get_transactions_for_period', 'iter_transactions',
+})
+WRITE_METHODS = frozenset({
+    'add_account', 'add_category', 'add_fx_rates', 'add_recurring_rule', 'add_transaction',
+    'add_transactions_bulk', 'analyze', 'apply_transaction_edits', 'archive_year', 'delete_budget',
+    'delete_recurring_rule', 'delete_transaction', 'find_duplicate_groups', 'get_account_ledger',
+    'get_balance', 'get_balances', 'incremental_vacuum', 'insert_recurring_transactions',
+    'merge_categories', 'rebuild_category_tokens', 'rebuild_category_totals', 'redo_edit',
+    'rename_category', 'set_budget', 'set_category_hidden', 'set_recurring_rule_active', 'unarchive_year', 'undo_edit',
+    'update_transaction_account', 'update_transaction_amount', 'update_transaction_category',
+    'update_transaction_date', 'update_transaction_description', 'update_transaction_receipt',
+    'vacuum_database',
+})
+
+# Поля транзакции в ответах /api/transactions (порядок столбцов iter_transactions)
+TRANSACTION_FIELDS = ('id', 'amount', 'category_id', 'date', 'description', 'receipt_path', 'currency')
+
+
+class ApiError(Exception):
+    """Ошибка запроса, которая возвращается клиенту с кодом HTTP"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def is_loopback(host: str) -> bool:
+    """Адрес доступен только с этого компьютера"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _materialize(result):
+    """Курсоры и итераторы читаются до конца, пока соединение еще занято запросом"""
+    if hasattr(result, 'fetchall'):
+        return result.fetchall()
+    # Генераторы и пустые итераторы (например, iter(()) при ошибке запроса)
+    if hasattr(result, '__next__'):
+        return list(result)
+    return result
+
+
+class ReaderPool:
+    """Пул соединений только для чтения.
+
+    Соединения открываются по мере надобности, не больше size одновременно.
+    Если писатель подключил или отключил архив, соединение со старым набором
+    архивов при следующей выдаче открывается заново.
+    """
+
+    def __init__(self, size: int = READER_COUNT):
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # (соединение, годы подключенных архивов)
+        self._idle: List[Tuple[sqlite3.Connection, Tuple[int, ...]]] = []
+
+    @contextmanager
+    def connection(self):
+        """Соединение для функций database.py в текущем потоке"""
+        self._slots.acquire()
+        try:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            archives = tuple(db.get_archived_years())
+            if entry is not None and entry[1] != archives:
+                entry[0].close()
+                entry = None
+            if entry is None:
+                entry = (db.open_reader_connection(), archives)
+            try:
+                with db.using_connection(entry[0]):
+                    yield entry[0]
+            finally:
+                with self._lock:
+                    self._idle.append(entry)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            for connection, _ in self._idle:
+                connection.close()
+            self._idle.clear()
+
+
+class ResponseCache:
+    """Готовые тела ответов на GET по ключу запроса; годятся, пока не изменилась версия данных"""
+
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE):
+        self._size = size
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, version: int, body: bytes) -> None:
+        with self._lock:
+            self._items[key] = (version, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self._size:
+                self._items.popitem(last=False)
+
+
+class _WriteJob:
+    """Запрос на запись в очереди писателя"""
+
+    __slots__ = ('name', 'func', 'args', 'kwargs', 'future')
+
+    def __init__(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class ApiServer:
+    """HTTP-сервер API: один писатель, пул читателей, ETag по версии данных"""
+
+    def __init__(self, db_file: str = "finance.db", host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 readers: int = READER_COUNT, verbose: bool = False, token: Optional[str] = None):
+        self.db_file = db_file
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        # Ключ доступа: без него сервер принимает запросы только с локального адреса,
+        # поэтому для остальных адресов ключ создается, если не указан
+        if token is None and not is_loopback(host):
+            token = secrets.token_urlsafe(24)
+        self.token = token
+        self.readers = ReaderPool(readers)
+        self.cache = ResponseCache()
+        # Счетчики писателя: выполнено запросов, пачек и запросов, объединенных с соседними
+        self.stats = {'writes': 0, 'batches': 0, 'merged': 0}
+        self._writes: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        # Версия данных читается отдельным соединением, которое само ничего не пишет:
+        # PRAGMA data_version меняется при каждой фиксации писателя и других программ
+        self._version_connection: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
+        # Случайная часть ETag: счетчик data_version начинается заново в каждом процессе
+        self._etag_prefix = os.urandom(4).hex()
+        self._httpd: Optional[_HttpServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._mergers: Dict[str, Callable[[List[_WriteJob]], None]] = {
+            'add_transaction': self._merge_add_transaction,
+            'apply_transaction_edits': self._merge_apply_edits,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # Запуск и остановка
+
+    def run(self) -> None:
+        """Работа сервера в текущем потоке, который становится писателем (до stop или Ctrl+C)"""
+        try:
+            db.initialize(self.db_file)
+            db.set_journal_mode("wal")
+            self._version_connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._httpd = _HttpServer((self.host, self.port), _Handler)
+            self._httpd.api = self
+            self.port = self._httpd.server_address[1]
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            raise
+        http_thread = threading.Thread(target=self._httpd.serve_forever, name="api-http", daemon=True)
+        http_thread.start()
+        self._ready.set()
+        try:
+            self._write_loop()
+        finally:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            # Запросы, не дождавшиеся писателя, завершаются ошибкой
+            while True:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.future.set_exception(ApiError(HTTPStatus.SERVICE_UNAVAILABLE, "Сервер остановлен"))
+            self.readers.close()
+            self._version_connection.close()
+            db.close_connection()
+
+    def start(self) -> None:
+        """Запуск сервера в фоновом потоке; возвращается, когда порт уже слушается"""
+        self._thread = threading.Thread(target=self._run_quietly, name="api-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _run_quietly(self) -> None:
+        try:
+            self.run()
+        except Exception as e:
+            if not self._ready.is_set():
+                self._error = e
+                self._ready.set()
+            else:
+                print(f"Ошибка сервера API: {e}")
+
+    def stop(self) -> None:
+        """Остановка сервера, запущенного start"""
+        self._writes.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Версия данных
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """Проверка ключа доступа из заголовка запроса"""
+        if not self.token:
+            return True
+        return token is not None and hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+    def data_version(self) -> int:
+        with self._version_lock:
+            return self._version_connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def etag(self, version: int) -> str:
+        return f'"{self._etag_prefix}-{version}"'
+
+    # Чтение
+
+    def read(self, func: Callable, *args, **kwargs):
+        """Выполнение функции database.py соединением из пула читателей"""
+        with self.readers.connection():
+            return _materialize(func(*args, **kwargs))
+
+    def call_read(self, name: str, args: list, kwargs: dict):
+        if name == 'get_data_version':
+            return self.data_version()
+        return self.read(getattr(db, name), *args, **kwargs)
+
+    # Запись
+
+    def write(self, name: str, func: Callable, *args, **kwargs):
+        """Выполнение изменения писателем; ждет завершения пачки, в которую попал запрос"""
+        job = _WriteJob(name, func, args, kwargs)
+        self._writes.put(job)
+        return job.future.result(WRITE_TIMEOUT)
+
+    def call_write(self, name: str, args: list, kwargs: dict):
+        return self.write(name, getattr(db, name), *args, **kwargs)
+
+    def _write_loop(self) -> None:
+        while True:
+            try:
+                job = self._writes.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if job is None:
+                return
+            # Все, что накопилось в очереди, пока выполнялась предыдущая пачка
+            batch = [job]
+            stopping = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    job = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._execute_batch(batch)
+            if stopping:
+                return
+
+    def _execute_batch(self, batch: List[_WriteJob]) -> None:
+        """Выполнение пачки в порядке поступления.
+
+        Подряд идущие добавления транзакций и записи правок объединяются в один
+        вызов (одна транзакция БД и одна синхронизация с диском). Если
+        объединенный вызов не удался, он целиком откатывается и запросы
+        выполняются по одному, чтобы ошибка одного клиента не затронула других.
+        """
+        self.stats['batches'] += 1
+        for name, group in itertools.groupby(batch, key=lambda job: job.name):
+            group = list(group)
+            self.stats['writes'] += len(group)
+            if len(group) > 1 and name in self._mergers:
+                try:
+                    self._mergers[name](group)
+                    self.stats['merged'] += len(group)
+                    continue
+                except Exception:
+                    pass
+            for job in group:
+                try:
+                    job.future.set_result(_materialize(job.func(*job.args, **job.kwargs)))
+                except Exception as e:
+                    job.future.set_exception(e)
+
+    def _merge_add_transaction(self, group: List[_WriteJob]) -> None:
+        signature = inspect.signature(db.add_transaction)
+        rows = []
+        for job in group:
+            arguments = signature.bind(*job.args, **job.kwargs)
+            arguments.apply_defaults()
+            rows.append(tuple(arguments.arguments.values()))
+        db.add_transactions_bulk(rows)
+        for job in group:
+            job.future.set_result(None)
+
+    def _merge_apply_edits(self, group: List[_WriteJob]) -> None:
+        edits = []
+        for job in group:
+            edits.extend(job.args[0] if job.args else job.kwargs['edits'])
+        db.apply_transaction_edits(edits)
+        for job in group:
+            job.future.set_result(None)
+
+    def patch_transaction(self, transaction_id: int, values: Dict[str, object]) -> bool:
+        """Изменение полей транзакции с записью в журнал правок (выполняется писателем)"""
+        old_values = db.get_transaction_fields(transaction_id, values)
+        if old_values is None:
+            return False
+        db.apply_transaction_edits([(transaction_id, field, old_values[field], value)
+                                    for field, value in values.items() if old_values[field] != value])
+        return True
+
+
+def _transaction_dict(row) -> Dict[str, object]:
+    return dict(zip(TRANSACTION_FIELDS, row))
+
+
+def _transaction_row(item) -> Tuple:
+    """Строка для add_transactions_bulk из объекта или списка JSON"""
+    if isinstance(item, (list, tuple)):
+        if len(item) != 7:
+            raise ApiError(HTTPStatus.BAD_REQUEST,
+                           "Строка транзакции: amount, category_id, date, description, receipt_path, "
+                           "currency, account_id")
+        return tuple(item)
+    if not isinstance(item, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Транзакция должна быть объектом JSON")
+    try:
+        return (float(item['amount']), int(item['category_id']), str(item['date']),
+                item.get('description') or "", item.get('receipt_path'),
+                item.get('currency') or db.BASE_CURRENCY,
+                int(item.get('account_id') or db.DEFAULT_ACCOUNT_ID))
+    except KeyError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Не указано поле {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Неверное значение поля: {e}")
+
+
+class _HttpServer(ThreadingHTTPServer):
+    """Сервер с потоком на соединение и длинной очередью подключений для одновременных клиентов"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Разбор запросов HTTP; работа с базой - через ApiServer"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FinanceManagerAPI/1.0"
+
+    @property
+    def api(self) -> ApiServer:
+        return self.server.api
+
+    def log_message(self, format, *args) -> None:
+        if self.api.verbose:
+            super().log_message(format, *args)
+
+    # Ответы
+
+    def _send(self, status: HTTPStatus, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body or status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json(self, status: HTTPStatus, data) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _send_cached(self, producer: Callable) -> None:
+        """Ответ на GET с ETag по версии данных.
+
+        Версия читается до выполнения запроса, поэтому данные ответа не старше
+        своего ETag: если запись успела пройти между ними, следующий запрос
+        просто получит новые данные еще раз.
+        """
+        version = self.api.data_version()
+        etag = self.api.etag(version)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self.headers.get("If-None-Match") == etag:
+            self._send(HTTPStatus.NOT_MODIFIED, headers=headers)
+            return
+        body = self.api.cache.get(self.path, version)
+        if body is None:
+            body = json.dumps(producer(), ensure_ascii=False).encode("utf-8")
+            self.api.cache.put(self.path, version, body)
+        self._send(HTTPStatus.OK, body, headers)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Неверный JSON: {e}")
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        try:
+            if not self.api.authorized(self.headers.get(TOKEN_HEADER)):
+                # Тело запроса не читается, поэтому соединение после ответа закрывается
+                self.close_connection = True
+                raise ApiError(HTTPStatus.UNAUTHORIZED, f"Неверный ключ доступа ({TOKEN_HEADER})")
+            if len(parts) < 2 or parts[0] != "api":
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Неизвестный путь {url.path}")
+            route = getattr(self, f"_{method.lower()}_{parts[1]}", None)
+            if route is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Неизвестный путь {url.path}")
+            route(parts[2:], query)
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except (TypeError, ValueError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+    # Маршруты: _<метод>_<первая часть пути после /api/>
+
+    def _get_status(self, rest, query) -> None:
+        api = self.api
+        self._send_json(HTTPStatus.OK, {
+            'version': api.data_version(),
+            'cache': {'hits': api.cache.hits, 'misses': api.cache.misses},
+            'writer': dict(api.stats),
+        })
+
+    def _get_transactions(self, rest, query) -> None:
+        def first(name):
+            return query.get(name, [None])[0]
+
+        categories = [int(value) for value in query.get('category', [])]
+        limit = first('limit')
+        self._send_cached(lambda: [_transaction_dict(row) for row in self.api.read(
+            db.iter_transactions, first('start'), first('end'), categories or None,
+            limit=int(limit) if limit else None, include_archive=first('archive') == "1")])
+
+    def _get_categories(self, rest, query) -> None:
+        self._send_cached(lambda: [
+            {'id': cat_id, 'name': name, 'type': category_type, 'hidden': bool(hidden)}
+            for cat_id, name, category_type, hidden in self.api.read(db.get_all_categories)
+        ])
+
+    def _get_accounts(self, rest, query) -> None:
+        self._send_cached(lambda: [
+            {'id': account_id, 'name': name, 'currency': currency}
+            for account_id, name, currency in self.api.read(db.get_all_accounts)
+        ])
+
+    def _get_statistics(self, rest, query) -> None:
+        if rest == ["categories"]:
+            start = query.get('start', ["0000-01-01"])[0]
+            end = query.get('end', ["9999-12-31"])[0]
+            self._send_cached(lambda: [
+                {'category_id': cat_id, 'name': name, 'total': total}
+                for cat_id, name, total in self.api.read(db.get_category_breakdown, start, end)
+            ])
+        elif not rest:
+            self._send_cached(lambda: [
+                {'year': year, 'month': month, 'total': total}
+                for year, month, total in self.api.read(db.get_monthly_statistics)
+            ])
+        else:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Неизвестная статистика")
+
+    def _post_transactions(self, rest, query) -> None:
+        data = self._read_json()
+        items = data if isinstance(data, list) else [data]
+        rows = [_transaction_row(item) for item in items]
+        if len(rows) == 1:
+            # Одиночные добавления разных клиентов объединяются писателем в пачки
+            self.api.write('add_transaction', db.add_transaction, *rows[0])
+        else:
+            self.api.write('add_transactions_bulk', db.add_transactions_bulk, rows)
+        self._send_json(HTTPStatus.CREATED, {'inserted': len(rows)})
+
+    def _post_import(self, rest, query) -> None:
+        data = self._read_json()
+        if not isinstance(data, dict) or not isinstance(data.get('rows'), list):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Ожидается объект {\"rows\": [...]}")
+        rows = [_transaction_row(item) for item in data['rows']]
+        inserted, duplicates = self.api.write('add_transactions_bulk', db.add_transactions_bulk,
+                                              rows, bool(data.get('skip_duplicates', True)))
+        self._send_json(HTTPStatus.OK, {'inserted': inserted, 'duplicates': duplicates})
+
+    def _transaction_id(self, rest) -> int:
+        if len(rest) != 1 or not rest[0].isdigit():
+            raise ApiError(HTTPStatus.NOT_FOUND, "Ожидается /api/transactions/<id>")
+        return int(rest[0])
+
+    def _patch_transactions(self, rest, query) -> None:
+        transaction_id = self._transaction_id(rest)
+        values = self._read_json()
+        if not isinstance(values, dict) or not values:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Ожидается объект с новыми значениями полей")
+        if not self.api.write('patch_transaction', self.api.patch_transaction, transaction_id, values):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Транзакция {transaction_id} не найдена")
+        self._send_json(HTTPStatus.OK, {'id': transaction_id})
+
+    def _delete_transactions(self, rest, query) -> None:
+        transaction_id = self._transaction_id(rest)
+        self.api.write('delete_transaction', db.delete_transaction, transaction_id)
+        self._send_json(HTTPStatus.OK, {'id': transaction_id})
+
+    def _get_rpc(self, rest, query) -> None:
+        name = self._rpc_name(rest, READ_METHODS)
+        args = json.loads(query.get('args', ["[]"])[0])
+        kwargs = json.loads(query.get('kwargs', ["{}"])[0])
+        self._send_cached(lambda: {'result': self.api.call_read(name, args, kwargs)})
+
+    def _post_rpc(self, rest, query) -> None:
+        name = self._rpc_name(rest, READ_METHODS | WRITE_METHODS)
+        data = self._read_json()
+        args, kwargs = data.get('args', []), data.get('kwargs', {})
+        if name in READ_METHODS:
+            # Чтение с большими аргументами (длинный список ID), без ETag
+            result = self.api.call_read(name, args, kwargs)
+        else:
+            result = self.api.call_write(name, args, kwargs)
+        self._send_json(HTTPStatus.OK, {'result': result})
+
+    def _rpc_name(self, rest, allowed) -> str:
+        if len(rest) != 1 or rest[0] not in allowed:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Функция {'/'.join(rest)} недоступна")
+        return rest[0]
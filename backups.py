@@ -0,0 +1,742 @@
+# backups.py - Автоматические сжатые резервные копии с хранением по расписанию
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from PyQt6 import QtCore
+import database as db
+
+# Как часто создавать копию
+BACKUP_INTERVAL = timedelta(hours=24)
+# Полная копия создается не реже этого срока; между ними - разностные копии
+FULL_INTERVAL = timedelta(days=30)
+# Если изменилась большая доля страниц, разностная копия теряет смысл
+MAX_DELTA_SHARE = 0.5
+# Уровень сжатия lzma: в разы быстрее уровня по умолчанию, копия больше на несколько процентов
+LZMA_PRESET = 1
+
+# Сжатие (расширение файла): xz - меньше, gz - быстрее
+COMPRESSIONS = ('xz', 'gz')
+
+CATALOG_FILE = "catalog.json"
+DELTA_MAGIC = b"FMDELTA1"
+# Размер отпечатка страницы: вероятность пропустить изменившуюся страницу пренебрежимо мала
+PAGE_DIGEST_SIZE = 16
+# Поля заголовка базы, которые меняются без изменения данных (счетчик изменений,
+# номер версии SQLite): при сравнении страниц не учитываются
+_VOLATILE_HEADER = ((24, 28), (92, 100))
+
+
+class BackupEntry(NamedTuple):
+    """Резервная копия в каталоге"""
+    name: str
+    created: str
+    # 'full' - сжатая копия файла, 'delta' - измененные страницы относительно полной копии base
+    kind: str
+    base: Optional[str]
+    compression: str
+    page_size: int
+    pages: int
+    # Размер исходной базы и занятое копией место на диске
+    size: int
+    stored: int
+    # Отпечаток содержимого: по нему проверяется восстановление и находятся повторы
+    digest: str
+    # Копии архивных баз, снятые вместе с основной: год -> копия в каталоге архива
+    # (копия неизменившегося архива общая для нескольких копий основной базы)
+    archives: Optional[Dict[str, str]] = None
+
+    def file_name(self) -> str:
+        return f"{self.name}.{'db' if self.kind == 'full' else 'delta'}.{self.compression}"
+
+
+class RetentionPolicy(NamedTuple):
+    """Сколько последних дней, недель и месяцев хранить по одной копии"""
+    daily: int = 7
+    weekly: int = 4
+    monthly: int = 12
+
+
+class BackupReport(NamedTuple):
+    """Результат планового копирования: новая копия (None, если данные не менялись),
+    прошла ли она проверку и удаленные по сроку хранения копии"""
+    entry: Optional[BackupEntry]
+    verified: bool
+    removed: List[str]
+
+
+def backup_dir(db_file: Optional[str] = None) -> Optional[str]:
+    """Каталог копий рядом с файлом базы (None при работе через сервер API)"""
+    db_file = db_file or db.get_database_file()
+    if db_file is None:
+        return None
+    base, _ = os.path.splitext(db_file)
+    return f"{base}_backups"
+
+
+def archive_dir(directory: str, year) -> str:
+    """Каталог копий архивной базы года внутри каталога копий"""
+    return os.path.join(directory, f"archive_{year}")
+
+
+def load_catalog(directory: str) -> List[BackupEntry]:
+    """Копии каталога от старых к новым"""
+    try:
+        with open(os.path.join(directory, CATALOG_FILE), encoding="utf-8") as file:
+            return [BackupEntry(**item) for item in json.load(file)]
+    except FileNotFoundError:
+        return []
+
+
+def _save_catalog(directory: str, entries: List[BackupEntry]) -> None:
+    """Атомарная запись каталога: прерванная запись не портит прежний"""
+    path = os.path.join(directory, CATALOG_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump([entry._asdict() for entry in entries], file, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _open_compressed(path: str, mode: str, compression: str):
+    if compression == 'xz':
+        return lzma.open(path, mode, preset=LZMA_PRESET if 'w' in mode else None)
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def _read_page_size(path: str) -> int:
+    """Размер страницы из заголовка файла SQLite"""
+    with open(path, "rb") as file:
+        header = file.read(100)
+    if not header.startswith(b"SQLite format 3\x00"):
+        raise ValueError(f"{path} не является базой SQLite")
+    page_size = struct.unpack(">H", header[16:18])[0]
+    return 65536 if page_size == 1 else page_size
+
+
+def _iter_pages(file, page_size: int) -> Iterator[bytes]:
+    while True:
+        page = file.read(page_size)
+        if not page:
+            return
+        yield page
+
+
+def _page_digest(number: int, page: bytes) -> bytes:
+    if number == 0:
+        page = bytearray(page)
+        for start, end in _VOLATILE_HEADER:
+            page[start:end] = bytes(end - start)
+    return hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest()
+
+
+def _page_digests(path: str, page_size: int) -> List[bytes]:
+    with open(path, "rb") as file:
+        return [_page_digest(number, page) for number, page in enumerate(_iter_pages(file, page_size))]
+
+
+def _content_digest(page_digests: List[bytes]) -> str:
+    return hashlib.sha256(b"".join(page_digests)).hexdigest()
+
+
+def take_snapshot(path: str) -> Dict[Optional[str], str]:
+    """Согласованная копия основной базы и архивов средствами SQLite (backup API).
+
+    Основная база копируется в path, архив каждого года - в path с суффиксом
+    года. Все базы копируются отдельным соединением в одной читающей
+    транзакции, поэтому копии соответствуют одному моменту: в режиме WAL
+    приложение продолжает писать, в копию его изменения не попадают.
+    Возвращает файлы копий: None - основная база, год строкой - архив.
+    """
+    source = db.open_connection(read_only=True)
+    paths: Dict[Optional[str], str] = {}
+    try:
+        # Первое чтение каждой базы открывает в ней читающую транзакцию до конца копирования
+        source.execute("BEGIN")
+        files = {os.path.basename(file): name
+                 for _, name, file in source.execute("PRAGMA database_list").fetchall() if file}
+        for name in files.values():
+            source.execute(f"SELECT COUNT(*) FROM {name}.sqlite_master").fetchone()
+        schemas = {None: 'main'}
+        for year, archive in source.execute("SELECT year, path FROM main.archives").fetchall():
+            if archive in files:
+                schemas[str(year)] = files[archive]
+        for key, schema in schemas.items():
+            paths[key] = path if key is None else f"{path}.{key}"
+            target = sqlite3.connect(paths[key])
+            try:
+                source.backup(target, name=schema)
+            finally:
+                target.close()
+        return paths
+    except BaseException:
+        for snapshot in paths.values():
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+        raise
+    finally:
+        source.close()
+
+
+def _hashes_path(directory: str, name: str) -> str:
+    """Отпечатки страниц полной копии: по ним строятся разностные копии"""
+    return os.path.join(directory, f"{name}.pages")
+
+
+def _write_full(directory: str, entry_name: str, snapshot: str, compression: str) -> None:
+    path = os.path.join(directory, f"{entry_name}.db.{compression}")
+    with open(snapshot, "rb") as source, _open_compressed(path + ".tmp", "wb", compression) as target:
+        while True:
+            chunk = source.read(1 << 20)
+            if not chunk:
+                break
+            target.write(chunk)
+    os.replace(path + ".tmp", path)
+
+
+def _write_delta(directory: str, entry_name: str, snapshot: str, compression: str,
+                 page_size: int, changed: List[int], pages: int) -> None:
+    """Файл изменений: заголовок (размер страницы, число страниц), затем пары (номер, страница)"""
+    path = os.path.join(directory, f"{entry_name}.delta.{compression}")
+    with open(snapshot, "rb") as source, _open_compressed(path + ".tmp", "wb", compression) as target:
+        target.write(DELTA_MAGIC + struct.pack(">II", page_size, pages))
+        for number in changed:
+            source.seek(number * page_size)
+            target.write(struct.pack(">I", number) + source.read(page_size))
+    os.replace(path + ".tmp", path)
+
+
+def _find_entry(entries: List[BackupEntry], name: str) -> BackupEntry:
+    for entry in entries:
+        if entry.name == name:
+            return entry
+    raise ValueError(f"Резервная копия не найдена: {name}")
+
+
+def _store_file(directory: str, name: str, snapshot: str, compression: str, full: bool,
+                now: datetime, archives: Optional[Dict[str, str]] = None) -> Optional[BackupEntry]:
+    """Сохранение снимка одной базы в каталог копий directory.
+
+    Снимок сравнивается постранично с последней полной копией каталога: если
+    изменилось не больше MAX_DELTA_SHARE страниц и полная копия не старше
+    FULL_INTERVAL, сохраняются только измененные страницы. Если содержимое
+    (и набор копий архивов) совпадает с последней копией, новая не создается
+    и возвращается None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    entries = load_catalog(directory)
+    page_size = _read_page_size(snapshot)
+    digests = _page_digests(snapshot, page_size)
+    digest = _content_digest(digests)
+    if entries and entries[-1].digest == digest and entries[-1].archives == archives and not full:
+        return None
+
+    base = None
+    if not full:
+        bases = [entry for entry in entries if entry.kind == 'full' and entry.compression == compression
+                 and entry.page_size == page_size]
+        if bases and now - datetime.fromisoformat(bases[-1].created) < FULL_INTERVAL:
+            base = bases[-1]
+
+    changed = None
+    if base is not None:
+        with open(_hashes_path(directory, base.name), "rb") as file:
+            base_hashes = file.read()
+        changed = [number for number, page_hash in enumerate(digests)
+                   if base_hashes[number * PAGE_DIGEST_SIZE:(number + 1) * PAGE_DIGEST_SIZE] != page_hash]
+        if len(changed) > len(digests) * MAX_DELTA_SHARE:
+            base = changed = None
+
+    if base is None:
+        _write_full(directory, name, snapshot, compression)
+        with open(_hashes_path(directory, name), "wb") as file:
+            file.write(b"".join(digests))
+    else:
+        _write_delta(directory, name, snapshot, compression, page_size, changed, len(digests))
+
+    entry = BackupEntry(name, now.isoformat(timespec="seconds"), 'delta' if base else 'full',
+                        base.name if base else None, compression, page_size, len(digests),
+                        os.path.getsize(snapshot), 0, digest, archives)
+    stored = os.path.getsize(os.path.join(directory, entry.file_name()))
+    if base is None:
+        stored += os.path.getsize(_hashes_path(directory, name))
+    entry = entry._replace(stored=stored)
+    _save_catalog(directory, entries + [entry])
+    return entry
+
+
+def create_backup(directory: Optional[str] = None, compression: str = 'xz', full: bool = False,
+                  now: Optional[datetime] = None) -> Optional[BackupEntry]:
+    """Новая резервная копия основной базы и архивов.
+
+    Каждая база хранится в своем каталоге копий (архивы - в archive_<год>) со
+    своими полными и разностными копиями; копия основной базы ссылается на
+    копии архивов того же момента. Неизменившийся архив повторно не
+    сохраняется. Если не изменилось ничего, новая копия не создается и
+    возвращается None.
+    """
+    directory = directory or backup_dir()
+    if directory is None:
+        raise RuntimeError("Резервное копирование доступно только при прямой работе с файлом базы")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Неизвестное сжатие: {compression}")
+    os.makedirs(directory, exist_ok=True)
+    now = now or datetime.now()
+    entries = load_catalog(directory)
+    # Имя не должно совпасть и с копией архива, оставшейся от прерванного копирования
+    names = {entry.name for entry in entries}
+    for year in _archive_years(directory):
+        names.update(part.name for part in load_catalog(archive_dir(directory, year)))
+    name = f"backup-{now:%Y%m%d-%H%M%S}"
+    if name in names:
+        name += f"-{len(names)}"
+
+    snapshots = take_snapshot(os.path.join(directory, f"{name}.snapshot.tmp"))
+    try:
+        archives = {}
+        for year, snapshot in snapshots.items():
+            if year is None:
+                continue
+            part_dir = archive_dir(directory, year)
+            part = _store_file(part_dir, name, snapshot, compression, full, now)
+            archives[year] = part.name if part else load_catalog(part_dir)[-1].name
+        return _store_file(directory, name, snapshots[None], compression, full, now, archives or None)
+    finally:
+        for snapshot in snapshots.values():
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+
+def _restore_file(directory: str, name: str, target_path: str) -> None:
+    """Восстановление копии одной базы из каталога directory в файл target_path"""
+    entries = load_catalog(directory)
+    entry = _find_entry(entries, name)
+    full = entry if entry.kind == 'full' else _find_entry(entries, entry.base)
+    temp_path = target_path + ".restore.tmp"
+    try:
+        with _open_compressed(os.path.join(directory, full.file_name()), "rb", full.compression) as source, \
+                open(temp_path, "wb") as target:
+            while True:
+                chunk = source.read(1 << 20)
+                if not chunk:
+                    break
+                target.write(chunk)
+        if entry.kind == 'delta':
+            _apply_delta(os.path.join(directory, entry.file_name()), entry, temp_path)
+        os.replace(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def restore_backup(name: str, target_path: str, directory: Optional[str] = None) -> None:
+    """Восстановление копии в файл target_path (существующий файл заменяется).
+
+    Архивы восстанавливаются рядом с ним под именами, которые дает
+    database.archive_path, и таблица archives восстановленной базы
+    указывает на них, а не на архивы исходной базы.
+    """
+    directory = directory or backup_dir()
+    entry = _find_entry(load_catalog(directory), name)
+    archives = entry.archives or {}
+    for year, part_name in archives.items():
+        _restore_file(archive_dir(directory, year), part_name, db.archive_path(target_path, int(year)))
+    _restore_file(directory, name, target_path)
+    _point_archives(target_path, target_path, [int(year) for year in archives])
+
+
+def _point_archives(path: str, db_file: str, years: List[int]) -> None:
+    """Таблица archives базы path ссылается на архивы, лежащие рядом с db_file
+    под именами database.archive_path (path - этот же файл или его временная копия)"""
+    if not years:
+        return
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.executemany("UPDATE archives SET path = ? WHERE year = ?",
+                                   [(os.path.basename(db.archive_path(db_file, year)), year) for year in years])
+    finally:
+        connection.close()
+
+
+def _read_archives(path: str) -> List[Tuple[int, str]]:
+    """Архивы базы path: (год, файл рядом с базой); в базе без архивов - пустой список"""
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT year, path FROM archives ORDER BY year").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        connection.close()
+
+
+def _copy_database_file(source_path: str, target_path: str) -> None:
+    """Копия файла базы средствами SQLite: с изменениями из его журнала WAL"""
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def copy_database(target_path: str) -> List[int]:
+    """Согласованная копия открытой базы и ее архивов в файл target_path.
+
+    Архивы копируются рядом с target_path под именами database.archive_path,
+    и копия ссылается на них: ее можно открыть как обычную базу или
+    восстановить через restore_copy. Возвращает годы скопированных архивов.
+    """
+    snapshots = take_snapshot(target_path + ".copy.tmp")
+    try:
+        years = sorted(int(year) for year in snapshots if year is not None)
+        _point_archives(snapshots[None], target_path, years)
+        for year in years:
+            os.replace(snapshots[str(year)], db.archive_path(target_path, year))
+        os.replace(snapshots[None], target_path)
+        return years
+    finally:
+        for snapshot in snapshots.values():
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+
+def restore_copy(source_path: str, db_file: str) -> List[int]:
+    """Замена базы db_file и ее архивов копией source_path.
+
+    Архивы копии ищутся по ее таблице archives рядом с ней. Все файлы сначала
+    копируются во временные рядом с db_file, затем прежние файлы базы и
+    архивов отодвигаются и заменяются новыми; при ошибке прежние возвращаются.
+    Архивы прежней базы, которых нет в копии, удаляются: иначе повторный
+    перенос года в архив дописал бы строки в устаревший файл.
+    Все соединения с db_file должны быть закрыты. Возвращает годы архивов копии.
+    """
+    db_file = os.path.abspath(db_file)
+    source_dir = os.path.dirname(os.path.abspath(source_path))
+    directory = os.path.dirname(db_file)
+    source_archives = _read_archives(source_path)
+    current = [os.path.join(directory, path) for _, path in _read_archives(db_file)] \
+        if os.path.exists(db_file) else []
+    # Открытый журнал WAL означает, что базой еще пользуется другое соединение
+    for path in [db_file] + current:
+        if os.path.exists(path + "-wal"):
+            raise RuntimeError(f"{path} используется другим процессом: журнал WAL не закрыт")
+
+    staged: Dict[str, str] = {}
+    try:
+        staged[db_file] = db_file + ".restore.tmp"
+        _copy_database_file(source_path, staged[db_file])
+        for year, path in source_archives:
+            archive_source = os.path.join(source_dir, path)
+            if not os.path.exists(archive_source):
+                raise FileNotFoundError(f"Не найден архив {year} года: {archive_source}")
+            target = db.archive_path(db_file, year)
+            staged[target] = target + ".restore.tmp"
+            _copy_database_file(archive_source, staged[target])
+        _point_archives(staged[db_file], db_file, [year for year, _ in source_archives])
+
+        moved = []
+        placed = []
+        try:
+            for path in dict.fromkeys(current + list(staged)):
+                if os.path.exists(path):
+                    os.replace(path, path + ".restore.old")
+                    moved.append(path)
+            for path, temp_path in staged.items():
+                os.replace(temp_path, path)
+                placed.append(path)
+        except OSError:
+            for path in placed:
+                os.remove(path)
+            for path in moved:
+                os.replace(path + ".restore.old", path)
+            raise
+        for path in moved:
+            os.remove(path + ".restore.old")
+        return [year for year, _ in source_archives]
+    finally:
+        for temp_path in staged.values():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def _apply_delta(delta_path: str, entry: BackupEntry, target_path: str) -> None:
+    record = entry.page_size + 4
+    with _open_compressed(delta_path, "rb", entry.compression) as source, open(target_path, "r+b") as target:
+        header = source.read(len(DELTA_MAGIC) + 8)
+        if not header.startswith(DELTA_MAGIC):
+            raise ValueError(f"Поврежден файл изменений {delta_path}")
+        page_size, pages = struct.unpack(">II", header[len(DELTA_MAGIC):])
+        while True:
+            data = source.read(record)
+            if not data:
+                break
+            if len(data) != record:
+                raise ValueError(f"Файл изменений {delta_path} оборван")
+            number = struct.unpack(">I", data[:4])[0]
+            target.seek(number * page_size)
+            target.write(data[4:])
+        target.truncate(pages * page_size)
+
+
+def _verify_file(directory: str, name: str) -> Tuple[bool, str]:
+    """Проверка копии одной базы восстановлением во временный файл"""
+    temp_path = os.path.join(directory, f"{name}.verify.tmp")
+    try:
+        entry = _find_entry(load_catalog(directory), name)
+        _restore_file(directory, name, temp_path)
+        digest = _content_digest(_page_digests(temp_path, entry.page_size))
+        if digest != entry.digest:
+            return False, "содержимое не совпадает с исходной базой"
+        connection = sqlite3.connect(f"file:{temp_path}?mode=ro", uri=True)
+        try:
+            result = connection.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            connection.close()
+        return result == "ok", result
+    except (OSError, ValueError, EOFError, lzma.LZMAError, sqlite3.Error) as e:
+        return False, str(e)
+    finally:
+        for path in (temp_path, temp_path + "-wal", temp_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def verify_backup(name: str, directory: Optional[str] = None) -> Tuple[bool, str]:
+    """Проверка копии восстановлением во временный файл.
+
+    Восстановленная база и каждый архив копии должны совпасть с исходными
+    постранично (по отпечатку содержимого) и пройти PRAGMA integrity_check.
+    Возвращает (успех, пояснение).
+    """
+    directory = directory or backup_dir()
+    entry = _find_entry(load_catalog(directory), name)
+    ok, message = _verify_file(directory, name)
+    if not ok:
+        return ok, message
+    for year, part_name in (entry.archives or {}).items():
+        ok, message = _verify_file(archive_dir(directory, year), part_name)
+        if not ok:
+            return ok, f"архив {year} года: {message}"
+    return True, message
+
+
+def select_retained(entries: List[BackupEntry], policy: RetentionPolicy) -> List[BackupEntry]:
+    """Копии, которые остаются по правилу хранения.
+
+    Для каждого из последних policy.daily дней, policy.weekly недель и
+    policy.monthly месяцев остается самая новая копия этого периода. Самая
+    новая копия и полные копии, на которые ссылаются оставшиеся разностные,
+    сохраняются всегда.
+    """
+    created = {entry.name: datetime.fromisoformat(entry.created) for entry in entries}
+    periods = [
+        (policy.daily, lambda moment: moment.date()),
+        (policy.weekly, lambda moment: moment.isocalendar()[:2]),
+        (policy.monthly, lambda moment: (moment.year, moment.month)),
+    ]
+    keep = set()
+    newest_first = sorted(entries, key=lambda entry: created[entry.name], reverse=True)
+    if newest_first:
+        keep.add(newest_first[0].name)
+    for count, period_of in periods:
+        seen = []
+        for entry in newest_first:
+            period = period_of(created[entry.name])
+            if period in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.append(period)
+            keep.add(entry.name)
+    keep |= {entry.base for entry in entries if entry.name in keep and entry.kind == 'delta'}
+    return [entry for entry in entries if entry.name in keep]
+
+
+def _remove_files(directory: str, entry: BackupEntry) -> None:
+    for path in (os.path.join(directory, entry.file_name()), _hashes_path(directory, entry.name)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _discard_entry(directory: str, name: str) -> None:
+    """Удаление копии из каталога и ее файлов"""
+    entries = load_catalog(directory)
+    _save_catalog(directory, [entry for entry in entries if entry.name != name])
+    _remove_files(directory, _find_entry(entries, name))
+
+
+def _archive_years(directory: str) -> List[str]:
+    """Годы, для которых в каталоге копий есть копии архивов"""
+    if not os.path.isdir(directory):
+        return []
+    return [name[len("archive_"):] for name in sorted(os.listdir(directory))
+            if name.startswith("archive_") and os.path.isdir(os.path.join(directory, name))]
+
+
+def _prune_archives(directory: str, retained: List[BackupEntry]) -> None:
+    """Удаление копий архивов, на которые не ссылается ни одна оставшаяся копия"""
+    for year in _archive_years(directory):
+        part_dir = archive_dir(directory, year)
+        parts = load_catalog(part_dir)
+        keep = {entry.archives[year] for entry in retained if entry.archives and year in entry.archives}
+        keep |= {part.base for part in parts if part.name in keep and part.kind == 'delta'}
+        removed = [part for part in parts if part.name not in keep]
+        if not removed:
+            continue
+        _save_catalog(part_dir, [part for part in parts if part.name in keep])
+        for part in removed:
+            _remove_files(part_dir, part)
+
+
+def prune_backups(policy: RetentionPolicy, directory: Optional[str] = None) -> List[str]:
+    """Удаление копий, не попавших в правило хранения; возвращает их имена"""
+    directory = directory or backup_dir()
+    entries = load_catalog(directory)
+    retained = select_retained(entries, policy)
+    removed = [entry for entry in entries if entry not in retained]
+    if removed:
+        # Сначала каталог: оборванное удаление оставит лишние файлы, но не ссылки на пропавшие
+        _save_catalog(directory, retained)
+        for entry in removed:
+            _remove_files(directory, entry)
+    # Копии архивов удаляются после копий основной базы, которые на них ссылаются
+    _prune_archives(directory, retained)
+    return [entry.name for entry in removed]
+
+
+def is_due(directory: Optional[str] = None, interval: timedelta = BACKUP_INTERVAL,
+           now: Optional[datetime] = None) -> bool:
+    """Пора ли делать плановую копию"""
+    entries = load_catalog(directory or backup_dir())
+    if not entries:
+        return True
+    return (now or datetime.now()) - datetime.fromisoformat(entries[-1].created) >= interval
+
+
+def run_backup(directory: Optional[str] = None, policy: RetentionPolicy = RetentionPolicy(),
+               compression: str = 'xz', full: bool = False) -> BackupReport:
+    """Плановое копирование: новая копия, ее проверка и удаление устаревших копий.
+
+    Копия, не прошедшая проверку, удаляется из каталога вместе с созданными
+    для нее копиями архивов, чтобы следующие разностные копии не строились на ней.
+    """
+    directory = directory or backup_dir()
+    entry = create_backup(directory, compression, full)
+    verified = True
+    if entry is not None:
+        verified, message = verify_backup(entry.name, directory)
+        if not verified:
+            print(f"Резервная копия {entry.name} не прошла проверку: {message}")
+            _discard_entry(directory, entry.name)
+            # Копии архивов, созданные вместе с ней, тоже
+            for year, part_name in (entry.archives or {}).items():
+                if part_name == entry.name:
+                    _discard_entry(archive_dir(directory, year), part_name)
+    removed = prune_backups(policy, directory)
+    return BackupReport(entry, verified, removed)
+
+
+def backup_stats(directory: Optional[str] = None) -> Dict[str, int]:
+    """Число копий, суммарный размер исходных баз (с архивами) и занятое копиями место"""
+    directory = directory or backup_dir()
+    entries = load_catalog(directory)
+    size = sum(entry.size for entry in entries)
+    stored = sum(entry.stored for entry in entries)
+    for year in _archive_years(directory):
+        parts = {part.name: part for part in load_catalog(archive_dir(directory, year))}
+        stored += sum(part.stored for part in parts.values())
+        size += sum(parts[entry.archives[year]].size for entry in entries
+                    if entry.archives and entry.archives.get(year) in parts)
+    return {
+        'count': len(entries),
+        'size': size,
+        'stored': stored,
+    }
+
+
+class BackupScheduler(QtCore.QObject):
+    """Плановое резервное копирование в фоновом потоке.
+
+    Таймер раз в час проверяет, не пора ли сделать копию; снимок, сжатие,
+    проверка и удаление старых копий выполняются вне потока интерфейса
+    отдельным соединением к базе.
+    """
+
+    # Копирование завершено (BackupReport)
+    finished = QtCore.pyqtSignal(object)
+    # Копирование не удалось (текст ошибки)
+    failed = QtCore.pyqtSignal(str)
+    # Внутренний сигнал из рабочего потока: доставляется в поток интерфейса
+    _done = QtCore.pyqtSignal(object, object)
+
+    CHECK_INTERVAL_MS = 60 * 60 * 1000
+    # Первая проверка - после запуска, когда окно уже показано
+    FIRST_CHECK_MS = 60 * 1000
+
+    def __init__(self, directory: str, policy: RetentionPolicy = RetentionPolicy(),
+                 interval: timedelta = BACKUP_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.policy = policy
+        self.interval = interval
+        self._running = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+        self._done.connect(self._on_done)
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self.check)
+
+    def start(self) -> None:
+        # Таймер принадлежит планировщику и останавливается в shutdown
+        # вместе со всеми будущими проверками, включая первую
+        self._timer.start(self.FIRST_CHECK_MS)
+
+    def check(self) -> None:
+        """Копирование, если с последней копии прошло больше интервала"""
+        self._timer.setInterval(self.CHECK_INTERVAL_MS)
+        try:
+            if is_due(self.directory, self.interval):
+                self.run_now()
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+
+    def run_now(self, full: bool = False) -> None:
+        if self._running:
+            return
+        self._running = True
+        future = self._executor.submit(run_backup, self.directory, self.policy, 'xz', full)
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future) -> None:
+        """Завершение копирования (вызывается в рабочем потоке)"""
+        try:
+            self._done.emit(future.result(), None)
+        except Exception as e:
+            self._done.emit(None, str(e))
+
+    def _on_done(self, report, error) -> None:
+        self._running = False
+        if report is None:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(report)
+
+    def stop(self) -> None:
+        """Остановка проверок и ожидание начатого копирования (перед заменой файла базы).
+        Проверки возобновляются вызовом start()"""
+        self._timer.stop()
+        # Один рабочий поток выполняет задачи по порядку: пустая задача завершится после начатой
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self) -> None:
+        self._timer.stop()
+        # Начатая копия дописывается: файлы заменяются атомарно, каталог - последним
+        self._executor.shutdown(wait=False, cancel_futures=True)
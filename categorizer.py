@@ -0,0 +1,129 @@
+# categorizer.py - Автоматический выбор категории по описанию транзакции
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+import database as db
+
+# Ниже этой уверенности категория при импорте не назначается по описанию
+MIN_CONFIDENCE = 0.6
+# Во сколько раз совпадение продавца (всего описания) весомее отдельного слова
+MERCHANT_WEIGHT = 3.0
+# Категория для строк, категорию которых определить не удалось
+FALLBACK_CATEGORY = "Другое"
+
+
+class Categorizer:
+    """Частотный классификатор описаний по индексу category_tokens.
+
+    Каждый признак описания (слово или продавец) голосует за категории
+    пропорционально тому, как часто транзакции с этим признаком относили
+    к ним. Голос тем весомее, чем чаще признак встречался, а редкий признак
+    сглаживается: единственная транзакция дает ему уверенность 1/2.
+    Уверенность результата - доля голосов, отданных за выбранную категорию.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, int, int]]):
+        # признак -> [(категория, количество)]
+        self._counts: Dict[str, List[Tuple[int, int]]] = {}
+        for token, category_id, count in rows:
+            self._counts.setdefault(token, []).append((category_id, count))
+        self._totals = {token: sum(count for _, count in counts) for token, counts in self._counts.items()}
+
+    @classmethod
+    def load(cls, tokens: Optional[Iterable[str]] = None) -> "Categorizer":
+        """Классификатор по всему индексу или только по указанным признакам"""
+        return cls(db.get_category_token_counts(tokens))
+
+    def suggest(self, description: Optional[str]) -> Optional[Tuple[int, float]]:
+        """Лучшая категория для описания и уверенность 0..1; None, если признаки незнакомы"""
+        scores: Dict[int, float] = {}
+        total_weight = 0.0
+        for token in db.description_tokens(description):
+            counts = self._counts.get(token)
+            if not counts:
+                continue
+            total = self._totals[token]
+            weight = math.log1p(total) * (MERCHANT_WEIGHT if token.startswith("=") else 1.0)
+            total_weight += weight
+            for category_id, count in counts:
+                scores[category_id] = scores.get(category_id, 0.0) + weight * count / (total + 1)
+        if not scores:
+            return None
+        best = max(scores, key=scores.get)
+        return best, scores[best] / total_weight
+
+
+def suggest_category(description: Optional[str]) -> Optional[Tuple[int, float]]:
+    """Категория для одного описания: читаются только его признаки (для ввода в диалоге)"""
+    tokens = db.description_tokens(description)
+    if not tokens:
+        return None
+    return Categorizer.load(tokens).suggest(description)
+
+
+def fallback_category_id() -> Optional[int]:
+    """Категория "Другое", а если ее нет - первая категория расходов"""
+    categories = db.get_all_categories()
+    for category_id, name, _, _ in categories:
+        if name == FALLBACK_CATEGORY:
+            return category_id
+    for category_id, _, category_type, _ in categories:
+        if category_type == 'expense':
+            return category_id
+    return categories[0][0] if categories else None
+
+
+class BatchCategorizer:
+    """Назначение категорий строкам импорта.
+
+    Индекс читается один раз, результат запоминается для каждого описания
+    (выписки банка повторяют одни и те же строки), поэтому сто тысяч строк
+    классифицируются за доли секунды. Строки без уверенного результата
+    получают запасную категорию.
+    """
+
+    def __init__(self, min_confidence: float = MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self._categorizer = Categorizer.load()
+        self._fallback = fallback_category_id()
+        self._results: Dict[Optional[str], Tuple[int, Optional[float]]] = {}
+        # Назначено по описанию уверенно и отнесено к запасной категории
+        self.assigned = 0
+        self.uncertain = 0
+
+    def classify(self, description: Optional[str]) -> Tuple[int, Optional[float]]:
+        """(категория, уверенность или None, если назначена запасная категория)"""
+        result = self._results.get(description)
+        if result is None:
+            suggestion = self._categorizer.suggest(description)
+            if suggestion is not None and suggestion[1] >= self.min_confidence:
+                result = suggestion
+            else:
+                result = (self._fallback, None)
+            self._results[description] = result
+        if result[1] is None:
+            self.uncertain += 1
+        else:
+            self.assigned += 1
+        return result
+
+
+def recategorize(source_id: int, min_confidence: float = MIN_CONFIDENCE,
+                 apply: bool = True) -> List[Tuple[int, str, int, float]]:
+    """Перенос транзакций категории source_id (обычно "Другое") в уверенно определенные категории.
+
+    Изменения записываются через журнал правок, поэтому их можно отменить.
+    Возвращает (ID, описание, новая категория, уверенность) перенесенных
+    (при apply=False - только найденных) транзакций.
+    """
+    categorizer = Categorizer.load()
+    moves = []
+    for transaction_id, _, category_id, _, description, _, _ in db.iter_transactions(
+            category_ids=[source_id], include_archive=True):
+        suggestion = categorizer.suggest(description)
+        if suggestion is not None and suggestion[0] != category_id and suggestion[1] >= min_confidence:
+            moves.append((transaction_id, description, suggestion[0], suggestion[1]))
+    if apply and moves:
+        db.apply_transaction_edits([(transaction_id, 'category_id', source_id, new_category_id)
+                                    for transaction_id, _, new_category_id, _ in moves])
+    return moves
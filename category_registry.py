@@ -0,0 +1,93 @@
+# category_registry.py - Общий справочник категорий для окон и редакторов
+
+from typing import Dict, List, Optional, Tuple
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtCore import Qt
+import database as db
+
+# Роли данных элементов модели категорий
+ID_ROLE = Qt.ItemDataRole.UserRole
+TYPE_ROLE = Qt.ItemDataRole.UserRole + 1
+HIDDEN_ROLE = Qt.ItemDataRole.UserRole + 2
+
+
+class CategoryRegistry(QtCore.QObject):
+    """Справочник категорий, загружаемый из базы один раз.
+
+    Категории хранятся в QStandardItemModel, которую разделяют все списки
+    выбора; для них есть отдельная модель без скрытых категорий. Справочник
+    перечитывается только после изменения категорий - через методы этого
+    класса или по сигналу об изменении базы другим клиентом, поэтому открытие
+    диалогов и редакторов не выполняет запросов к базе.
+    """
+
+    # Справочник перечитан
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None, categories: Optional[List[Tuple]] = None):
+        super().__init__(parent)
+        self._categories: List[Tuple] = []
+        self._names: Dict[int, str] = {}
+        self.model = QtGui.QStandardItemModel(self)
+        # Модель для списков выбора: только видимые категории
+        self.visible_model = QtCore.QSortFilterProxyModel(self)
+        self.visible_model.setSourceModel(self.model)
+        self.visible_model.setFilterRole(HIDDEN_ROLE)
+        self.visible_model.setFilterFixedString("0")
+        # Категории из снимка прошлого запуска позволяют не читать базу до первой отрисовки
+        if categories is None:
+            self.reload()
+        else:
+            self._fill(categories)
+
+    def reload(self) -> None:
+        """Повторное чтение справочника из базы"""
+        db.invalidate_category_cache()
+        self._fill(db.get_all_categories())
+
+    def _fill(self, categories: List[Tuple]) -> None:
+        self._categories = categories
+        self._names = {cat[0]: cat[1] for cat in self._categories}
+        self.model.clear()
+        for category_id, name, category_type, hidden in self._categories:
+            item = QtGui.QStandardItem(name)
+            item.setData(category_id, ID_ROLE)
+            item.setData(category_type, TYPE_ROLE)
+            item.setData(int(hidden), HIDDEN_ROLE)
+            item.setEditable(False)
+            if hidden:
+                item.setForeground(QtGui.QBrush(QtGui.QColor("gray")))
+            self.model.appendRow(item)
+        self.changed.emit()
+
+    def categories(self) -> List[Tuple]:
+        """Все категории: (id, name, type, hidden)"""
+        return self._categories
+
+    def name(self, category_id: int) -> str:
+        return self._names.get(category_id, "")
+
+    def add(self, name: str, category_type: str) -> None:
+        db.add_category(name, category_type)
+        self.reload()
+
+    def rename(self, category_id: int, new_name: str) -> None:
+        db.rename_category(category_id, new_name)
+        self.reload()
+
+    def set_hidden(self, category_id: int, hidden: bool) -> None:
+        db.set_category_hidden(category_id, hidden)
+        self.reload()
+
+    def merge(self, source_id: int, target_id: int) -> int:
+        """Объединение категорий; возвращает количество перенесенных транзакций"""
+        moved = db.merge_categories(source_id, target_id)
+        self.reload()
+        return moved
+
+    def row_for(self, category_id: Optional[int]) -> int:
+        """Строка категории в модели видимых категорий или -1"""
+        for row in range(self.visible_model.rowCount()):
+            if self.visible_model.index(row, 0).data(ID_ROLE) == category_id:
+                return row
+        return -1
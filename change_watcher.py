@@ -0,0 +1,101 @@
+# change_watcher.py - Отслеживание изменений базы данных другими клиентами
+
+from typing import Optional
+from PyQt6 import QtCore
+import database as db
+
+
+class ChangeWatcher(QtCore.QObject):
+    """Периодическая проверка PRAGMA data_version и чтение журнала изменений.
+
+    Пока версия данных не изменилась, опрос стоит один PRAGMA. После фиксации
+    изменений другим соединением (второй экземпляр приложения, импорт из
+    командной строки) из change_log читаются только строки, изменившиеся
+    с последней просмотренной записи журнала.
+    """
+
+    # Измененные транзакции (список строк) и ID удаленных транзакций
+    transactionsChanged = QtCore.pyqtSignal(list, list)
+    # Изменился справочник категорий
+    categoriesChanged = QtCore.pyqtSignal()
+    # Другое соединение зафиксировало изменения: справочники, которых нет
+    # в журнале изменений (счета, курсы валют), сверяются с базой
+    dataVersionChanged = QtCore.pyqtSignal()
+    # Изменений слишком много или журнал уже очищен - нужна полная перезагрузка
+    reloadRequired = QtCore.pyqtSignal()
+
+    # Начиная с этого числа изменений полная перезагрузка дешевле поштучной
+    FULL_RELOAD_THRESHOLD = 5000
+
+    def __init__(self, interval_ms: int = 2000, parent=None):
+        super().__init__(parent)
+        self._data_version = 0
+        self._last_seq = 0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.poll)
+
+    def start(self) -> None:
+        self.reset()
+        self._timer.start()
+
+    def stop(self) -> None:
+        self._timer.stop()
+
+    def reset(self, seq: Optional[int] = None) -> None:
+        """Запоминание текущего состояния базы как уже загруженного.
+
+        seq - запись журнала, по которую данные загружены в другом потоке:
+        изменения после нее (в том числе свои) читаются при следующем опросе.
+        """
+        if seq is None:
+            self._data_version = db.get_data_version()
+            self._last_seq = db.get_last_change_seq()
+        else:
+            self._data_version = None
+            self._last_seq = seq
+
+    def poll(self) -> None:
+        """Проверка наличия изменений и их загрузка"""
+        try:
+            version = db.get_data_version()
+            if version == self._data_version:
+                return
+            self._data_version = version
+            self.dataVersionChanged.emit()
+
+            if self._last_seq < db.get_first_change_seq() - 1:
+                # Часть журнала после последней просмотренной записи уже удалена
+                self._last_seq = db.get_last_change_seq()
+                self.reloadRequired.emit()
+                return
+
+            changes = db.get_changes_since(self._last_seq)
+            if not changes:
+                return
+            self._last_seq = changes[-1][3]
+            if len(changes) > self.FULL_RELOAD_THRESHOLD:
+                self.reloadRequired.emit()
+                return
+
+            changed_ids = []
+            deleted_ids = []
+            categories_changed = False
+            for table_name, row_id, op, _ in changes:
+                if table_name == 'categories':
+                    categories_changed = True
+                elif op == 'delete':
+                    deleted_ids.append(row_id)
+                else:
+                    changed_ids.append(row_id)
+
+            if categories_changed:
+                self.categoriesChanged.emit()
+            if changed_ids or deleted_ids:
+                rows = db.get_transactions_by_ids(changed_ids)
+                # Строки, которые больше не выбираются, считаем удаленными
+                found_ids = {row[0] for row in rows}
+                deleted_ids.extend(row_id for row_id in changed_ids if row_id not in found_ids)
+                self.transactionsChanged.emit(rows, deleted_ids)
+        except Exception as e:
+            print(f"Ошибка при проверке изменений базы данных: {str(e)}")
@@ -0,0 +1,177 @@
+# charts.py - Построение графиков в фоновом потоке с кэшем готовых изображений
+
+import io
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from PyQt6 import QtCore
+import database as db
+from reports import ReportQuery, ReportService
+
+CHART_TYPES = {
+    'categories': "Расходы по категориям",
+    'trend': "Расходы по месяцам",
+    'income_expense': "Доходы и расходы",
+}
+
+# Больше точек на графике не различить - длинная история усредняется
+MAX_POINTS = 120
+# Категории сверх этого числа объединяются в "Прочее"
+TOP_CATEGORIES = 8
+# Сколько готовых изображений хранить в памяти
+CACHE_SIZE = 32
+
+
+def downsample(labels: Sequence[str], values: Sequence[float],
+               max_points: int = MAX_POINTS) -> Tuple[List[str], List[float]]:
+    """Усреднение соседних точек ряда, если их больше max_points.
+
+    Каждая группа подписывается первой меткой группы; среднее сохраняет
+    масштаб исходного ряда (сумма за месяц остается суммой за месяц).
+    """
+    if len(values) <= max_points:
+        return list(labels), list(values)
+    size = math.ceil(len(values) / max_points)
+    result_labels = []
+    result_values = []
+    for start in range(0, len(values), size):
+        bucket = values[start:start + size]
+        result_labels.append(labels[start])
+        result_values.append(sum(bucket) / len(bucket))
+    return result_labels, result_values
+
+
+def load_chart_data(chart_type: str, year: Optional[int], reports: ReportService) -> Tuple:
+    """Агрегаты для графика (выполняется в потоке интерфейса, где открыто соединение с БД)"""
+    if chart_type == 'categories':
+        breakdown = reports.run(ReportQuery.for_year(year, group_by='category'))
+        names = [name for _, name, _ in breakdown]
+        totals = [total for _, _, total in breakdown]
+        if len(names) > TOP_CATEGORIES:
+            names = names[:TOP_CATEGORIES - 1] + ["Прочее"]
+            totals = totals[:TOP_CATEGORIES - 1] + [sum(totals[TOP_CATEGORIES - 1:])]
+        return names, totals
+
+    rows = [row for row in db.get_monthly_income_expense() if not year or row[0] == year]
+    labels = [f"{month:02d}.{row_year}" for row_year, month, _, _ in rows]
+    income = [row[2] for row in rows]
+    expense = [row[3] for row in rows]
+    if chart_type == 'trend':
+        return downsample(labels, expense)
+    labels_income, income = downsample(labels, income)
+    _, expense = downsample(labels, expense)
+    return labels_income, income, expense
+
+
+def render_chart(chart_type: str, data: Tuple, title: str,
+                 width: int, height: int, dpi: int = 100) -> bytes:
+    """Построение графика в PNG через Agg.
+
+    Используются только Figure и FigureCanvasAgg без pyplot, поэтому функция
+    безопасна для фонового потока и не трогает объекты Qt.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=(max(width, 100) / dpi, max(height, 100) / dpi), dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.set_title(title)
+
+    if chart_type == 'categories':
+        names, totals = data
+        if totals:
+            axes.pie(totals, labels=names, autopct='%1.0f%%', startangle=90, counterclock=False)
+            axes.axis('equal')
+        else:
+            axes.text(0.5, 0.5, "Нет расходов", ha='center', va='center')
+            axes.set_axis_off()
+    else:
+        labels = data[0]
+        positions = range(len(labels))
+        if chart_type == 'trend':
+            axes.plot(positions, data[1], marker='o' if len(labels) < 40 else None, color='#d9534f')
+        else:
+            axes.plot(positions, data[1], label="Доходы", color='#5cb85c')
+            axes.plot(positions, data[2], label="Расходы", color='#d9534f')
+            axes.legend()
+        # Подписей по оси X не больше дюжины
+        step = max(1, len(labels) // 12)
+        axes.set_xticks(list(positions)[::step])
+        axes.set_xticklabels(labels[::step], rotation=45, ha='right')
+        axes.grid(True, alpha=0.3)
+
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class ChartRenderer(QtCore.QObject):
+    """Фоновое построение графиков с LRU-кэшем PNG.
+
+    Ключ кэша - версия данных (последняя запись change_log, которая растет при
+    любом изменении транзакций и категорий) и параметры графика. Агрегаты
+    читаются в потоке интерфейса (это несколько запросов по индексам), а сама
+    отрисовка matplotlib выполняется в отдельном потоке.
+    """
+
+    # Ключ и PNG построенного графика
+    chartReady = QtCore.pyqtSignal(tuple, bytes)
+    # Внутренний сигнал из рабочего потока: доставляется в поток интерфейса
+    _rendered = QtCore.pyqtSignal(tuple, bytes)
+
+    def __init__(self, reports: ReportService, parent=None):
+        super().__init__(parent)
+        self.reports = reports
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts")
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._pending = set()
+        self._rendered.connect(self._on_rendered)
+
+    def chart_key(self, chart_type: str, year: Optional[int], width: int, height: int) -> tuple:
+        return db.get_last_change_seq(), chart_type, year, width, height
+
+    def request(self, chart_type: str, year: Optional[int], width: int, height: int) -> Tuple[tuple, Optional[bytes]]:
+        """Готовое изображение из кэша или постановка графика в очередь.
+
+        Возвращает (ключ, PNG или None); когда график будет построен,
+        испускается chartReady с тем же ключом.
+        """
+        key = self.chart_key(chart_type, year, width, height)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            return key, image
+        if key not in self._pending:
+            self._pending.add(key)
+            data = load_chart_data(chart_type, year, self.reports)
+            title = CHART_TYPES[chart_type] + (f", {year}" if year else "")
+            future = self._executor.submit(render_chart, chart_type, data, title, width, height)
+            future.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return key, None
+
+    def _finish(self, key: tuple, future) -> None:
+        """Завершение отрисовки (вызывается в рабочем потоке)"""
+        try:
+            image = future.result()
+        except Exception as e:
+            print(f"Ошибка построения графика: {str(e)}")
+            image = b""
+        self._rendered.emit(key, image)
+
+    def _on_rendered(self, key: tuple, image: bytes) -> None:
+        self._pending.discard(key)
+        if image:
+            self._cache[key] = image
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        self.chartReady.emit(key, image)
+
+    def invalidate(self) -> None:
+        """Сброс кэша при изменениях, которые не попадают в журнал (курсы валют)"""
+        self._cache.clear()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
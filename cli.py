@@ -0,0 +1,302 @@
+# cli.py - Команды обслуживания базы данных без графического интерфейса
+
+import argparse
+import os
+import sys
+from datetime import date
+import database as db
+import recurring
+import columnar_io
+import currency
+import maintenance
+import categorizer
+import backups
+import reports
+
+
+def cmd_recurring(args) -> int:
+    """Создание наступивших регулярных транзакций"""
+    today = date.fromisoformat(args.date) if args.date else None
+    count = recurring.generate_due_transactions(today)
+    print(f"Добавлено регулярных транзакций: {count}")
+    return 0
+
+
+def cmd_export(args) -> int:
+    """Экспорт данных в Parquet или Arrow IPC"""
+    count = columnar_io.export_data(args.directory, args.format, args.by_year)
+    print(f"Экспортировано транзакций: {count}")
+    return 0
+
+
+def cmd_import(args) -> int:
+    """Импорт данных из каталога Parquet или Arrow IPC"""
+    file_format = args.format or columnar_io.detect_format(args.directory)
+    result = columnar_io.import_data(args.directory, file_format,
+                                     skip_duplicates=not args.keep_duplicates,
+                                     min_confidence=args.min_confidence)
+    print(f"Импортировано транзакций: {result.inserted}")
+    if result.duplicates:
+        action = "добавлено" if args.keep_duplicates else "пропущено"
+        print(f"Дубликатов {action}: {result.duplicates}")
+    if result.categorized or result.uncertain:
+        print(f"Категория определена по описанию: {result.categorized}, "
+              f"отнесено к запасной категории: {result.uncertain}")
+    return 0
+
+
+def cmd_duplicates(args) -> int:
+    """Вывод групп транзакций с одинаковым отпечатком"""
+    groups = db.find_duplicate_groups()
+    for group in groups:
+        ids = ", ".join(str(row[0]) for row in group)
+        _, amount, _, day, description, _ = group[0]
+        print(f"{day}  {amount:.2f}  {description or ''}  (ID: {ids})")
+    print(f"Групп дубликатов: {len(groups)}")
+    return 0
+
+
+def cmd_rates(args) -> int:
+    """Загрузка курсов валют из CSV"""
+    count = currency.import_rates_csv(args.file)
+    print(f"Загружено курсов валют: {count}")
+    return 0
+
+
+def cmd_vacuum(args) -> int:
+    """Полное сжатие базы с отчетом о размере до и после"""
+    if args.report:
+        print(maintenance.format_storage_stats(db.get_storage_stats(detailed=True)))
+        return 0
+    before, after = db.vacuum_database()
+    print(maintenance.format_vacuum_report(before, after))
+    return 0
+
+
+def cmd_categorize(args) -> int:
+    """Перенос транзакций из запасной категории в категории, определенные по описанию"""
+    if args.rebuild:
+        print(f"Признаков в индексе категорий: {db.rebuild_category_tokens()}")
+    names = {name: category_id for category_id, name, _, _ in db.get_all_categories()}
+    if args.category not in names:
+        print(f"Категория не найдена: {args.category}")
+        return 1
+    moves = categorizer.recategorize(names[args.category], args.min_confidence, apply=not args.dry_run)
+    for transaction_id, description, category_id, confidence in moves:
+        print(f"{transaction_id}  {description or ''}  -> {db.get_category_name(category_id)} ({confidence:.0%})")
+    action = "Будет перенесено" if args.dry_run else "Перенесено"
+    print(f"{action} транзакций: {len(moves)}")
+    return 0
+
+
+def cmd_budget(args) -> int:
+    """Установка лимитов и вывод состояния бюджетов"""
+    if args.set or args.delete:
+        names = {name: category_id for category_id, name, _, _ in db.get_all_categories()}
+        category = args.set[0] if args.set else args.delete
+        if category not in names:
+            print(f"Категория не найдена: {category}")
+            return 1
+        if args.set:
+            db.set_budget(names[category], float(args.set[1]), args.period)
+        else:
+            db.delete_budget(names[category], args.period)
+    over = 0
+    for _, name, period, limit, spent in db.get_budget_status(args.date):
+        if limit is None:
+            if args.all:
+                print(f"{name:30} {spent:12.2f}")
+            continue
+        mark = "  ПРЕВЫШЕН" if spent > limit else ""
+        over += spent > limit
+        print(f"{name + ' (' + period + ')':30} {spent:12.2f} / {limit:.2f}{mark}")
+    print(f"Превышено лимитов: {over}")
+    return 0
+
+
+def cmd_backup(args) -> int:
+    """Плановое копирование, список копий, проверка и восстановление"""
+    if args.list:
+        for entry in backups.load_catalog(backups.backup_dir()):
+            base = f" от {entry.base}" if entry.base else ""
+            archives = f"  архивы: {', '.join(sorted(entry.archives))}" if entry.archives else ""
+            print(f"{entry.name}  {entry.kind}{base}  {maintenance.format_size(entry.stored)}{archives}")
+    elif args.verify:
+        failed = 0
+        for entry in backups.load_catalog(backups.backup_dir()):
+            ok, message = backups.verify_backup(entry.name)
+            failed += not ok
+            print(f"{entry.name}  {'OK' if ok else 'ОШИБКА: ' + message}")
+        if failed:
+            return 1
+    elif args.restore:
+        name, target = args.restore
+        backups.restore_backup(name, target)
+        print(f"Копия {name} восстановлена в {target}")
+        return 0
+    else:
+        policy = backups.RetentionPolicy(args.daily, args.weekly, args.monthly)
+        report = backups.run_backup(policy=policy, compression=args.compression, full=args.full)
+        if report.entry is None:
+            print("Данные не изменились с последней копии")
+        else:
+            kind = "Полная" if report.entry.kind == 'full' else "Разностная"
+            print(f"{kind} копия {report.entry.name}: {maintenance.format_size(report.entry.stored)}, "
+                  f"проверка {'пройдена' if report.verified else 'НЕ ПРОЙДЕНА'}")
+        if report.removed:
+            print(f"Удалено по сроку хранения: {len(report.removed)}")
+        if not report.verified:
+            return 1
+    stats = backups.backup_stats()
+    print(f"Копий: {stats['count']}, занято {maintenance.format_size(stats['stored'])} "
+          f"вместо {maintenance.format_size(stats['size'])} полных копий")
+    return 0
+
+
+def cmd_report(args) -> int:
+    """Отчет по периоду, категориям, группировке и показателю (на экран или в CSV)"""
+    category_ids = None
+    if args.category:
+        names = {name: category_id for category_id, name, _, _ in db.get_all_categories()}
+        missing = [name for name in args.category if name not in names]
+        if missing:
+            print(f"Категория не найдена: {', '.join(missing)}")
+            return 1
+        category_ids = tuple(names[name] for name in args.category)
+    if args.year:
+        query = reports.ReportQuery.for_year(args.year)
+    else:
+        query = reports.ReportQuery(args.start, args.end)
+    query = query._replace(category_ids=category_ids, group_by=args.group, metric=args.metric,
+                           category_type=args.type)
+    rows = reports.ReportService().run(query)
+    if args.csv:
+        import csv
+        with open(args.csv, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["key", "label", args.metric])
+            writer.writerows(rows)
+        print(f"Строк отчета: {len(rows)}")
+        return 0
+    for _, label, value in rows:
+        print(f"{label or 'Итого':30} {value:14.2f}")
+    return 0
+
+
+def cmd_serve(args) -> int:
+    """Сервер HTTP/JSON API над базой (до Ctrl+C)"""
+    import api_server
+    # Соединение открывает поток-писатель сервера
+    db.close_connection()
+    server = api_server.ApiServer(args.db, args.host, args.port, args.readers, args.verbose, args.token)
+    print(f"Сервер API: http://{args.host}:{args.port} (база {args.db}), остановка - Ctrl+C")
+    if server.token and not args.token:
+        print(f"Ключ доступа (FINANCE_SERVER_TOKEN): {server.token}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        print("Сервер остановлен")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Описание команд и аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Учет личных финансов: обслуживание базы данных")
+    parser.add_argument("--db", default="finance.db", help="Путь к файлу базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recurring_parser = commands.add_parser("recurring", help="Создать наступившие регулярные транзакции")
+    recurring_parser.add_argument("--date", help="Дата yyyy-mm-dd, по которую создаются транзакции (по умолчанию сегодня)")
+    recurring_parser.set_defaults(func=cmd_recurring)
+
+    export_parser = commands.add_parser("export", help="Экспорт в Parquet или Arrow IPC")
+    export_parser.add_argument("directory", help="Каталог для файлов экспорта")
+    export_parser.add_argument("--format", choices=sorted(columnar_io.FORMATS), default="parquet")
+    export_parser.add_argument("--by-year", action="store_true", help="Разбить транзакции по годам")
+    export_parser.set_defaults(func=cmd_export)
+
+    import_parser = commands.add_parser("import", help="Импорт из каталога Parquet или Arrow IPC")
+    import_parser.add_argument("directory", help="Каталог с файлами экспорта")
+    import_parser.add_argument("--format", choices=sorted(columnar_io.FORMATS),
+                               help="Формат файлов (по умолчанию определяется автоматически)")
+    import_parser.add_argument("--keep-duplicates", action="store_true",
+                               help="Добавлять транзакции, которые уже есть в базе")
+    import_parser.add_argument("--min-confidence", type=float, default=categorizer.MIN_CONFIDENCE,
+                               help="Уверенность, с которой строке без категории назначается категория по описанию")
+    import_parser.set_defaults(func=cmd_import)
+
+    rates_parser = commands.add_parser("rates", help="Загрузить курсы валют из CSV (date, currency, rate)")
+    rates_parser.add_argument("file", help="CSV-файл с курсами к базовой валюте")
+    rates_parser.set_defaults(func=cmd_rates)
+
+    duplicates_parser = commands.add_parser("duplicates", help="Показать группы дубликатов транзакций")
+    duplicates_parser.set_defaults(func=cmd_duplicates)
+
+    vacuum_parser = commands.add_parser("vacuum", help="Сжать базу (VACUUM) и обновить статистику планировщика")
+    vacuum_parser.add_argument("--report", action="store_true", help="Только показать размер и фрагментацию")
+    vacuum_parser.set_defaults(func=cmd_vacuum)
+
+    categorize_parser = commands.add_parser("categorize",
+                                            help="Разнести транзакции запасной категории по описаниям")
+    categorize_parser.add_argument("--category", default=categorizer.FALLBACK_CATEGORY,
+                                   help="Категория, из которой переносятся транзакции")
+    categorize_parser.add_argument("--min-confidence", type=float, default=categorizer.MIN_CONFIDENCE)
+    categorize_parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет перенесено")
+    categorize_parser.add_argument("--rebuild", action="store_true",
+                                   help="Сначала пересобрать индекс категорий по всем транзакциям")
+    categorize_parser.set_defaults(func=cmd_categorize)
+
+    budget_parser = commands.add_parser("budget", help="Лимиты расходов по категориям и их состояние")
+    budget_parser.add_argument("--set", nargs=2, metavar=("CATEGORY", "LIMIT"), help="Установить лимит категории")
+    budget_parser.add_argument("--delete", metavar="CATEGORY", help="Удалить лимит категории")
+    budget_parser.add_argument("--period", choices=("month", "year"), default="month")
+    budget_parser.add_argument("--date", help="Дата yyyy-mm-dd, на которую считаются расходы (по умолчанию сегодня)")
+    budget_parser.add_argument("--all", action="store_true", help="Показать и категории без лимита")
+    budget_parser.set_defaults(func=cmd_budget)
+
+    backup_parser = commands.add_parser("backup", help="Сжатая резервная копия с проверкой и удалением старых")
+    backup_parser.add_argument("--full", action="store_true", help="Полная копия вместо разностной")
+    backup_parser.add_argument("--compression", choices=backups.COMPRESSIONS, default="xz")
+    backup_parser.add_argument("--daily", type=int, default=backups.RetentionPolicy().daily,
+                               help="Сколько последних дней хранить по копии")
+    backup_parser.add_argument("--weekly", type=int, default=backups.RetentionPolicy().weekly)
+    backup_parser.add_argument("--monthly", type=int, default=backups.RetentionPolicy().monthly)
+    backup_parser.add_argument("--list", action="store_true", help="Показать копии")
+    backup_parser.add_argument("--verify", action="store_true", help="Проверить все копии восстановлением")
+    backup_parser.add_argument("--restore", nargs=2, metavar=("NAME", "FILE"), help="Восстановить копию в файл")
+    backup_parser.set_defaults(func=cmd_backup)
+
+    report_parser = commands.add_parser("report", help="Отчет по периоду и категориям")
+    report_parser.add_argument("--year", type=int, help="Календарный год")
+    report_parser.add_argument("--from", dest="start", help="Начало периода yyyy-mm-dd")
+    report_parser.add_argument("--to", dest="end", help="Конец периода yyyy-mm-dd (не включается)")
+    report_parser.add_argument("--category", action="append", help="Категория (можно указать несколько раз)")
+    report_parser.add_argument("--group", choices=reports.GROUPINGS, default="category")
+    report_parser.add_argument("--metric", choices=reports.METRICS, default="total")
+    report_parser.add_argument("--type", choices=("expense", "income"), default="expense")
+    report_parser.add_argument("--csv", help="Сохранить отчет в CSV")
+    report_parser.set_defaults(func=cmd_report)
+
+    serve_parser = commands.add_parser("serve", help="Запустить локальный HTTP/JSON API над базой")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Адрес (по умолчанию только локальный)")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--readers", type=int, default=4, help="Соединений только для чтения")
+    serve_parser.add_argument("--verbose", action="store_true", help="Печатать каждый запрос")
+    serve_parser.add_argument("--token", default=os.environ.get("FINANCE_SERVER_TOKEN"),
+                              help="Ключ доступа клиентов (для нелокального --host создается, если не указан)")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    db.initialize(args.db)
+    try:
+        return args.func(args)
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
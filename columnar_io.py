@@ -0,0 +1,291 @@
+# columnar_io.py - Экспорт и импорт данных в колоночных форматах Parquet и Arrow IPC
+
+import os
+from datetime import date
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+import database as db
+import categorizer
+
+# Размер порции строк, читаемой из курсора и записываемой одним RecordBatch
+BATCH_SIZE = 50000
+
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+
+class ImportResult(NamedTuple):
+    """Итог импорта"""
+    inserted: int
+    duplicates: int
+    # Строки без категории: отнесены к категории по описанию / к запасной категории
+    categorized: int
+    uncertain: int
+
+
+def _transactions_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('date', pa.date32()),
+        ('amount', pa.float64()),
+        ('category_id', pa.int32()),
+        ('category', pa.dictionary(pa.int32(), pa.string())),
+        ('description', pa.string()),
+        ('receipt_path', pa.string()),
+        ('currency', pa.string()),
+        ('account_id', pa.int32()),
+    ])
+
+
+def _categories_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int32()),
+        ('name', pa.string()),
+        ('type', pa.string()),
+    ])
+
+
+def _accounts_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int32()),
+        ('name', pa.string()),
+        ('currency', pa.string()),
+    ])
+
+
+class _Writer:
+    """Единый интерфейс записи RecordBatch в Parquet или Arrow IPC"""
+
+    def __init__(self, path: str, schema, file_format: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, schema,
+                                           options=pa.ipc.IpcWriteOptions(compression='zstd'))
+        self._format = file_format
+
+    def write(self, batch) -> None:
+        if self._format == 'parquet':
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+        if self._format != 'parquet':
+            self._sink.close()
+
+
+def _to_batch(rows: List[Tuple], schema, category_index: Dict[int, int], category_names):
+    """Преобразование порции строк курсора в RecordBatch.
+
+    Название категории кодируется словарем, общим для всех порций файла
+    (формат Arrow IPC не допускает замену словаря между порциями).
+    """
+    import pyarrow as pa
+    ids, dates, amounts, category_ids, descriptions, receipts, currencies, account_ids = zip(*rows)
+    category_codes = pa.array([category_index[cat_id] for cat_id in category_ids], pa.int32())
+    return pa.RecordBatch.from_arrays([
+        pa.array(ids, pa.int64()),
+        pa.array(dates, pa.string()).cast(pa.date32()),
+        pa.array(amounts, pa.float64()),
+        pa.array(category_ids, pa.int32()),
+        pa.DictionaryArray.from_arrays(category_codes, category_names),
+        pa.array(descriptions, pa.string()),
+        pa.array(receipts, pa.string()),
+        pa.array(currencies, pa.string()),
+        pa.array(account_ids, pa.int32()),
+    ], schema=schema)
+
+
+def _write_table(path: str, rows: List[Dict], schema, file_format: str) -> None:
+    """Запись небольшого справочника одним файлом"""
+    import pyarrow as pa
+    table = pa.Table.from_pylist(rows, schema=schema)
+    writer = _Writer(path, schema, file_format)
+    for batch in table.to_batches():
+        writer.write(batch)
+    writer.close()
+
+
+def export_data(directory: str, file_format: str = 'parquet', partition_by_year: bool = False,
+                batch_size: int = BATCH_SIZE) -> int:
+    """Экспорт транзакций, категорий и счетов в каталог.
+
+    Транзакции читаются из курсора порциями и пишутся потоково, без загрузки
+    всей истории в память. При partition_by_year каждая годовая часть пишется
+    в transactions/year=YYYY/part-0.<ext>, иначе - в один файл transactions.<ext>.
+    Возвращает количество экспортированных транзакций.
+    """
+    import pyarrow as pa
+    extension = FORMATS[file_format]
+    os.makedirs(directory, exist_ok=True)
+
+    # Категории и счета - небольшие справочники, пишутся целиком
+    categories = db.get_all_categories()
+    _write_table(os.path.join(directory, f"categories{extension}"),
+                 [{'id': cat[0], 'name': cat[1], 'type': cat[2]} for cat in categories],
+                 _categories_schema(), file_format)
+    _write_table(os.path.join(directory, f"accounts{extension}"),
+                 [{'id': acc[0], 'name': acc[1], 'currency': acc[2]} for acc in db.get_all_accounts()],
+                 _accounts_schema(), file_format)
+
+    schema = _transactions_schema()
+    category_index = {cat[0]: index for index, cat in enumerate(categories)}
+    category_names = pa.array([cat[1] for cat in categories], pa.string())
+    cursor = db.iter_export_rows()
+    writer = None
+    current_year = None
+    exported = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            exported += len(rows)
+            if not partition_by_year:
+                if writer is None:
+                    writer = _Writer(os.path.join(directory, f"transactions{extension}"), schema, file_format)
+                writer.write(_to_batch(rows, schema, category_index, category_names))
+                continue
+
+            # Строки упорядочены по дате, поэтому годы идут подряд
+            start = 0
+            while start < len(rows):
+                year = rows[start][1][:4]
+                end = start
+                while end < len(rows) and rows[end][1][:4] == year:
+                    end += 1
+                if year != current_year:
+                    if writer is not None:
+                        writer.close()
+                    part_dir = os.path.join(directory, "transactions", f"year={year}")
+                    os.makedirs(part_dir, exist_ok=True)
+                    writer = _Writer(os.path.join(part_dir, f"part-0{extension}"), schema, file_format)
+                    current_year = year
+                writer.write(_to_batch(rows[start:end], schema, category_index, category_names))
+                start = end
+    finally:
+        if writer is not None:
+            writer.close()
+    return exported
+
+
+def _iter_batches(path: str, file_format: str, batch_size: int) -> Iterator:
+    """Потоковое чтение RecordBatch из файла"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if file_format == 'parquet':
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+    else:
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+def _transaction_files(directory: str, extension: str) -> List[str]:
+    """Файлы транзакций: единый файл или годовые части"""
+    single = os.path.join(directory, f"transactions{extension}")
+    if os.path.exists(single):
+        return [single]
+    files = []
+    root = os.path.join(directory, "transactions")
+    for dirpath, _, filenames in sorted(os.walk(root)):
+        files.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(extension))
+    return files
+
+
+def _category_mapping(directory: str, file_format: str) -> Dict[int, int]:
+    """Сопоставление ID категорий из файла с ID в текущей базе (по названию).
+
+    Выгрузка из банка может не содержать категорий - тогда они определяются по описанию.
+    """
+    path = os.path.join(directory, f"categories{FORMATS[file_format]}")
+    if not os.path.exists(path):
+        return {}
+    local = {cat[1]: cat[0] for cat in db.get_all_categories()}
+    mapping = {}
+    for batch in _iter_batches(path, file_format, BATCH_SIZE):
+        for row in batch.to_pylist():
+            if row['name'] not in local:
+                db.add_category(row['name'], row['type'])
+                local = {cat[1]: cat[0] for cat in db.get_all_categories()}
+            mapping[row['id']] = local[row['name']]
+    return mapping
+
+
+def _account_mapping(directory: str, file_format: str) -> Dict[int, int]:
+    """Сопоставление ID счетов из файла с ID в текущей базе (по названию).
+
+    В экспорте прежних версий счетов нет - транзакции попадают на основной счет.
+    """
+    path = os.path.join(directory, f"accounts{FORMATS[file_format]}")
+    if not os.path.exists(path):
+        return {}
+    local = {acc[1]: acc[0] for acc in db.get_all_accounts()}
+    mapping = {}
+    for batch in _iter_batches(path, file_format, BATCH_SIZE):
+        for row in batch.to_pylist():
+            if row['name'] not in local:
+                local[row['name']] = db.add_account(row['name'], row['currency'])
+            mapping[row['id']] = local[row['name']]
+    return mapping
+
+
+def detect_format(directory: str) -> str:
+    """Определение формата экспортированного каталога по файлу категорий или транзакций"""
+    for file_format, extension in FORMATS.items():
+        if (os.path.exists(os.path.join(directory, f"categories{extension}"))
+                or _transaction_files(directory, extension)):
+            return file_format
+    raise FileNotFoundError("В каталоге нет данных в формате Parquet или Arrow")
+
+
+def import_data(directory: str, file_format: str = 'parquet', batch_size: int = BATCH_SIZE,
+                skip_duplicates: bool = True,
+                min_confidence: float = categorizer.MIN_CONFIDENCE) -> ImportResult:
+    """Импорт транзакций из каталога, созданного export_data.
+
+    Категории и счета сопоставляются по названию (недостающие создаются), транзакции
+    читаются порциями и добавляются одной пакетной вставкой. Уже имеющиеся
+    в базе транзакции (по отпечатку) по умолчанию пропускаются, поэтому
+    повторный импорт того же каталога ничего не дублирует. Строкам без
+    категории (выгрузка из банка) категория назначается по описанию, если
+    уверенность не ниже min_confidence, иначе - запасная категория.
+    """
+    mapping = _category_mapping(directory, file_format)
+    accounts = _account_mapping(directory, file_format)
+    # Индекс категорий читается до начала пакетной вставки (она идет одной транзакцией)
+    auto = categorizer.BatchCategorizer(min_confidence)
+
+    def rows():
+        for path in _transaction_files(directory, FORMATS[file_format]):
+            for batch in _iter_batches(path, file_format, batch_size):
+                columns = batch.to_pydict()
+                missing = [None] * batch.num_rows
+                # В экспорте прежних версий валюты нет - все суммы в базовой
+                currencies = columns.get('currency') or [db.BASE_CURRENCY] * batch.num_rows
+                account_ids = columns.get('account_id') or missing
+                for amount, category_id, day, description, receipt_path, currency, account_id in zip(
+                        columns['amount'], columns.get('category_id') or missing, columns['date'],
+                        columns.get('description') or missing, columns.get('receipt_path') or missing,
+                        currencies, account_ids):
+                    if isinstance(day, date):
+                        day = day.isoformat()
+                    # Без файла категорий ID из выгрузки ничего не значат
+                    category_id = mapping.get(category_id)
+                    if category_id is None:
+                        category_id, _ = auto.classify(description)
+                    yield (amount, category_id, day, description, receipt_path, currency,
+                           accounts.get(account_id, db.DEFAULT_ACCOUNT_ID))
+
+    inserted, duplicates = db.add_transactions_bulk(rows(), skip_duplicates)
+    return ImportResult(inserted, duplicates, auto.assigned, auto.uncertain)
@@ -0,0 +1,37 @@
+# currency.py - Валюты: обозначения и импорт курсов из файла
+
+import csv
+from typing import Optional
+import database as db
+
+# Обозначения валют в таблицах и полях ввода
+CURRENCY_SUFFIXES = {
+    'RUB': "руб.",
+    'USD': "$",
+    'EUR': "€",
+}
+
+
+def currency_suffix(currency: Optional[str]) -> str:
+    """Обозначение валюты; для неизвестных валют - ее код"""
+    currency = currency or db.BASE_CURRENCY
+    return CURRENCY_SUFFIXES.get(currency, currency)
+
+
+def import_rates_csv(path: str) -> int:
+    """Загрузка курсов валют из CSV со столбцами date, currency, rate.
+
+    rate - стоимость единицы валюты в базовой валюте на дату (yyyy-mm-dd).
+    Разделитель (запятая или точка с запятой) определяется автоматически,
+    десятичная запятая допускается. Возвращает количество загруженных курсов.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        sample = file.read(4096)
+        file.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        reader = csv.DictReader(file, dialect=dialect)
+        rows = []
+        for line in reader:
+            row = {key.strip().lower(): (value or "").strip() for key, value in line.items() if key}
+            rows.append((row['currency'].upper(), row['date'], float(row['rate'].replace(',', '.'))))
+    return db.add_fx_rates(rows)
@@ -2,42 +2,134 @@
 
 import sqlite3
 from sqlite3 import Error
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import os
+import re
+import hashlib
+import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+class _ConnectionSwitch:
+    """Соединение, через которое работают функции модуля.
+
+    Обычно это одно общее соединение, открытое initialize. Поток может
+    временно подставить свое соединение (using_connection) - так читатели
+    сервера API выполняют те же запросы параллельно с записью.
+    """
+
+    def __init__(self):
+        self.default: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+
+    def current(self) -> Optional[sqlite3.Connection]:
+        return getattr(self._local, 'connection', None) or self.default
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+    def __enter__(self):
+        return self.current().__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.current().__exit__(*exc_info)
+
+    def __bool__(self) -> bool:
+        return self.current() is not None
+
 
 # Глобальная переменная для хранения соединения с БД
-_connection = None
+_connection = _ConnectionSwitch()
+# Путь к файлу базы и годы, архивы которых подключены через ATTACH
+_db_file = None
+_attached_archives: List[int] = []
+# Кэш названий категорий по ID; сбрасывается при любом изменении справочника
+_category_names: Optional[Dict[int, str]] = None
+
+# Представление со всеми транзакциями: текущими и архивными
+ALL_TRANSACTIONS = "all_transactions"
+
+# Базовая валюта: в ней ведется статистика, остальные пересчитываются по курсу
+BASE_CURRENCY = "RUB"
+
+# Счет, к которому относятся транзакции без явно указанного счета
+DEFAULT_ACCOUNT_ID = 1
+
+# После пакетной вставки стольких строк статистика планировщика пересобирается
+ANALYZE_MIN_ROWS = 1000
+
+# Сколько первых слов описания учитывает автокатегоризация
+MAX_DESCRIPTION_TOKENS = 8
 
 def initialize(db_file: str = "finance.db") -> None:
     """Инициализация базы данных и создание таблиц"""
-    global _connection
+    global _db_file
     try:
         # Проверяем, существует ли база данных
         is_new_db = not os.path.exists(db_file)
         
-        _connection = sqlite3.connect(db_file)
+        _connection.default = sqlite3.connect(db_file)
+        _db_file = db_file
+        if is_new_db:
+            # Освободившиеся страницы возвращаются файлу понемногу (incremental_vacuum);
+            # режим задается до создания первой таблицы
+            _connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
         _create_tables()
         
-        # Если база уже существовала, проверяем и добавляем новый столбец
+        # Если база уже существовала, проверяем и добавляем новые столбцы
         if not is_new_db:
             _update_schema()
+        _create_indexes()
+        _create_balance_triggers()
+        _create_category_total_triggers()
             
         _add_default_categories()
+        _add_default_account()
+        _attach_archives()
+        with _connection:
+            _fill_fingerprints()
+        _train_category_tokens()
+        _fill_category_totals()
+        prune_change_log()
+        prune_edit_journal()
     except Error as e:
         print(f"Ошибка подключения к базе данных: {e}")
         raise
 
+# Столбцы, добавленные в таблицу transactions после первой версии схемы
+_ADDED_TRANSACTION_COLUMNS = [
+    ("receipt_path", "TEXT"),
+    ("recurring_rule_id", "INTEGER"),
+    ("recurring_period", "TEXT"),
+    ("fingerprint", "INTEGER"),
+    ("currency", f"TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'"),
+    ("account_id", f"INTEGER NOT NULL DEFAULT {DEFAULT_ACCOUNT_ID}"),
+]
+
+# Столбцы, добавленные в таблицу categories после первой версии схемы
+_ADDED_CATEGORY_COLUMNS = [
+    ("hidden", "INTEGER NOT NULL DEFAULT 0"),
+]
+
 def _update_schema():
     """Обновление схемы базы данных"""
     try:
-        # Проверяем, существует ли столбец receipt_path
+        # Проверяем, какие столбцы уже есть в таблице транзакций
         cursor = _connection.execute("PRAGMA table_info(transactions)")
         columns = [column[1] for column in cursor.fetchall()]
         
-        if 'receipt_path' not in columns:
-            # Добавляем столбец receipt_path
-            _connection.execute("ALTER TABLE transactions ADD COLUMN receipt_path TEXT")
-            _connection.commit()
+        for name, column_type in _ADDED_TRANSACTION_COLUMNS:
+            if name not in columns:
+                _connection.execute(f"ALTER TABLE transactions ADD COLUMN {name} {column_type}")
+
+        cursor = _connection.execute("PRAGMA table_info(categories)")
+        columns = [column[1] for column in cursor.fetchall()]
+        for name, column_type in _ADDED_CATEGORY_COLUMNS:
+            if name not in columns:
+                _connection.execute(f"ALTER TABLE categories ADD COLUMN {name} {column_type}")
+        _connection.commit()
     except Error as e:
         print(f"Ошибка обновления схемы базы данных: {e}")
         raise
@@ -48,7 +140,8 @@ def _create_tables() -> None:
     CREATE TABLE IF NOT EXISTS categories (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL UNIQUE,
-        type TEXT CHECK(type IN ('income', 'expense'))
+        type TEXT CHECK(type IN ('income', 'expense')),
+        hidden INTEGER NOT NULL DEFAULT 0
     )"""
 
     sql_transactions = """
@@ -59,29 +152,628 @@ def _create_tables() -> None:
         date TEXT NOT NULL,
         description TEXT,
         receipt_path TEXT,
+        recurring_rule_id INTEGER,
+        recurring_period TEXT,
+        fingerprint INTEGER,
+        currency TEXT NOT NULL DEFAULT '{BASE_CURRENCY}',
+        account_id INTEGER NOT NULL DEFAULT {DEFAULT_ACCOUNT_ID},
+        FOREIGN KEY(category_id) REFERENCES categories(id),
+        FOREIGN KEY(account_id) REFERENCES accounts(id)
+    )""".format(BASE_CURRENCY=BASE_CURRENCY, DEFAULT_ACCOUNT_ID=DEFAULT_ACCOUNT_ID)
+
+    # Счета (карты, наличные, вклады); остаток ведется в валюте счета
+    sql_accounts = """
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        currency TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'
+    )""".format(BASE_CURRENCY=BASE_CURRENCY)
+
+    # Остатки счетов на конец месяца (month - yyyy-mm). Хранятся только для
+    # месяцев с транзакциями и всегда образуют непрерывный префикс истории:
+    # изменение транзакции удаляет контрольные точки ее месяца и более поздние
+    sql_balance_checkpoints = """
+    CREATE TABLE IF NOT EXISTS balance_checkpoints (
+        account_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        balance REAL NOT NULL,
+        PRIMARY KEY(account_id, month)
+    ) WITHOUT ROWID"""
+
+    # Правила регулярных транзакций (аренда, зарплата, подписки)
+    sql_recurring_rules = """
+    CREATE TABLE IF NOT EXISTS recurring_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount REAL NOT NULL,
+        category_id INTEGER NOT NULL,
+        description TEXT,
+        frequency TEXT CHECK(frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+        start_date TEXT NOT NULL,
+        end_date TEXT,
+        last_generated TEXT,
+        active INTEGER NOT NULL DEFAULT 1,
         FOREIGN KEY(category_id) REFERENCES categories(id)
     )"""
 
+    # Журнал изменений: заполняется триггерами, по нему окна приложения
+    # и другие клиенты базы подтягивают только изменившиеся строки
+    sql_change_log = """
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        op TEXT CHECK(op IN ('insert', 'update', 'delete'))
+    )"""
+
+    # Журнал правок транзакций для отмены и повтора: прежнее и новое значение
+    # поля; отмененные записи (undone = 1) образуют стек повтора
+    sql_edit_journal = """
+    CREATE TABLE IF NOT EXISTS edit_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER NOT NULL,
+        field TEXT NOT NULL,
+        old_value,
+        new_value,
+        undone INTEGER NOT NULL DEFAULT 0
+    )"""
+
+    # Курсы валют к базовой валюте по дням (заполняются импортом, без сети)
+    sql_fx_rates = """
+    CREATE TABLE IF NOT EXISTS fx_rates (
+        currency TEXT NOT NULL,
+        date TEXT NOT NULL,
+        rate REAL NOT NULL,
+        PRIMARY KEY(currency, date)
+    ) WITHOUT ROWID"""
+
+    # Частотный индекс автокатегоризации: сколько транзакций с признаком token
+    # в описании отнесено к категории. Ведется при каждом изменении описания
+    # или категории транзакции (description_tokens)
+    sql_category_tokens = """
+    CREATE TABLE IF NOT EXISTS category_tokens (
+        token TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY(token, category_id)
+    ) WITHOUT ROWID"""
+
+    # Лимиты расходов по категориям на месяц или год
+    sql_budgets = """
+    CREATE TABLE IF NOT EXISTS budgets (
+        category_id INTEGER NOT NULL,
+        period TEXT NOT NULL CHECK(period IN ('month', 'year')),
+        amount_limit REAL NOT NULL,
+        PRIMARY KEY(category_id, period),
+        FOREIGN KEY(category_id) REFERENCES categories(id)
+    ) WITHOUT ROWID"""
+
+    # Суммы транзакций основной базы по категориям, дням и валютам в копейках;
+    # ведутся триггерами, поэтому расход категории за месяц - не больше 31 строки
+    # на валюту по первичному ключу, а не просмотр транзакций. Дни (а не месяцы)
+    # нужны для пересчета валют по курсу на дату, как в остальной статистике
+    sql_category_totals = """
+    CREATE TABLE IF NOT EXISTS category_totals (
+        category_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        cents INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY(category_id, date, currency)
+    ) WITHOUT ROWID"""
+
+    # Годы, перенесенные в отдельные архивные файлы
+    sql_archives = """
+    CREATE TABLE IF NOT EXISTS archives (
+        year INTEGER PRIMARY KEY,
+        path TEXT NOT NULL
+    )"""
+
     with _connection:
         _connection.execute(sql_categories)
+        _connection.execute(sql_accounts)
         _connection.execute(sql_transactions)
+        _connection.execute(sql_recurring_rules)
+        _connection.execute(sql_archives)
+        _connection.execute(sql_fx_rates)
+        _connection.execute(sql_balance_checkpoints)
+        _connection.execute(sql_change_log)
+        _connection.execute(sql_edit_journal)
+        _connection.execute(sql_category_tokens)
+        _connection.execute(sql_budgets)
+        _connection.execute(sql_category_totals)
+        for table in ('transactions', 'categories'):
+            _create_change_triggers(table)
+
+def _create_indexes() -> None:
+    """Создание индексов (после обновления схемы, когда все столбцы уже есть)"""
+    # Индекс по дате: выборки за период и сортировка по дате без полного сканирования
+    sql_date_index = """
+    CREATE INDEX IF NOT EXISTS idx_transactions_date
+    ON transactions(date, category_id, amount)"""
+
+    # Индекс для фильтра по категориям с упорядочиванием по дате; сумма и валюта
+    # включены, чтобы статистика по типам категорий читалась только из индекса
+    sql_category_index = """
+    CREATE INDEX IF NOT EXISTS idx_transactions_category_totals
+    ON transactions(category_id, date, currency, amount)"""
+
+    # Каждое правило создает не более одной транзакции за период
+    sql_recurring_index = """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_recurring
+    ON transactions(recurring_rule_id, recurring_period)
+    WHERE recurring_rule_id IS NOT NULL"""
+
+    # Отпечаток для поиска дубликатов (и строк, где он еще не посчитан)
+    sql_fingerprint_index = """
+    CREATE INDEX IF NOT EXISTS idx_transactions_fingerprint
+    ON transactions(fingerprint)"""
+
+    # Выписка и остатки счета: транзакции счета по порядку дат, категория
+    # (для знака суммы) и сумма читаются только из индекса
+    sql_account_index = """
+    CREATE INDEX IF NOT EXISTS idx_transactions_account
+    ON transactions(account_id, date, category_id, amount)"""
+
+    # Вершины стеков отмены и повтора в журнале правок
+    sql_edit_journal_index = """
+    CREATE INDEX IF NOT EXISTS idx_edit_journal_undone
+    ON edit_journal(undone, seq)"""
+
+    with _connection:
+        _connection.execute(sql_date_index)
+        # Прежние индексы по категории заменены покрывающим
+        _connection.execute("DROP INDEX IF EXISTS idx_transactions_category")
+        _connection.execute("DROP INDEX IF EXISTS idx_transactions_category_amount")
+        _connection.execute(sql_category_index)
+        _connection.execute(sql_recurring_index)
+        _connection.execute(sql_fingerprint_index)
+        _connection.execute(sql_account_index)
+        _connection.execute(sql_edit_journal_index)
+
+def _create_balance_triggers() -> None:
+    """Триггеры, удаляющие устаревшие контрольные точки остатков.
+
+    Создаются после обновления схемы: им нужен столбец account_id.
+    Изменение транзакции делает недействительными остатки ее счета с месяца
+    транзакции (при изменении - и с прежнего месяца и счета).
+    """
+    sql_delete = """DELETE FROM balance_checkpoints
+                    WHERE account_id = {row}.account_id AND month >= substr({row}.date, 1, 7);"""
+    with _connection:
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_balance
+        AFTER INSERT ON transactions
+        BEGIN
+            {sql_delete.format(row='NEW')}
+        END""")
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_balance
+        AFTER UPDATE OF amount, category_id, date, account_id ON transactions
+        BEGIN
+            {sql_delete.format(row='OLD')}
+            {sql_delete.format(row='NEW')}
+        END""")
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_balance
+        AFTER DELETE ON transactions
+        BEGIN
+            {sql_delete.format(row='OLD')}
+        END""")
+
+def _create_category_total_triggers() -> None:
+    """Триггеры, ведущие суммы транзакций по категориям и дням (category_totals).
+
+    Создаются после обновления схемы: им нужен столбец currency. Суммы
+    хранятся в копейках, чтобы многократные добавления и вычитания не
+    накапливали ошибку округления; опустевшие строки удаляются.
+    """
+    sql_add = """INSERT INTO category_totals(category_id, date, currency, cents, count)
+                 VALUES({row}.category_id, {row}.date, {row}.currency,
+                        CAST(round({row}.amount * 100) AS INTEGER), 1)
+                 ON CONFLICT(category_id, date, currency)
+                 DO UPDATE SET cents = cents + excluded.cents, count = count + 1;"""
+    sql_key = "category_id = {row}.category_id AND date = {row}.date AND currency = {row}.currency"
+    sql_remove = f"""UPDATE category_totals
+                     SET cents = cents - CAST(round({{row}}.amount * 100) AS INTEGER), count = count - 1
+                     WHERE {sql_key};
+                     DELETE FROM category_totals WHERE {sql_key} AND count <= 0;"""
+    with _connection:
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_totals
+        AFTER INSERT ON transactions
+        BEGIN
+            {sql_add.format(row='NEW')}
+        END""")
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_totals
+        AFTER UPDATE OF amount, category_id, date, currency ON transactions
+        BEGIN
+            {sql_remove.format(row='OLD')}
+            {sql_add.format(row='NEW')}
+        END""")
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_totals
+        AFTER DELETE ON transactions
+        BEGIN
+            {sql_remove.format(row='OLD')}
+        END""")
+
+def _create_change_triggers(table: str) -> None:
+    """Создание триггеров, записывающих изменения таблицы в change_log"""
+    for op, event, row in (('insert', 'INSERT', 'NEW'),
+                           ('update', 'UPDATE', 'NEW'),
+                           ('delete', 'DELETE', 'OLD')):
+        _connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_{op}_log
+        AFTER {event} ON {table}
+        BEGIN
+            INSERT INTO change_log(table_name, row_id, op) VALUES ('{table}', {row}.id, '{op}');
+        END""")
+
+def _archive_schema(year: int) -> str:
+    """Имя подключенной архивной базы года"""
+    return f"archive_{int(year)}"
+
+def archive_path(db_file: str, year: int) -> str:
+    """Путь к архивному файлу года базы db_file (рядом с ней)"""
+    base, _ = os.path.splitext(os.path.abspath(db_file))
+    return f"{base}_archive_{int(year)}.db"
+
+def _archive_path(year: int) -> str:
+    """Путь к архивному файлу года рядом с основной базой"""
+    return archive_path(_db_file, year)
+
+def _transaction_columns() -> List[Tuple[str, str]]:
+    """Столбцы основной таблицы транзакций: (имя, тип с ограничениями NOT NULL и DEFAULT)"""
+    cursor = _connection.execute("PRAGMA main.table_info(transactions)")
+    columns = []
+    for _, name, column_type, notnull, default, _ in cursor.fetchall():
+        if notnull and name != 'id':
+            column_type += " NOT NULL"
+        if default is not None:
+            column_type += f" DEFAULT {default}"
+        columns.append((name, column_type))
+    return columns
+
+def _transaction_tables() -> List[str]:
+    """Таблицы транзакций основной базы и подключенных архивов"""
+    return ["main.transactions"] + [f"{_archive_schema(year)}.transactions" for year in _attached_archives]
+
+def _fingerprint_count_sql() -> str:
+    """Запрос количества транзакций с отпечатком :fingerprint во всех таблицах транзакций.
+
+    Каждая таблица ищется по своему индексу fingerprint; представление
+    all_transactions для этого не используется, чтобы не зависеть от того,
+    перенесет ли планировщик условие внутрь UNION ALL.
+    """
+    return "SELECT " + " + ".join(f"(SELECT COUNT(*) FROM {table} WHERE fingerprint = :fingerprint)"
+                                  for table in _transaction_tables())
+
+def _ensure_archive_table(schema: str) -> None:
+    """Создание или дополнение таблицы транзакций в архивной базе"""
+    columns = _transaction_columns()
+    cursor = _connection.execute(f"PRAGMA {schema}.table_info(transactions)")
+    existing = {column[1] for column in cursor.fetchall()}
+    if not existing:
+        definitions = ", ".join(
+            "id INTEGER PRIMARY KEY" if name == 'id' else f"{name} {column_type}"
+            for name, column_type in columns
+        )
+        _connection.execute(f"CREATE TABLE {schema}.transactions ({definitions})")
+    else:
+        for name, column_type in columns:
+            if name not in existing:
+                _connection.execute(f"ALTER TABLE {schema}.transactions ADD COLUMN {name} {column_type}")
+    _connection.execute(f"""CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_date
+                            ON transactions(date, category_id, amount)""")
+    _connection.execute(f"""CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_fingerprint
+                            ON transactions(fingerprint)""")
+    _connection.execute(f"""CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_account
+                            ON transactions(account_id, date, category_id, amount)""")
+    _connection.commit()
+
+def _attach_archive(year: int, path: str) -> None:
+    """Подключение архивной базы года"""
+    if len(_attached_archives) >= _connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+        raise Error("Достигнут предел числа подключенных архивов SQLite")
+    _connection.execute(f"ATTACH DATABASE ? AS {_archive_schema(year)}", (path,))
+    _attached_archives.append(year)
+    _ensure_archive_table(_archive_schema(year))
+
+def _attach_archives() -> None:
+    """Подключение всех архивов и создание общего представления транзакций"""
+    _attached_archives.clear()
+    directory = os.path.dirname(os.path.abspath(_db_file))
+    for year, path in _connection.execute("SELECT year, path FROM archives ORDER BY year").fetchall():
+        full_path = os.path.join(directory, path)
+        if os.path.exists(full_path):
+            _attach_archive(year, full_path)
+        else:
+            print(f"Архив {year} года не найден: {full_path}")
+    _refresh_archive_view()
+
+def _refresh_archive_view() -> None:
+    """Пересоздание представления all_transactions (UNION ALL основной и архивных таблиц)"""
+    columns = ", ".join(name for name, _ in _transaction_columns())
+    parts = [f"SELECT {columns} FROM main.transactions"]
+    parts.extend(f"SELECT {columns} FROM {_archive_schema(year)}.transactions"
+                 for year in sorted(_attached_archives))
+    _connection.execute(f"DROP VIEW IF EXISTS temp.{ALL_TRANSACTIONS}")
+    _connection.execute(f"CREATE TEMP VIEW {ALL_TRANSACTIONS} AS {' UNION ALL '.join(parts)}")
+
+def get_archived_years() -> List[int]:
+    """Годы, перенесенные в архив и подключенные к базе"""
+    return sorted(_attached_archives)
+
+def get_archivable_years() -> List[int]:
+    """Закрытые (прошедшие) годы, транзакции которых еще в основной базе"""
+    # Годы перебираются от самой ранней даты, и для каждого проверяется наличие
+    # хотя бы одной транзакции - несколько поисков по индексу даты вместо
+    # чтения всех строк
+    sql = """WITH RECURSIVE years(year) AS (
+                 SELECT CAST(substr(MIN(date), 1, 4) AS INTEGER) FROM transactions
+                 UNION ALL
+                 SELECT year + 1 FROM years WHERE year + 1 < ?
+             )
+             SELECT year FROM years
+             WHERE year < ? AND EXISTS (
+                 SELECT 1 FROM transactions
+                 WHERE date >= printf('%04d-01-01', year) AND date < printf('%04d-01-01', year + 1)
+             )
+             ORDER BY year"""
+    try:
+        current_year = datetime.date.today().year
+        cursor = _connection.execute(sql, (current_year, current_year))
+        return [row[0] for row in cursor.fetchall()]
+    except Error as e:
+        print(f"Ошибка получения списка лет: {e}")
+        return []
+
+def archive_year(year: int) -> int:
+    """Перенос транзакций закрытого года в архивный файл.
+
+    Архив подключается через ATTACH; статистика, поиск и экспорт видят его
+    транзакции через представление all_transactions. Перенос выполняется одной
+    транзакцией по обеим базам. Возвращает количество перенесенных транзакций.
+    """
+    if year >= datetime.date.today().year:
+        raise ValueError("Архивировать можно только прошедшие годы")
+    try:
+        if year not in _attached_archives:
+            _attach_archive(year, _archive_path(year))
+        schema = _archive_schema(year)
+        columns = ", ".join(name for name, _ in _transaction_columns())
+        period = (f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+        with _connection:
+            cursor = _connection.execute(
+                f"""INSERT INTO {schema}.transactions({columns})
+                    SELECT {columns} FROM main.transactions WHERE date >= ? AND date < ?""",
+                period
+            )
+            moved = cursor.rowcount
+            _connection.execute("DELETE FROM main.transactions WHERE date >= ? AND date < ?", period)
+            _connection.execute("INSERT OR REPLACE INTO archives(year, path) VALUES(?, ?)",
+                                (year, os.path.basename(_archive_path(year))))
+        _refresh_archive_view()
+        return moved
+    except Error as e:
+        print(f"Ошибка архивирования года: {e}")
+        raise
+
+def unarchive_year(year: int) -> int:
+    """Возврат транзакций года из архива в основную базу"""
+    if year not in _attached_archives:
+        return 0
+    schema = _archive_schema(year)
+    try:
+        columns = ", ".join(name for name, _ in _transaction_columns())
+        with _connection:
+            cursor = _connection.execute(
+                f"""INSERT INTO main.transactions({columns})
+                    SELECT {columns} FROM {schema}.transactions"""
+            )
+            moved = cursor.rowcount
+            _connection.execute("DELETE FROM archives WHERE year = ?", (year,))
+        _connection.execute(f"DETACH DATABASE {schema}")
+        _attached_archives.remove(year)
+        os.remove(_archive_path(year))
+        _refresh_archive_view()
+        return moved
+    except Error as e:
+        print(f"Ошибка возврата года из архива: {e}")
+        raise
+
+_NON_WORD = re.compile(r"\W+")
+
+def normalize_description(description: Optional[str]) -> str:
+    """Описание для сравнения: без регистра, знаков препинания и лишних пробелов"""
+    text = (description or "").casefold().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+def make_fingerprint(date: str, amount: float, description: Optional[str], category_id: int,
+                     currency: Optional[str] = None) -> int:
+    """Отпечаток транзакции: 64-битный хэш даты, суммы в копейках,
+    нормализованного описания, категории и валюты (кроме базовой)"""
+    key = f"{date}|{int(round(float(amount) * 100))}|{normalize_description(description)}|{category_id}"
+    if currency and currency != BASE_CURRENCY:
+        key += f"|{currency}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def description_tokens(description: Optional[str]) -> List[str]:
+    """Признаки описания для автокатегоризации.
+
+    Слова нормализованного описания (кроме чисел и одиночных символов) и
+    признак продавца - все эти слова вместе, с префиксом "=": "Пятерочка 123"
+    и "ПЯТЕРОЧКА, 45" дают один и тот же продавец "=пятерочка".
+    """
+    words = [word for word in normalize_description(description).split()
+             if len(word) > 1 and not word.isdigit()]
+    words = list(dict.fromkeys(words))[:MAX_DESCRIPTION_TOKENS]
+    if not words:
+        return []
+    return words + ["=" + " ".join(words)]
+
+def _update_category_tokens(changes: Iterable[Tuple[Optional[str], int, int]]) -> None:
+    """Изменение индекса автокатегоризации: (описание, категория, +1 или -1).
+
+    Выполняется в транзакции вызывающего кода; обнулившиеся счетчики удаляются.
+    """
+    counts = Counter()
+    for description, category_id, delta in changes:
+        for token in description_tokens(description):
+            counts[(token, category_id)] += delta
+    counts = {key: delta for key, delta in counts.items() if delta}
+    if not counts:
+        return
+    _connection.executemany(
+        """INSERT INTO category_tokens(token, category_id, count) VALUES(?, ?, ?)
+           ON CONFLICT(token, category_id) DO UPDATE SET count = count + excluded.count""",
+        ((token, category_id, delta) for (token, category_id), delta in counts.items())
+    )
+    _connection.executemany(
+        "DELETE FROM category_tokens WHERE token = ? AND category_id = ? AND count <= 0",
+        [key for key, delta in counts.items() if delta < 0]
+    )
+
+def rebuild_category_tokens() -> int:
+    """Построение индекса автокатегоризации заново по всем транзакциям (включая архив).
+
+    Возвращает количество записей индекса.
+    """
+    sql = f"""SELECT description, category_id FROM {ALL_TRANSACTIONS}
+              WHERE description IS NOT NULL AND description != ''"""
+    try:
+        with _connection:
+            _connection.execute("DELETE FROM category_tokens")
+            _update_category_tokens((description, category_id, 1)
+                                    for description, category_id in _connection.execute(sql))
+        return _connection.execute("SELECT COUNT(*) FROM category_tokens").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка построения индекса категорий: {e}")
+        raise
+
+def _train_category_tokens() -> None:
+    """Первое построение индекса автокатегоризации для базы, где он еще пуст"""
+    if _connection.execute("SELECT 1 FROM category_tokens LIMIT 1").fetchone():
+        return
+    if _connection.execute("SELECT 1 FROM transactions WHERE description != '' LIMIT 1").fetchone():
+        rebuild_category_tokens()
+
+_SQL_FILL_CATEGORY_TOTALS = """
+INSERT INTO category_totals(category_id, date, currency, cents, count)
+SELECT category_id, date, currency, SUM(CAST(round(amount * 100) AS INTEGER)), COUNT(*)
+FROM main.transactions
+GROUP BY category_id, date, currency"""
+
+def rebuild_category_totals() -> int:
+    """Расчет сумм по категориям и дням заново по всем транзакциям основной базы.
+
+    Возвращает количество строк category_totals.
+    """
+    try:
+        with _connection:
+            _connection.execute("DELETE FROM category_totals")
+            _connection.execute(_SQL_FILL_CATEGORY_TOTALS)
+        return _connection.execute("SELECT COUNT(*) FROM category_totals").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка расчета сумм по категориям: {e}")
+        raise
+
+def _fill_category_totals() -> None:
+    """Первый расчет сумм по категориям для базы, созданной до появления бюджетов"""
+    if _connection.execute("SELECT 1 FROM category_totals LIMIT 1").fetchone():
+        return
+    if _connection.execute("SELECT 1 FROM transactions LIMIT 1").fetchone():
+        rebuild_category_totals()
+
+def get_category_token_counts(tokens: Optional[Iterable[str]] = None) -> List[Tuple[str, int, int]]:
+    """Записи индекса автокатегоризации: (признак, категория, количество).
+
+    tokens ограничивает выборку признаками одного описания (поиск по первичному ключу).
+    """
+    try:
+        if tokens is None:
+            return _connection.execute("SELECT token, category_id, count FROM category_tokens").fetchall()
+        tokens = list(tokens)
+        if not tokens:
+            return []
+        sql = f"""SELECT token, category_id, count FROM category_tokens
+                  WHERE token IN ({', '.join('?' * len(tokens))})"""
+        return _connection.execute(sql, tokens).fetchall()
+    except Error as e:
+        print(f"Ошибка чтения индекса категорий: {e}")
+        return []
+
+def _fill_fingerprints(table: Optional[str] = None) -> int:
+    """Расчет отпечатков для строк, где их нет (старые строки, строки других клиентов,
+    измененные строки). Строки без отпечатка находятся по индексу fingerprint.
+    Выполняется в транзакции вызывающего кода.
+    Возвращает количество обновленных строк.
+    """
+    tables = [table] if table else _transaction_tables()
+    updated = 0
+    for name in tables:
+        rows = _connection.execute(
+            f"""SELECT id, date, amount, description, category_id, currency
+                FROM {name} WHERE fingerprint IS NULL"""
+        ).fetchall()
+        _connection.executemany(
+            f"UPDATE {name} SET fingerprint = ? WHERE id = ?",
+            ((make_fingerprint(date, amount, description, category_id, currency), trans_id)
+             for trans_id, date, amount, description, category_id, currency in rows)
+        )
+        updated += len(rows)
+    return updated
+
+def _update_transaction_row(sql: str, params: Tuple, op: str, refill_fingerprint: bool) -> bool:
+    """Изменение строки транзакции по ID: в основной базе, а если ее там нет - в архивах.
+
+    sql содержит {table} на месте имени таблицы, ID транзакции - последний параметр.
+    op - операция для журнала изменений ('update' или 'delete'); если
+    refill_fingerprint, запрос сбрасывает отпечаток и он сразу пересчитывается.
+    Выполняется в транзакции вызывающего кода; возвращает, нашлась ли строка.
+    """
+    for table in _transaction_tables():
+        cursor = _connection.execute(sql.format(table=table), params)
+        if cursor.rowcount:
+            if refill_fingerprint:
+                _fill_fingerprints(table)
+            if table != "main.transactions":
+                # В архивных базах нет триггеров контрольных точек остатков и журнала
+                # изменений: триггер не может писать в таблицу другой базы. Запись
+                # журнала нужна, чтобы отметка состояния данных и другие окна видели правку
+                _connection.execute("DELETE FROM balance_checkpoints")
+                _connection.execute("INSERT INTO change_log(table_name, row_id, op) VALUES ('transactions', ?, ?)",
+                                    (params[-1], op))
+            return True
+    return False
+
+def _execute_for_transaction(sql: str, params: Tuple, refill_fingerprint: bool) -> None:
+    """Изменение строки транзакции по ID отдельной транзакцией БД"""
+    with _connection:
+        _update_transaction_row(sql, params, 'update', refill_fingerprint)
 
 def add_transaction(amount: float, category_id: int,
-                   date: str, description: str = "", receipt_path: str = None) -> None:
+                   date: str, description: str = "", receipt_path: str = None,
+                   currency: str = BASE_CURRENCY, account_id: int = DEFAULT_ACCOUNT_ID) -> None:
     """Добавление новой транзакции"""
-    sql = """INSERT INTO transactions(amount, category_id, date, description, receipt_path)
-             VALUES(?, ?, ?, ?, ?)"""
+    sql = """INSERT INTO transactions(amount, category_id, date, description, receipt_path,
+                                      currency, account_id, fingerprint)
+             VALUES(?, ?, ?, ?, ?, ?, ?, ?)"""
     try:
         with _connection:
-            _connection.execute(sql, (amount, category_id, date, description, receipt_path))
+            _connection.execute(sql, (amount, category_id, date, description, receipt_path, currency, account_id,
+                                      make_fingerprint(date, amount, description, category_id, currency)))
+            _update_category_tokens([(description, category_id, 1)])
     except Error as e:
         print(f"Ошибка добавления транзакции: {e}")
         raise
 
 def get_all_transactions() -> List[Tuple]:
     """Получение всех транзакций с дополнительной информацией"""
-    sql = """SELECT t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path
-             FROM transactions t
+    sql = """SELECT t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path, t.currency
+             FROM all_transactions t
              JOIN categories c ON t.category_id = c.id
              ORDER BY t.date DESC"""
     try:
@@ -92,31 +784,163 @@ def get_all_transactions() -> List[Tuple]:
         print(f"Ошибка получения транзакций: {e}")
         return []
 
+def add_transactions_bulk(rows: Iterable[Tuple], skip_duplicates: bool = False) -> Tuple[int, int]:
+    """Пакетное добавление транзакций одной транзакцией БД.
+
+    rows - (amount, category_id, date, description, receipt_path, currency, account_id).
+    Для каждой строки считается отпечаток, и поиском по индексам проверяется,
+    сколько таких транзакций уже есть в основной базе и архивах. Строка
+    считается дубликатом, если в базе уже есть не меньше одинаковых строк,
+    чем встретилось в импорте до нее включительно (две одинаковые покупки за
+    день не склеиваются). При skip_duplicates дубликаты пропускаются, иначе
+    добавляются и попадают в отчет о дубликатах.
+    Транзакция БД открывается сразу с блокировкой записи (BEGIN IMMEDIATE):
+    поиск дубликатов идет внутри нее, и отложенная транзакция начала бы с
+    чтения. Если между чтением и первой вставкой другой клиент записал в базу
+    в режиме WAL, повысить ее до записи нельзя - SQLite сразу возвращает
+    "database is locked", не дожидаясь busy_timeout.
+    Возвращает (количество добавленных транзакций, количество дубликатов).
+    """
+    sql = """INSERT INTO transactions(amount, category_id, date, description, receipt_path,
+                                      currency, account_id, fingerprint)
+             VALUES(?, ?, ?, ?, ?, ?, ?, ?)"""
+    sql_count = _fingerprint_count_sql()
+    existing: Dict[int, int] = {}
+    seen: Dict[int, int] = {}
+    duplicates = 0
+    # Описания и категории добавленных строк - для индекса автокатегоризации
+    added: List[Tuple[str, int, int]] = []
+
+    def checked_rows():
+        nonlocal duplicates
+        for amount, category_id, date, description, receipt_path, currency, account_id in rows:
+            currency = currency or BASE_CURRENCY
+            fingerprint = make_fingerprint(date, amount, description, category_id, currency)
+            if fingerprint not in existing:
+                existing[fingerprint] = _connection.execute(sql_count, {'fingerprint': fingerprint}).fetchone()[0]
+            seen[fingerprint] = seen.get(fingerprint, 0) + 1
+            if seen[fingerprint] <= existing[fingerprint]:
+                duplicates += 1
+                if skip_duplicates:
+                    continue
+            added.append((description, category_id, 1))
+            yield (amount, category_id, date, description, receipt_path, currency,
+                   account_id or DEFAULT_ACCOUNT_ID, fingerprint)
+
+    try:
+        with _connection:
+            _connection.execute("BEGIN IMMEDIATE")
+            cursor = _connection.executemany(sql, checked_rows())
+            inserted = max(cursor.rowcount, 0)
+            _update_category_tokens(added)
+        # Крупный импорт меняет распределение данных - планировщику нужна свежая статистика
+        if inserted >= ANALYZE_MIN_ROWS:
+            analyze()
+        return inserted, duplicates
+    except Error as e:
+        print(f"Ошибка пакетного добавления транзакций: {e}")
+        raise
+
+def iter_export_rows() -> Iterator[Tuple]:
+    """Курсор для экспорта: (id, date, amount, category_id, description, receipt_path, currency,
+    account_id) в порядке дат; читать порциями через fetchmany"""
+    sql = """SELECT t.id, t.date, t.amount, t.category_id, t.description, t.receipt_path, t.currency,
+                    t.account_id
+             FROM all_transactions t
+             JOIN categories c ON t.category_id = c.id
+             ORDER BY t.date, t.id"""
+    try:
+        return _connection.execute(sql)
+    except Error as e:
+        print(f"Ошибка получения транзакций для экспорта: {e}")
+        raise
+
+def iter_transactions(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      category_ids: Optional[Iterable[int]] = None,
+                      has_receipt: Optional[bool] = None,
+                      limit: Optional[int] = None,
+                      include_archive: bool = False) -> Iterator[Tuple]:
+    """Потоковое чтение транзакций в порядке ID без промежуточного списка.
+
+    Условия фильтра выполняются в SQL по индексам даты и категории;
+    limit ограничивает выборку самыми новыми транзакциями;
+    include_archive добавляет транзакции из архивных лет.
+    """
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append("t.date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("t.date < ?")
+        params.append(end_date)
+    if category_ids:
+        category_ids = list(category_ids)
+        conditions.append(f"t.category_id IN ({', '.join('?' * len(category_ids))})")
+        params.extend(category_ids)
+    if has_receipt is not None:
+        conditions.append("t.receipt_path IS NOT NULL AND t.receipt_path != ''" if has_receipt
+                          else "(t.receipt_path IS NULL OR t.receipt_path = '')")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    table = ALL_TRANSACTIONS if include_archive else "transactions"
+    sql = f"""SELECT t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path, t.currency
+              FROM {table} t
+              JOIN categories c ON t.category_id = c.id
+              {where}"""
+    if limit is not None:
+        sql = f"""SELECT * FROM ({sql} ORDER BY t.date DESC, t.id DESC LIMIT ?)
+                  ORDER BY id"""
+        params.append(limit)
+    else:
+        sql += " ORDER BY t.id"
+    try:
+        return _connection.execute(sql, params)
+    except Error as e:
+        print(f"Ошибка получения транзакций: {e}")
+        return iter(())
+
+def count_transactions() -> int:
+    """Количество транзакций в базе"""
+    try:
+        cursor = _connection.execute("SELECT COUNT(*) FROM transactions")
+        return cursor.fetchone()[0]
+    except Error as e:
+        print(f"Ошибка подсчета транзакций: {e}")
+        return 0
+
+def _description_and_category(transaction_id: int) -> Optional[Tuple[Optional[str], int]]:
+    """Описание и категория транзакции (для индекса автокатегоризации)"""
+    sql = f"SELECT description, category_id FROM {ALL_TRANSACTIONS} WHERE id = ?"
+    return _connection.execute(sql, (transaction_id,)).fetchone()
+
 def delete_transaction(transaction_id: int) -> None:
     """Удаление транзакции по ID"""
-    sql = "DELETE FROM transactions WHERE id = ?"
+    sql = "DELETE FROM {table} WHERE id = ?"
     try:
         with _connection:
-            _connection.execute(sql, (transaction_id,))
+            old = _description_and_category(transaction_id)
+            if _update_transaction_row(sql, (transaction_id,), 'delete', False) and old:
+                _update_category_tokens([(old[0], old[1], -1)])
     except Error as e:
         print(f"Ошибка удаления транзакции: {e}")
         raise
 
 def get_category_name(category_id: int) -> str:
-    """Получение названия категории по ID"""
-    sql = "SELECT name FROM categories WHERE id = ?"
-    try:
-        with _connection:
-            cursor = _connection.execute(sql, (category_id,))
-            result = cursor.fetchone()
-            return result[0] if result else ""
-    except Error as e:
-        print(f"Ошибка получения названия категории: {e}")
-        return ""
+    """Получение названия категории по ID (справочник читается один раз и кэшируется)"""
+    global _category_names
+    if _category_names is None:
+        _category_names = {cat[0]: cat[1] for cat in get_all_categories()}
+    return _category_names.get(category_id, "")
+
+def invalidate_category_cache() -> None:
+    """Сброс кэша названий категорий (например, после изменения справочника другим клиентом)"""
+    global _category_names
+    _category_names = None
 
 def get_all_categories() -> List[Tuple]:
-    """Получение списка всех категорий"""
-    sql = "SELECT id, name, type FROM categories ORDER BY name"
+    """Получение списка всех категорий: (id, name, type, hidden)"""
+    sql = "SELECT id, name, type, hidden FROM categories ORDER BY name"
     try:
         with _connection:
             cursor = _connection.execute(sql)
@@ -131,14 +955,141 @@ def add_category(name: str, category_type: str) -> None:
     try:
         with _connection:
             _connection.execute(sql, (name, category_type))
+        invalidate_category_cache()
     except Error as e:
         print(f"Ошибка добавления категории: {e}")
         raise
 
+def rename_category(category_id: int, new_name: str) -> None:
+    """Переименование категории"""
+    sql = "UPDATE categories SET name = ? WHERE id = ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (new_name, category_id))
+        invalidate_category_cache()
+    except Error as e:
+        print(f"Ошибка переименования категории: {e}")
+        raise
+
+def set_category_hidden(category_id: int, hidden: bool) -> None:
+    """Скрытие категории из списков выбора (транзакции категории остаются)"""
+    sql = "UPDATE categories SET hidden = ? WHERE id = ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (1 if hidden else 0, category_id))
+        invalidate_category_cache()
+    except Error as e:
+        print(f"Ошибка изменения категории: {e}")
+        raise
+
+def merge_categories(source_id: int, target_id: int) -> int:
+    """Перенос всех транзакций и правил категории source_id в target_id и удаление source_id.
+
+    Выполняется одной транзакцией по основной базе и подключенным архивам.
+    Возвращает количество перенесенных транзакций.
+    """
+    if source_id == target_id:
+        return 0
+    tables = _transaction_tables()
+    try:
+        moved = 0
+        with _connection:
+            for table in tables:
+                # Категория входит в отпечаток - он пересчитывается
+                cursor = _connection.execute(
+                    f"UPDATE {table} SET category_id = ?, fingerprint = NULL WHERE category_id = ?",
+                    (target_id, source_id)
+                )
+                moved += cursor.rowcount
+                _fill_fingerprints(table)
+            # Тип категории задает знак суммы в остатках; в архивах нет триггеров
+            if _attached_archives:
+                _connection.execute("DELETE FROM balance_checkpoints")
+            _connection.execute("UPDATE recurring_rules SET category_id = ? WHERE category_id = ?",
+                                (target_id, source_id))
+            _connection.execute(
+                """INSERT INTO category_tokens(token, category_id, count)
+                   SELECT token, ?, count FROM category_tokens WHERE category_id = ?
+                   ON CONFLICT(token, category_id) DO UPDATE SET count = count + excluded.count""",
+                (target_id, source_id)
+            )
+            _connection.execute("DELETE FROM category_tokens WHERE category_id = ?", (source_id,))
+            # Бюджет переходит к целевой категории, если у нее нет своего на тот же период
+            _connection.execute("UPDATE OR IGNORE budgets SET category_id = ? WHERE category_id = ?",
+                                (target_id, source_id))
+            _connection.execute("DELETE FROM budgets WHERE category_id = ?", (source_id,))
+            _connection.execute("DELETE FROM categories WHERE id = ?", (source_id,))
+        invalidate_category_cache()
+        return moved
+    except Error as e:
+        print(f"Ошибка объединения категорий: {e}")
+        raise
+
+def open_connection(read_only: bool = False) -> sqlite3.Connection:
+    """Отдельное соединение к уже инициализированной базе.
+
+    Подключаются те же архивы и создается то же представление all_transactions,
+    поэтому функции модуля работают с ним без изменений (using_connection).
+    Соединение можно передавать между потоками, но использовать - одним потоком за раз.
+    """
+    connection = sqlite3.connect(_db_file, check_same_thread=False)
+    try:
+        with using_connection(connection):
+            for year in list(_attached_archives):
+                connection.execute(f"ATTACH DATABASE ? AS {_archive_schema(year)}", (_archive_path(year),))
+            _refresh_archive_view()
+        if read_only:
+            connection.execute("PRAGMA query_only = 1")
+        return connection
+    except Error as e:
+        connection.close()
+        print(f"Ошибка открытия соединения: {e}")
+        raise
+
+def open_reader_connection() -> sqlite3.Connection:
+    """Отдельное соединение только для чтения (читатели сервера API, фоновая загрузка)"""
+    return open_connection(read_only=True)
+
+@contextmanager
+def using_connection(connection: sqlite3.Connection):
+    """Выполнение функций модуля в текущем потоке через другое соединение"""
+    previous = getattr(_connection._local, 'connection', None)
+    _connection._local.connection = connection
+    try:
+        yield connection
+    finally:
+        _connection._local.connection = previous
+
+def set_journal_mode(mode: str) -> str:
+    """Режим журнала базы (WAL позволяет читать параллельно с записью); возвращает установленный"""
+    try:
+        return _connection.execute(f"PRAGMA journal_mode = {mode}").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка смены режима журнала: {e}")
+        raise
+
+def set_busy_timeout(milliseconds: int) -> int:
+    """Сколько соединение ждет снятия блокировки другим клиентом, прежде чем
+    получить ошибку "database is locked"; возвращает установленное значение"""
+    try:
+        return _connection.execute(f"PRAGMA busy_timeout = {int(milliseconds)}").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка установки времени ожидания блокировки: {e}")
+        raise
+
 def close_connection() -> None:
-    """Закрытие соединения с базой данных"""
+    """Закрытие соединения с базой данных.
+
+    Перед закрытием PRAGMA optimize обновляет статистику планировщика для
+    таблиц, запросы к которым выполнялись за время работы соединения.
+    """
     if _connection:
+        try:
+            _connection.execute("PRAGMA optimize")
+        except Error as e:
+            print(f"Ошибка оптимизации базы данных: {e}")
         _connection.close()
+        _connection.default = None
 
 def _add_default_categories() -> None:
     """Добавление начальных категорий"""
@@ -164,56 +1115,113 @@ def _add_default_categories() -> None:
             except:
                 continue
 
+def _add_default_account() -> None:
+    """Создание основного счета, к которому относятся транзакции без счета"""
+    sql = "INSERT OR IGNORE INTO accounts(id, name, currency) VALUES(?, ?, ?)"
+    with _connection:
+        _connection.execute(sql, (DEFAULT_ACCOUNT_ID, "Основной счет", BASE_CURRENCY))
+
+def get_all_accounts() -> List[Tuple]:
+    """Получение списка счетов: (id, name, currency)"""
+    sql = "SELECT id, name, currency FROM accounts ORDER BY id"
+    try:
+        cursor = _connection.execute(sql)
+        return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка получения счетов: {e}")
+        return []
+
+def add_account(name: str, currency: str = BASE_CURRENCY) -> int:
+    """Добавление нового счета"""
+    sql = "INSERT INTO accounts(name, currency) VALUES(?, ?)"
+    try:
+        with _connection:
+            cursor = _connection.execute(sql, (name, currency))
+            return cursor.lastrowid
+    except Error as e:
+        print(f"Ошибка добавления счета: {e}")
+        raise
+
+def update_transaction_account(transaction_id: int, new_account_id: int) -> None:
+    """Перенос транзакции на другой счет"""
+    sql = "UPDATE {table} SET account_id = ? WHERE id = ?"
+    try:
+        _execute_for_transaction(sql, (new_account_id, transaction_id), False)
+    except Error as e:
+        print(f"Ошибка обновления счета транзакции: {e}")
+        raise
+
 def update_transaction_date(transaction_id: int, new_date: str) -> None:
     """Обновление даты транзакции"""
-    sql = "UPDATE transactions SET date = ? WHERE id = ?"
+    sql = "UPDATE {table} SET date = ?, fingerprint = NULL WHERE id = ?"
     try:
-        with _connection:
-            _connection.execute(sql, (new_date, transaction_id))
+        _execute_for_transaction(sql, (new_date, transaction_id), True)
     except Error as e:
         print(f"Ошибка обновления даты транзакции: {e}")
         raise
 
 def update_transaction_category(transaction_id: int, new_category_id: int) -> None:
     """Обновление категории транзакции"""
-    sql = "UPDATE transactions SET category_id = ? WHERE id = ?"
     try:
         with _connection:
-            _connection.execute(sql, (new_category_id, transaction_id))
+            _update_transaction_fields(transaction_id, {'category_id': new_category_id})
     except Error as e:
         print(f"Ошибка обновления категории транзакции: {e}")
         raise
 
 def update_transaction_amount(transaction_id: int, new_amount: float) -> None:
     """Обновление суммы транзакции"""
-    sql = "UPDATE transactions SET amount = ? WHERE id = ?"
+    sql = "UPDATE {table} SET amount = ?, fingerprint = NULL WHERE id = ?"
     try:
-        with _connection:
-            _connection.execute(sql, (new_amount, transaction_id))
+        _execute_for_transaction(sql, (new_amount, transaction_id), True)
     except Error as e:
         print(f"Ошибка обновления суммы транзакции: {e}")
         raise
 
 def update_transaction_description(transaction_id: int, new_description: str) -> None:
     """Обновление описания транзакции"""
-    sql = "UPDATE transactions SET description = ? WHERE id = ?"
     try:
         with _connection:
-            _connection.execute(sql, (new_description, transaction_id))
+            _update_transaction_fields(transaction_id, {'description': new_description})
     except Error as e:
         print(f"Ошибка обновления описания транзакции: {e}")
         raise
 
+def _rate_sql(alias: str) -> str:
+    """SQL-выражение курса валюты строки alias (столбцы currency и date) к базовой.
+
+    Берется курс на дату или последний известный до нее - поиск по первичному
+    ключу fx_rates. Если более ранних курсов нет, используется самый ранний
+    известный, а без курсов валюты сумма учитывается как есть.
+    """
+    return f"""CASE WHEN {alias}.currency = '{BASE_CURRENCY}' THEN 1.0 ELSE COALESCE(
+        (SELECT r.rate FROM fx_rates r
+         WHERE r.currency = {alias}.currency AND r.date <= {alias}.date
+         ORDER BY r.date DESC LIMIT 1),
+        (SELECT r.rate FROM fx_rates r
+         WHERE r.currency = {alias}.currency
+         ORDER BY r.date LIMIT 1),
+        1.0) END"""
+
 def get_monthly_statistics() -> List[Tuple[int, int, float]]:
-    """Получение статистики расходов по месяцам и годам"""
-    sql = """
+    """Получение статистики расходов по месяцам и годам (в базовой валюте).
+
+    Суммы сначала складываются по дням и валютам, поэтому курс ищется один раз
+    на день и валюту, а не для каждой транзакции.
+    """
+    sql = f"""
+    WITH daily AS (
+        SELECT t.date, t.currency, SUM(t.amount) as amount
+        FROM all_transactions t
+        JOIN categories ON t.category_id = categories.id
+        WHERE categories.type = 'expense'
+        GROUP BY t.date, t.currency
+    )
     SELECT 
         CAST(strftime('%Y', date) AS INTEGER) as year,
         CAST(strftime('%m', date) AS INTEGER) as month,
-        SUM(amount) as total
-    FROM transactions
-    JOIN categories ON transactions.category_id = categories.id
-    WHERE categories.type = 'expense'
+        SUM(amount * {_rate_sql('daily')}) as total
+    FROM daily
     GROUP BY year, month
     ORDER BY year DESC, month ASC
     """
@@ -225,16 +1233,760 @@ def get_monthly_statistics() -> List[Tuple[int, int, float]]:
         print(f"Ошибка получения статистики: {e}")
         return []
 
+def get_monthly_income_expense() -> List[Tuple[int, int, float, float]]:
+    """Доходы и расходы по месяцам в базовой валюте: (год, месяц, доходы, расходы) в порядке времени"""
+    sql = f"""
+    WITH daily AS (
+        SELECT t.date, t.currency,
+               SUM(CASE WHEN c.type = 'income' THEN t.amount ELSE 0 END) as income,
+               SUM(CASE WHEN c.type = 'expense' THEN t.amount ELSE 0 END) as expense
+        FROM categories c
+        CROSS JOIN all_transactions t ON t.category_id = c.id
+        GROUP BY t.date, t.currency
+    ),
+    rated AS (
+        SELECT date, income, expense, {_rate_sql('daily')} as rate
+        FROM daily
+    )
+    SELECT
+        CAST(strftime('%Y', date) AS INTEGER) as year,
+        CAST(strftime('%m', date) AS INTEGER) as month,
+        SUM(income * rate) as income,
+        SUM(expense * rate) as expense
+    FROM rated
+    GROUP BY year, month
+    ORDER BY year, month
+    """
+    try:
+        with _connection:
+            cursor = _connection.execute(sql)
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка получения доходов и расходов: {e}")
+        return []
+
+def add_fx_rates(rows: Iterable[Tuple[str, str, float]]) -> int:
+    """Добавление или замена курсов валют: (валюта, дата, курс к базовой валюте)"""
+    sql = "INSERT OR REPLACE INTO fx_rates(currency, date, rate) VALUES(?, ?, ?)"
+    try:
+        with _connection:
+            cursor = _connection.executemany(sql, rows)
+            return max(cursor.rowcount, 0)
+    except Error as e:
+        print(f"Ошибка добавления курсов валют: {e}")
+        raise
+
+def get_currencies() -> List[str]:
+    """Базовая валюта и валюты, для которых загружены курсы"""
+    sql = "SELECT DISTINCT currency FROM fx_rates ORDER BY currency"
+    try:
+        cursor = _connection.execute(sql)
+        return [BASE_CURRENCY] + [row[0] for row in cursor.fetchall() if row[0] != BASE_CURRENCY]
+    except Error as e:
+        print(f"Ошибка получения списка валют: {e}")
+        return [BASE_CURRENCY]
+
+def get_data_version() -> int:
+    """Версия данных SQLite: меняется при фиксации изменений другими соединениями"""
+    try:
+        return _connection.execute("PRAGMA data_version").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка получения версии данных: {e}")
+        return 0
+
+def get_last_change_seq() -> int:
+    """Номер последней записи журнала изменений"""
+    try:
+        cursor = _connection.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+        return cursor.fetchone()[0]
+    except Error as e:
+        print(f"Ошибка чтения журнала изменений: {e}")
+        return 0
+
+def get_data_stamp() -> List:
+    """Отметка состояния данных, сравнимая между запусками приложения.
+
+    PRAGMA data_version для этого не подходит: он имеет смысл только в пределах
+    одного соединения. Отметка - номер последней записи журнала изменений
+    (транзакции и категории, включая перенос в архив) и сводка таблицы курсов,
+    от которых зависит статистика.
+    """
+    try:
+        seq = _connection.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        count, total = _connection.execute("SELECT COUNT(*), TOTAL(rate) FROM fx_rates").fetchone()
+        return [seq, count, total]
+    except Error as e:
+        print(f"Ошибка чтения отметки состояния данных: {e}")
+        return []
+
+def get_database_file() -> Optional[str]:
+    """Полный путь к открытому файлу базы (None, если база не открыта)"""
+    return os.path.abspath(_db_file) if _db_file else None
+
+def get_first_change_seq() -> int:
+    """Номер самой старой сохраненной записи журнала изменений"""
+    try:
+        cursor = _connection.execute("SELECT COALESCE(MIN(seq), 0) FROM change_log")
+        return cursor.fetchone()[0]
+    except Error as e:
+        print(f"Ошибка чтения журнала изменений: {e}")
+        return 0
+
+def get_changes_since(seq: int) -> List[Tuple[str, int, str, int]]:
+    """Изменения после записи seq: (таблица, id строки, последняя операция, seq)"""
+    sql = """
+    SELECT l.table_name, l.row_id, l.op, l.seq
+    FROM change_log l
+    JOIN (SELECT table_name, row_id, MAX(seq) AS seq
+          FROM change_log
+          WHERE seq > ?
+          GROUP BY table_name, row_id) last ON last.seq = l.seq
+    ORDER BY l.seq
+    """
+    try:
+        with _connection:
+            cursor = _connection.execute(sql, (seq,))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка чтения журнала изменений: {e}")
+        return []
+
+def get_transactions_by_ids(transaction_ids: Iterable[int], chunk_size: int = 500) -> List[Tuple]:
+    """Получение транзакций по списку ID, включая архивные (запросами по chunk_size штук)"""
+    transaction_ids = list(transaction_ids)
+    result = []
+    try:
+        with _connection:
+            for start in range(0, len(transaction_ids), chunk_size):
+                chunk = transaction_ids[start:start + chunk_size]
+                sql = f"""SELECT t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path,
+                                 t.currency
+                          FROM {ALL_TRANSACTIONS} t
+                          JOIN categories c ON t.category_id = c.id
+                          WHERE t.id IN ({', '.join('?' * len(chunk))})"""
+                result.extend(_connection.execute(sql, chunk))
+        result.sort()
+        return result
+    except Error as e:
+        print(f"Ошибка получения транзакций: {e}")
+        return []
+
+def prune_change_log(keep: int = 10000) -> None:
+    """Удаление старых записей журнала изменений, кроме последних keep"""
+    sql = "DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (keep,))
+    except Error as e:
+        print(f"Ошибка очистки журнала изменений: {e}")
+
+def add_recurring_rule(amount: float, category_id: int, frequency: str, start_date: str,
+                       description: str = "", end_date: str = None) -> int:
+    """Добавление правила регулярной транзакции"""
+    sql = """INSERT INTO recurring_rules(amount, category_id, description, frequency, start_date, end_date)
+             VALUES(?, ?, ?, ?, ?, ?)"""
+    try:
+        with _connection:
+            cursor = _connection.execute(sql, (amount, category_id, description, frequency,
+                                               start_date, end_date))
+            return cursor.lastrowid
+    except Error as e:
+        print(f"Ошибка добавления регулярной транзакции: {e}")
+        raise
+
+def get_recurring_rules(active_only: bool = False) -> List[Tuple]:
+    """Получение правил регулярных транзакций:
+    (id, amount, category_id, description, frequency, start_date, end_date, last_generated, active)"""
+    sql = """SELECT id, amount, category_id, description, frequency, start_date, end_date,
+                    last_generated, active
+             FROM recurring_rules"""
+    if active_only:
+        sql += " WHERE active = 1"
+    sql += " ORDER BY id"
+    try:
+        with _connection:
+            cursor = _connection.execute(sql)
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка получения регулярных транзакций: {e}")
+        return []
+
+def set_recurring_rule_active(rule_id: int, active: bool) -> None:
+    """Включение или приостановка правила регулярной транзакции"""
+    sql = "UPDATE recurring_rules SET active = ? WHERE id = ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (1 if active else 0, rule_id))
+    except Error as e:
+        print(f"Ошибка обновления регулярной транзакции: {e}")
+        raise
+
+def delete_recurring_rule(rule_id: int) -> None:
+    """Удаление правила регулярной транзакции (созданные транзакции остаются)"""
+    sql = "DELETE FROM recurring_rules WHERE id = ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (rule_id,))
+    except Error as e:
+        print(f"Ошибка удаления регулярной транзакции: {e}")
+        raise
+
+def insert_recurring_transactions(rows: List[Tuple], last_generated: List[Tuple[str, int]]) -> int:
+    """Пакетная вставка транзакций по правилам в одной транзакции БД.
+
+    rows - (amount, category_id, date, description, rule_id, period);
+    повторная вставка того же периода правила пропускается уникальным индексом.
+    last_generated - (последний сгенерированный период, rule_id).
+    Возвращает количество действительно добавленных транзакций.
+    """
+    sql_insert = """INSERT OR IGNORE INTO transactions(amount, category_id, date, description,
+                                                       recurring_rule_id, recurring_period, fingerprint)
+                    VALUES(?, ?, ?, ?, ?, ?, ?)"""
+    sql_update = "UPDATE recurring_rules SET last_generated = ? WHERE id = ?"
+    try:
+        with _connection:
+            added = []
+            for row in rows:
+                cursor = _connection.execute(sql_insert, row + (make_fingerprint(row[2], row[0], row[3], row[1]),))
+                if cursor.rowcount > 0:
+                    added.append((row[3], row[1], 1))
+            _update_category_tokens(added)
+            _connection.executemany(sql_update, last_generated)
+            return len(added)
+    except Error as e:
+        print(f"Ошибка добавления регулярных транзакций: {e}")
+        raise
+
+def get_month_range(year: int, month: int) -> Tuple[str, str]:
+    """Границы месяца в формате дат БД: [начало, начало следующего месяца)"""
+    start = f"{year:04d}-{month:02d}-01"
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
+def get_transactions_for_period(start_date: str, end_date: str) -> List[Tuple]:
+    """Получение транзакций за период [start_date, end_date) по индексу даты"""
+    sql = """SELECT t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path
+             FROM all_transactions t
+             JOIN categories c ON t.category_id = c.id
+             WHERE t.date >= ? AND t.date < ?
+             ORDER BY t.date DESC"""
+    try:
+        with _connection:
+            cursor = _connection.execute(sql, (start_date, end_date))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка получения транзакций за период: {e}")
+        return []
+
+def get_category_breakdown(start_date: str, end_date: str) -> List[Tuple[int, str, float]]:
+    """Расходы по категориям за период [start_date, end_date) в базовой валюте"""
+    sql = f"""
+    WITH daily AS (
+        SELECT t.category_id, t.date, t.currency, SUM(t.amount) as amount
+        FROM all_transactions t
+        WHERE t.date >= ? AND t.date < ?
+        GROUP BY t.category_id, t.date, t.currency
+    )
+    SELECT c.id, c.name, SUM(daily.amount * {_rate_sql('daily')}) as total
+    FROM daily
+    JOIN categories c ON daily.category_id = c.id
+    WHERE c.type = 'expense'
+    GROUP BY c.id
+    ORDER BY total DESC
+    """
+    try:
+        with _connection:
+            cursor = _connection.execute(sql, (start_date, end_date))
+            return cursor.fetchall()
+    except Error as e:
+        print(f"Ошибка получения статистики по категориям: {e}")
+        return []
+
+# Группировки отчета: ключ строки и его подпись
+_REPORT_GROUPS = {
+    'total': ("NULL", "NULL"),
+    'category': ("c.id", "c.name"),
+    'year': ("CAST(substr(daily.date, 1, 4) AS INTEGER)", "substr(daily.date, 1, 4)"),
+    'month': ("substr(daily.date, 1, 7)", "substr(daily.date, 1, 7)"),
+    'day': ("daily.date", "daily.date"),
+}
+# Показатели отчета по суммам в базовой валюте и числу транзакций
+_REPORT_METRICS = {
+    'total': "SUM(daily.amount * daily.rate)",
+    'count': "SUM(daily.count)",
+    'average': "SUM(daily.amount * daily.rate) / SUM(daily.count)",
+}
+
+def get_report(start_date: Optional[str] = None, end_date: Optional[str] = None,
+               category_ids: Optional[Iterable[int]] = None, group_by: str = 'category',
+               metric: str = 'total', category_type: str = 'expense') -> List[Tuple]:
+    """Отчет по транзакциям (включая архив): (ключ, подпись, значение) для каждой группы.
+
+    Период [start_date, end_date) и категории отбираются по индексам даты и
+    категории; суммы складываются по дням и валютам, как в статистике, поэтому
+    курс ищется один раз на день и валюту. Группы по категориям идут от большего
+    значения к меньшему, группы по времени - по порядку дат.
+    """
+    if group_by not in _REPORT_GROUPS or metric not in _REPORT_METRICS:
+        raise ValueError(f"Неизвестная группировка или показатель отчета: {group_by}, {metric}")
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append("t.date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("t.date < ?")
+        params.append(end_date)
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        conditions.append(f"t.category_id IN ({', '.join('?' * len(category_ids))})")
+        params.extend(category_ids)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    key, label = _REPORT_GROUPS[group_by]
+    order = "value DESC" if group_by == 'category' else "key"
+    sql = f"""
+    WITH sums AS (
+        SELECT t.category_id, t.date, t.currency, SUM(t.amount) as amount, COUNT(*) as count
+        FROM {ALL_TRANSACTIONS} t
+        {where}
+        GROUP BY t.category_id, t.date, t.currency
+    ),
+    daily AS (
+        SELECT sums.*, {_rate_sql('sums')} as rate FROM sums
+    )
+    SELECT {key} as key, {label} as label, {_REPORT_METRICS[metric]} as value
+    FROM daily
+    JOIN categories c ON daily.category_id = c.id
+    WHERE c.type = ?
+    GROUP BY key
+    ORDER BY {order}
+    """
+    params.append(category_type)
+    try:
+        with _connection:
+            return _connection.execute(sql, params).fetchall()
+    except Error as e:
+        print(f"Ошибка построения отчета: {e}")
+        return []
+
+def set_budget(category_id: int, amount_limit: float, period: str = 'month') -> None:
+    """Установка лимита расходов категории на месяц или год"""
+    sql = """INSERT INTO budgets(category_id, period, amount_limit) VALUES(?, ?, ?)
+             ON CONFLICT(category_id, period) DO UPDATE SET amount_limit = excluded.amount_limit"""
+    try:
+        with _connection:
+            _connection.execute(sql, (category_id, period, amount_limit))
+    except Error as e:
+        print(f"Ошибка установки бюджета: {e}")
+        raise
+
+def delete_budget(category_id: int, period: str = 'month') -> None:
+    """Удаление лимита расходов категории"""
+    try:
+        with _connection:
+            _connection.execute("DELETE FROM budgets WHERE category_id = ? AND period = ?", (category_id, period))
+    except Error as e:
+        print(f"Ошибка удаления бюджета: {e}")
+        raise
+
+def get_budgets() -> List[Tuple[int, str, float]]:
+    """Все лимиты: (категория, период, лимит)"""
+    try:
+        return _connection.execute("SELECT category_id, period, amount_limit FROM budgets").fetchall()
+    except Error as e:
+        print(f"Ошибка получения бюджетов: {e}")
+        return []
+
+def get_budget_status(day: Optional[str] = None) -> List[Tuple[int, str, Optional[str], Optional[float], float]]:
+    """Расходы категорий за текущий период бюджета на дату day (по умолчанию сегодня).
+
+    Возвращает (категория, название, период или None, лимит или None, потрачено
+    в базовой валюте) для каждой категории расходов: с бюджетом - за его месяц
+    или год, без бюджета - за месяц. Суммы читаются из category_totals по
+    первичному ключу, поэтому время не зависит от числа транзакций. Учитывается
+    только основная база: архивируются лишь прошедшие годы.
+    """
+    day = day or datetime.date.today().isoformat()
+    sql = f"""
+    SELECT c.id, c.name, b.period, b.amount_limit,
+           COALESCE((SELECT SUM(t.cents * {_rate_sql('t')})
+                     FROM category_totals t
+                     WHERE t.category_id = c.id
+                       AND t.date >= (CASE WHEN b.period = 'year' THEN :year_start ELSE :month_start END)
+                       AND t.date < (CASE WHEN b.period = 'year' THEN :year_end ELSE :month_end END)),
+                    0) / 100.0 AS spent
+    FROM categories c
+    LEFT JOIN budgets b ON b.category_id = c.id
+    WHERE c.type = 'expense' AND (c.hidden = 0 OR b.category_id IS NOT NULL)
+    ORDER BY b.amount_limit IS NULL, c.name, b.period
+    """
+    year, month = int(day[:4]), int(day[5:7])
+    month_start, month_end = get_month_range(year, month)
+    params = {'month_start': month_start, 'month_end': month_end,
+              'year_start': f"{year:04d}-01-01", 'year_end': f"{year + 1:04d}-01-01"}
+    try:
+        return _connection.execute(sql, params).fetchall()
+    except Error as e:
+        print(f"Ошибка получения состояния бюджетов: {e}")
+        return []
+
+# Сумма транзакции со знаком: доходы увеличивают остаток счета, расходы уменьшают
+_SIGNED_AMOUNT = "CASE WHEN c.type = 'income' THEN t.amount ELSE -t.amount END"
+
+def _next_month(month: str) -> str:
+    """Первый день месяца, следующего за month (yyyy-mm)"""
+    return get_month_range(int(month[:4]), int(month[5:7]))[1]
+
+def _refresh_checkpoints(account_id: int, before_month: str) -> None:
+    """Досчет контрольных точек остатков счета для месяцев раньше before_month.
+
+    Расчет продолжается от последней сохраненной точки: суммы месяцев
+    складываются оконной функцией нарастающим итогом. Выполняется в транзакции
+    вызывающего кода.
+    """
+    last = _connection.execute(
+        """SELECT month, balance FROM balance_checkpoints
+           WHERE account_id = ? AND month < ? ORDER BY month DESC LIMIT 1""",
+        (account_id, before_month)
+    ).fetchone()
+    start, opening = (_next_month(last[0]), last[1]) if last else ("0000-01-01", 0.0)
+    sql = f"""
+    INSERT OR REPLACE INTO balance_checkpoints(account_id, month, balance)
+    SELECT ?, month, ? + SUM(total) OVER (ORDER BY month)
+    FROM (SELECT substr(t.date, 1, 7) as month, SUM({_SIGNED_AMOUNT}) as total
+          FROM all_transactions t
+          JOIN categories c ON t.category_id = c.id
+          WHERE t.account_id = ? AND t.date >= ? AND t.date < ?
+          GROUP BY month)
+    """
+    _connection.execute(sql, (account_id, opening, account_id, start, f"{before_month}-01"))
+
+def _balance_before(account_id: int, date: str) -> float:
+    """Остаток счета перед началом дня date (выполняется в транзакции вызывающего кода)"""
+    month = date[:7]
+    _refresh_checkpoints(account_id, month)
+    last = _connection.execute(
+        """SELECT month, balance FROM balance_checkpoints
+           WHERE account_id = ? AND month < ? ORDER BY month DESC LIMIT 1""",
+        (account_id, month)
+    ).fetchone()
+    start, opening = (_next_month(last[0]), last[1]) if last else ("0000-01-01", 0.0)
+    # От контрольной точки остаются только транзакции текущего месяца до date
+    cursor = _connection.execute(
+        f"""SELECT COALESCE(SUM({_SIGNED_AMOUNT}), 0)
+            FROM all_transactions t
+            JOIN categories c ON t.category_id = c.id
+            WHERE t.account_id = ? AND t.date >= ? AND t.date < ?""",
+        (account_id, start, date)
+    )
+    return opening + cursor.fetchone()[0]
+
+def get_balance(account_id: int, date: str) -> float:
+    """Остаток счета на конец дня date (yyyy-mm-dd).
+
+    Берется ближайшая контрольная точка на конец месяца, и к ней добавляются
+    транзакции после нее, поэтому история не пересчитывается с начала.
+    """
+    next_day = (datetime.date.fromisoformat(date) + datetime.timedelta(days=1)).isoformat()
+    try:
+        with _connection:
+            return _balance_before(account_id, next_day)
+    except Error as e:
+        print(f"Ошибка расчета остатка: {e}")
+        return 0.0
+
+def get_balances(date: str) -> List[Tuple[int, str, str, float]]:
+    """Остатки всех счетов на конец дня date: (id, name, currency, balance)"""
+    return [(account_id, name, currency, get_balance(account_id, date))
+            for account_id, name, currency in get_all_accounts()]
+
+def get_account_ledger(start_date: str, end_date: str,
+                       account_id: Optional[int] = None) -> List[Tuple]:
+    """Выписка за период [start_date, end_date) с остатком после каждой транзакции.
+
+    Строки - (id, account_id, date, signed_amount, category_id, description, currency, balance)
+    по счетам, внутри счета в порядке даты и ID. Нарастающий итог внутри периода
+    считает оконная функция, остаток на начало периода - контрольные точки.
+    """
+    condition = "AND t.account_id = ?" if account_id is not None else ""
+    sql = f"""
+    SELECT t.id, t.account_id, t.date, {_SIGNED_AMOUNT} as amount, t.category_id, t.description,
+           t.currency,
+           SUM({_SIGNED_AMOUNT}) OVER (PARTITION BY t.account_id ORDER BY t.date, t.id) as running
+    FROM all_transactions t
+    JOIN categories c ON t.category_id = c.id
+    WHERE t.date >= ? AND t.date < ? {condition}
+    ORDER BY t.account_id, t.date, t.id
+    """
+    params = [start_date, end_date] + ([account_id] if account_id is not None else [])
+    try:
+        with _connection:
+            rows = _connection.execute(sql, params).fetchall()
+            openings = {acc: _balance_before(acc, start_date) for acc in {row[1] for row in rows}}
+        return [row[:7] + (openings[row[1]] + row[7],) for row in rows]
+    except Error as e:
+        print(f"Ошибка получения выписки по счету: {e}")
+        return []
+
+# Поля транзакции, которые правятся из таблицы, и входят ли они в отпечаток
+EDITABLE_FIELDS = {
+    'date': True,
+    'category_id': True,
+    'amount': True,
+    'description': True,
+    'receipt_path': False,
+    'account_id': False,
+}
+
+def _update_transaction_fields(transaction_id: int, values: Dict[str, object]) -> bool:
+    """Один UPDATE строки с новыми значениями полей (в транзакции вызывающего кода)"""
+    assignments = [f"{field} = ?" for field in values]
+    refill_fingerprint = any(EDITABLE_FIELDS[field] for field in values)
+    if refill_fingerprint:
+        assignments.append("fingerprint = NULL")
+    sql = f"UPDATE {{table}} SET {', '.join(assignments)} WHERE id = ?"
+    old = None
+    if 'description' in values or 'category_id' in values:
+        old = _description_and_category(transaction_id)
+    found = _update_transaction_row(sql, tuple(values.values()) + (transaction_id,), 'update', refill_fingerprint)
+    if found and old:
+        _update_category_tokens([
+            (old[0], old[1], -1),
+            (values.get('description', old[0]), values.get('category_id', old[1]), 1),
+        ])
+    return found
+
+def get_transaction_fields(transaction_id: int, fields: Iterable[str]) -> Optional[Dict[str, object]]:
+    """Текущие значения редактируемых полей транзакции (включая архивные) или None"""
+    fields = list(fields)
+    unknown = [field for field in fields if field not in EDITABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Поле {unknown[0]} не редактируется")
+    sql = f"SELECT {', '.join(fields)} FROM {ALL_TRANSACTIONS} WHERE id = ?"
+    try:
+        row = _connection.execute(sql, (transaction_id,)).fetchone()
+        return dict(zip(fields, row)) if row else None
+    except Error as e:
+        print(f"Ошибка получения транзакции: {e}")
+        raise
+
+def apply_transaction_edits(edits: List[Tuple[int, str, object, object]]) -> None:
+    """Запись накопленных правок одной транзакцией БД.
+
+    edits - (transaction_id, field, old_value, new_value) в порядке правок.
+    Поля одной строки объединяются в один UPDATE; каждая правка записывается
+    в журнал для отмены, а ранее отмененные правки (стек повтора) удаляются.
+    """
+    rows: Dict[int, Dict[str, object]] = {}
+    for transaction_id, field, _, new_value in edits:
+        rows.setdefault(transaction_id, {})[field] = new_value
+    try:
+        with _connection:
+            for transaction_id, values in rows.items():
+                _update_transaction_fields(transaction_id, values)
+            _connection.execute("DELETE FROM edit_journal WHERE undone = 1")
+            _connection.executemany(
+                """INSERT INTO edit_journal(transaction_id, field, old_value, new_value)
+                   VALUES(?, ?, ?, ?)""",
+                edits
+            )
+    except Error as e:
+        print(f"Ошибка сохранения правок: {e}")
+        raise
+
+def undo_edit() -> Optional[Tuple[int, str, object]]:
+    """Отмена последней правки из журнала.
+
+    Возвращает (transaction_id, field, восстановленное значение) или None,
+    если отменять нечего. Правка удаленной транзакции просто снимается со стека.
+    """
+    sql = """SELECT seq, transaction_id, field, old_value FROM edit_journal
+             WHERE undone = 0 ORDER BY seq DESC LIMIT 1"""
+    try:
+        with _connection:
+            entry = _connection.execute(sql).fetchone()
+            if entry is None:
+                return None
+            seq, transaction_id, field, old_value = entry
+            _update_transaction_fields(transaction_id, {field: old_value})
+            _connection.execute("UPDATE edit_journal SET undone = 1 WHERE seq = ?", (seq,))
+            return transaction_id, field, old_value
+    except Error as e:
+        print(f"Ошибка отмены правки: {e}")
+        raise
+
+def redo_edit() -> Optional[Tuple[int, str, object]]:
+    """Повтор последней отмененной правки: (transaction_id, field, новое значение) или None"""
+    sql = """SELECT seq, transaction_id, field, new_value FROM edit_journal
+             WHERE undone = 1 ORDER BY seq LIMIT 1"""
+    try:
+        with _connection:
+            entry = _connection.execute(sql).fetchone()
+            if entry is None:
+                return None
+            seq, transaction_id, field, new_value = entry
+            _update_transaction_fields(transaction_id, {field: new_value})
+            _connection.execute("UPDATE edit_journal SET undone = 0 WHERE seq = ?", (seq,))
+            return transaction_id, field, new_value
+    except Error as e:
+        print(f"Ошибка повтора правки: {e}")
+        raise
+
+def prune_edit_journal(keep: int = 1000) -> None:
+    """Удаление старых записей журнала правок, кроме последних keep"""
+    sql = "DELETE FROM edit_journal WHERE seq <= (SELECT MAX(seq) FROM edit_journal) - ?"
+    try:
+        with _connection:
+            _connection.execute(sql, (keep,))
+    except Error as e:
+        print(f"Ошибка очистки журнала правок: {e}")
+
 def update_transaction_receipt(transaction_id: int, receipt_path: str) -> None:
     """Обновление пути к чеку транзакции"""
-    sql = "UPDATE transactions SET receipt_path = ? WHERE id = ?"
+    sql = "UPDATE {table} SET receipt_path = ? WHERE id = ?"
     try:
-        with _connection:
-            _connection.execute(sql, (receipt_path, transaction_id))
+        _execute_for_transaction(sql, (receipt_path, transaction_id), False)
     except Error as e:
         print(f"Ошибка обновления чека транзакции: {e}")
         raise
 
+def count_duplicates(amount: float, category_id: int, date: str, description: str = "",
+                     currency: str = BASE_CURRENCY) -> int:
+    """Количество уже сохраненных транзакций с тем же отпечатком (включая архивы)"""
+    try:
+        cursor = _connection.execute(_fingerprint_count_sql(),
+                                     {'fingerprint': make_fingerprint(date, amount, description, category_id,
+                                                                      currency)})
+        return cursor.fetchone()[0]
+    except Error as e:
+        print(f"Ошибка поиска дубликатов: {e}")
+        return 0
+
+def get_description_stats() -> List[Tuple[str, int, str]]:
+    """Различные непустые описания: (описание, сколько раз встречается, дата последнего использования).
+
+    Читает всю историю, включая архив; предназначено для построения индекса
+    автодополнения в фоновом потоке.
+    """
+    sql = f"""SELECT description, COUNT(*), MAX(date)
+              FROM {ALL_TRANSACTIONS}
+              WHERE description IS NOT NULL AND description != ''
+              GROUP BY description
+              ORDER BY COUNT(*) DESC"""
+    try:
+        return _connection.execute(sql).fetchall()
+    except Error as e:
+        print(f"Ошибка получения описаний: {e}")
+        return []
+
+def find_duplicate_groups() -> List[List[Tuple]]:
+    """Группы транзакций с одинаковым отпечатком.
+
+    Ищутся основная база и подключенные архивы: транзакция, добавленная за
+    архивный год, может повторять строку архива. Отпечатки каждой таблицы
+    группируются по ее индексу fingerprint, повторяющиеся отпечатки
+    отбираются по сумме количеств, затем строки групп выбираются из каждой
+    таблицы по тому же индексу.
+    Строки групп - (id, amount, category_id, date, description, receipt_path),
+    внутри группы по возрастанию ID (первая строка - самая ранняя запись).
+    """
+    tables = _transaction_tables()
+    counts = " UNION ALL ".join(
+        f"SELECT fingerprint, COUNT(*) AS n FROM {table} WHERE fingerprint IS NOT NULL GROUP BY fingerprint"
+        for table in tables)
+    rows = " UNION ALL ".join(
+        f"""SELECT t.fingerprint, t.id, t.amount, t.category_id, t.date, t.description, t.receipt_path
+            FROM d JOIN {table} t ON t.fingerprint = d.fingerprint"""
+        for table in tables)
+    sql = f"""WITH d AS (SELECT fingerprint FROM ({counts}) GROUP BY fingerprint HAVING SUM(n) > 1)
+              {rows}
+              ORDER BY 5 DESC, 1, 2"""
+    try:
+        with _connection:
+            _fill_fingerprints()
+        groups: List[List[Tuple]] = []
+        current = None
+        for row in _connection.execute(sql):
+            if row[0] != current:
+                current = row[0]
+                groups.append([])
+            groups[-1].append(row[1:])
+        return groups
+    except Error as e:
+        print(f"Ошибка поиска дубликатов: {e}")
+        return []
+
+def analyze() -> None:
+    """Сбор статистики для планировщика запросов.
+
+    Индексы читаются целиком (без analysis_limit): по выборке планировщик
+    недооценивает чтение индекса даты в обратном порядке для последних
+    транзакций и сортирует всю таблицу. Полный ANALYZE 300 000 транзакций
+    занимает доли секунды.
+    """
+    try:
+        _connection.execute("ANALYZE main")
+        _connection.commit()
+    except Error as e:
+        print(f"Ошибка сбора статистики базы данных: {e}")
+
+def get_storage_stats(detailed: bool = False) -> Dict[str, object]:
+    """Размер и фрагментация основной базы.
+
+    Ключи: file_size (байт), page_size, page_count, freelist_count (свободные
+    страницы внутри файла), auto_vacuum (0 - нет, 1 - полный, 2 - инкрементальный).
+    При detailed дополнительно unused_bytes - незаполненное место в занятых
+    страницах по виртуальной таблице dbstat (читает весь файл; None, если
+    SQLite собран без нее).
+    """
+    stats: Dict[str, object] = {}
+    for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum'):
+        stats[name] = _connection.execute(f"PRAGMA main.{name}").fetchone()[0]
+    stats['file_size'] = stats['page_size'] * stats['page_count']
+    if detailed:
+        try:
+            cursor = _connection.execute("SELECT COALESCE(SUM(unused), 0) FROM dbstat WHERE name NOT NULL")
+            stats['unused_bytes'] = cursor.fetchone()[0]
+        except Error:
+            stats['unused_bytes'] = None
+    return stats
+
+def incremental_vacuum(max_pages: int) -> int:
+    """Возврат файлу не более max_pages свободных страниц; возвращает их количество.
+
+    Работает только в режиме auto_vacuum = INCREMENTAL (в остальных режимах - 0).
+    """
+    try:
+        before = _connection.execute("PRAGMA main.freelist_count").fetchone()[0]
+        if not before:
+            return 0
+        # Через execute модуль sqlite3 выполняет только первый шаг прагмы (одна страница)
+        _connection.executescript(f"PRAGMA main.incremental_vacuum({int(max_pages)});")
+        return before - _connection.execute("PRAGMA main.freelist_count").fetchone()[0]
+    except Error as e:
+        print(f"Ошибка освобождения страниц базы данных: {e}")
+        return 0
+
+def vacuum_database() -> Tuple[Dict[str, object], Dict[str, object]]:
+    """Полная перепаковка основной базы (VACUUM) со сбором статистики.
+
+    Заодно база переводится в режим auto_vacuum = INCREMENTAL, если была создана
+    без него. Возвращает статистику get_storage_stats до и после.
+    """
+    try:
+        before = get_storage_stats(detailed=True)
+        _connection.commit()
+        _connection.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        _connection.execute("VACUUM main")
+        analyze()
+        return before, get_storage_stats(detailed=True)
+    except Error as e:
+        print(f"Ошибка сжатия базы данных: {e}")
+        raise
+
 # Инициализация начальных категорий при первом запуске
 if __name__ == "__main__":
     initialize()
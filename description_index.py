@@ -0,0 +1,248 @@
+# description_index.py - Автодополнение описаний транзакций по префиксному индексу
+
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from heapq import nlargest
+from typing import Dict, Iterable, List, Optional, Tuple
+from PyQt6 import QtCore, QtWidgets
+from PyQt6.QtCore import Qt
+import database as db
+
+# Сколько вариантов показывать в списке автодополнения
+MAX_SUGGESTIONS = 10
+# Диапазоны индекса не длиннее этого ранжируются при каждом запросе,
+# для более длинных лучшие варианты хранятся готовыми
+SMALL_RANGE = 256
+# За столько дней вес давно не встречавшегося описания уменьшается вдвое
+HALF_LIFE_DAYS = 180
+# Больше любого символа описания: граница диапазона ключей с общим префиксом
+_PREFIX_END = "\U0010ffff"
+
+
+class DescriptionIndex:
+    """Префиксный индекс различных описаний.
+
+    Ключи (описания в нижнем регистре) хранятся отсортированным списком:
+    описания с заданным началом - непрерывный диапазон, который находится
+    двумя bisect. Варианты ранжируются по частоте с поправкой на давность
+    последнего использования. Для префиксов с большим диапазоном (первые
+    буквы) лучшие варианты вычисляются заранее, поэтому ответ на любой
+    префикс - несколько поисков и сортировка не больше SMALL_RANGE строк.
+    """
+
+    def __init__(self, today: Optional[date] = None):
+        self._today = today or date.today()
+        self._keys: List[str] = []
+        # ключ -> [описание, количество, дата последнего использования, вес]
+        self._entries: Dict[str, list] = {}
+        # префикс -> ключи лучших вариантов (только для длинных диапазонов)
+        self._top: Dict[str, List[str]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, int, str]], today: Optional[date] = None) -> "DescriptionIndex":
+        """Индекс из строк (описание, количество, последняя дата).
+
+        Описания, отличающиеся только регистром, объединяются; показывается
+        первый встретившийся вариант (строки get_description_stats идут от частых к редким).
+        """
+        index = cls(today)
+        entries = index._entries
+        for description, count, last_date in rows:
+            key = description.casefold()
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = [description, count, last_date, 0.0]
+            else:
+                entry[1] += count
+                entry[2] = max(entry[2], last_date)
+        for entry in entries.values():
+            entry[3] = index._weight(entry)
+        index._keys = sorted(entries)
+        if index._keys:
+            index._rank(0, len(index._keys), 0)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _weight(self, entry: list) -> float:
+        """Частота с поправкой на давность последнего использования"""
+        try:
+            age = (self._today - date.fromisoformat(entry[2])).days
+        except (TypeError, ValueError):
+            age = 0
+        return entry[1] * 0.5 ** (max(age, 0) / HALF_LIFE_DAYS)
+
+    def _best(self, keys: Iterable[str]) -> List[str]:
+        entries = self._entries
+        return nlargest(MAX_SUGGESTIONS, keys, key=lambda key: entries[key][3])
+
+    def _rank(self, lo: int, hi: int, depth: int) -> List[str]:
+        """Лучшие ключи диапазона keys[lo:hi] с общим префиксом длины depth.
+
+        Длинный диапазон делится по следующему символу, и его лучшие варианты
+        выбираются из лучших вариантов частей; результат запоминается.
+        """
+        keys = self._keys
+        if hi - lo <= SMALL_RANGE:
+            return self._best(keys[lo:hi])
+        prefix = keys[lo][:depth]
+        candidates = []
+        i = lo
+        # Ключ, совпадающий с самим префиксом, стоит в диапазоне первым
+        while i < hi and len(keys[i]) == depth:
+            candidates.append(keys[i])
+            i += 1
+        while i < hi:
+            end = bisect_left(keys, prefix + keys[i][depth] + _PREFIX_END, i, hi)
+            candidates.extend(self._rank(i, end, depth + 1))
+            i = end
+        top = self._best(candidates)
+        self._top[prefix] = top
+        return top
+
+    def complete(self, prefix: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+        """Описания, начинающиеся с prefix (без учета регистра), от лучшего к худшему"""
+        key = prefix.casefold()
+        if not key.strip():
+            return []
+        top = self._top.get(key)
+        if top is None:
+            lo = bisect_left(self._keys, key)
+            hi = bisect_left(self._keys, key + _PREFIX_END, lo)
+            # Диапазон, выросший после построения индекса, ранжируется один раз и запоминается
+            top = self._rank(lo, hi, len(key)) if hi - lo > SMALL_RANGE else self._best(self._keys[lo:hi])
+        return [self._entries[key][0] for key in top[:limit]]
+
+    def add(self, description: str, day: str) -> None:
+        """Учет одного использования описания (новая транзакция или правка)"""
+        key = description.casefold()
+        if not key.strip():
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [description, 0, day, 0.0]
+            insort(self._keys, key)
+        entry[1] += 1
+        entry[2] = max(entry[2], day)
+        entry[3] = self._weight(entry)
+        # Вес ключа только вырос: в готовых списках его префиксов он может
+        # лишь подняться или вытеснить последний вариант
+        for length in range(len(key) + 1):
+            top = self._top.get(key[:length])
+            if top is None:
+                continue
+            if key not in top:
+                if len(top) >= MAX_SUGGESTIONS and self._entries[top[-1]][3] >= entry[3]:
+                    continue
+                top.append(key)
+            top.sort(key=lambda item: self._entries[item][3], reverse=True)
+            del top[MAX_SUGGESTIONS:]
+
+
+def _read_description_stats() -> List[Tuple[str, int, str]]:
+    """Чтение описаний отдельным соединением (вызывается в рабочем потоке)"""
+    try:
+        connection = db.open_reader_connection()
+    except RuntimeError:
+        # Работа через сервер API: запрос выполнит сервер
+        return db.get_description_stats()
+    try:
+        with db.using_connection(connection):
+            return db.get_description_stats()
+    finally:
+        connection.close()
+
+
+class DescriptionSuggestions(QtCore.QObject):
+    """Общий для окон индекс описаний.
+
+    Строится в фоновом потоке при первом обращении (создании поля с
+    автодополнением) и пополняется по мере ввода транзакций; до готовности
+    индекса варианты не предлагаются. После крупных изменений (импорт)
+    invalidate откладывает перестроение до следующего обращения.
+    """
+
+    # Индекс построен
+    ready = QtCore.pyqtSignal()
+    # Внутренний сигнал из рабочего потока: доставляется в поток интерфейса
+    _built = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="descriptions")
+        self._index = DescriptionIndex()
+        self._loaded = False
+        self._loading = False
+        # Использования, учтенные во время построения: применяются к новому индексу
+        self._pending: List[Tuple[str, str]] = []
+        self._built.connect(self._on_built)
+
+    def ensure_loaded(self) -> None:
+        if self._loaded or self._loading:
+            return
+        self._loading = True
+        self._pending = []
+        future = self._executor.submit(lambda: DescriptionIndex.build(_read_description_stats()))
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future) -> None:
+        """Завершение построения (вызывается в рабочем потоке)"""
+        try:
+            index = future.result()
+        except Exception as e:
+            print(f"Ошибка построения индекса описаний: {str(e)}")
+            index = None
+        self._built.emit(index)
+
+    def _on_built(self, index: Optional[DescriptionIndex]) -> None:
+        self._loading = False
+        if index is None:
+            return
+        for description, day in self._pending:
+            index.add(description, day)
+        self._pending = []
+        self._index = index
+        self._loaded = True
+        self.ready.emit()
+
+    def complete(self, prefix: str) -> List[str]:
+        return self._index.complete(prefix)
+
+    def add(self, description: str, day: Optional[str] = None) -> None:
+        """Учет введенного описания; day - дата транзакции (по умолчанию сегодня)"""
+        day = day or date.today().isoformat()
+        if self._loading:
+            self._pending.append((description, day))
+        self._index.add(description, day)
+
+    def invalidate(self) -> None:
+        """Перестроить индекс при следующем обращении"""
+        self._loaded = False
+
+    def wait(self) -> None:
+        """Ожидание начатого построения: его соединение закрывается до замены файла базы"""
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DescriptionCompleter(QtWidgets.QCompleter):
+    """QCompleter, варианты которого на каждое нажатие берутся из DescriptionSuggestions"""
+
+    def __init__(self, suggestions: DescriptionSuggestions, parent=None):
+        super().__init__(parent)
+        self._suggestions = suggestions
+        self._model = QtCore.QStringListModel(self)
+        self.setModel(self._model)
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setMaxVisibleItems(MAX_SUGGESTIONS)
+        suggestions.ensure_loaded()
+
+    def splitPath(self, path: str) -> List[str]:
+        # Вызывается при каждом изменении введенного текста: модель заменяется
+        # готовыми вариантами, а QCompleter лишь отбирает их по тому же префиксу
+        self._model.setStringList(self._suggestions.complete(path))
+        return [path]
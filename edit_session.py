@@ -0,0 +1,89 @@
+# edit_session.py - Отложенная запись правок транзакций с отменой и повтором
+
+from typing import Dict, List, Optional, Tuple
+from PyQt6 import QtCore
+import database as db
+
+
+class EditSession(QtCore.QObject):
+    """Буфер правок, сделанных в таблице транзакций.
+
+    Правки сразу видны в таблице, а в базу записываются пачкой одной
+    транзакцией (одна синхронизация с диском вместо десятков): через
+    delay_ms после первой незаписанной правки, при переходе к другой строке
+    или окну и перед любым чтением базы (вызывающий код вызывает flush).
+    Повторные правки одного поля строки до записи объединяются: сохраняется
+    исходное значение и последнее новое. Каждая записанная правка попадает
+    в журнал edit_journal, по которому работают отмена и повтор.
+    """
+
+    # Правки записаны в базу: ID измененных транзакций
+    flushed = QtCore.pyqtSignal(list)
+    # Правки не удалось записать: текст ошибки
+    failed = QtCore.pyqtSignal(str)
+
+    # Задержка записи после первой правки
+    FLUSH_DELAY_MS = 1000
+
+    def __init__(self, delay_ms: int = FLUSH_DELAY_MS, parent=None):
+        super().__init__(parent)
+        # (transaction_id, field) -> [исходное значение, новое значение]; порядок - порядок правок
+        self._pending: Dict[Tuple[int, str], List] = {}
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def set_field(self, transaction_id: int, field: str, old_value, new_value) -> None:
+        """Запоминание правки поля; old_value - значение до этой правки"""
+        if field not in db.EDITABLE_FIELDS:
+            raise ValueError(f"Поле {field} не редактируется")
+        key = (transaction_id, field)
+        pending = self._pending.get(key)
+        if pending is None:
+            if old_value == new_value:
+                return
+            self._pending[key] = [old_value, new_value]
+        elif pending[0] == new_value:
+            # Поле вернули к исходному значению - записывать нечего
+            del self._pending[key]
+        else:
+            pending[1] = new_value
+        if self._pending and not self._timer.isActive():
+            self._timer.start()
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def pending_ids(self) -> List[int]:
+        """ID транзакций с незаписанными правками"""
+        return list(dict.fromkeys(transaction_id for transaction_id, _ in self._pending))
+
+    def flush(self) -> bool:
+        """Запись накопленных правок одной транзакцией; False при ошибке"""
+        self._timer.stop()
+        if not self._pending:
+            return True
+        edits = [(transaction_id, field, old_value, new_value)
+                 for (transaction_id, field), (old_value, new_value) in self._pending.items()]
+        transaction_ids = self.pending_ids()
+        self._pending = {}
+        try:
+            db.apply_transaction_edits(edits)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return False
+        self.flushed.emit(transaction_ids)
+        return True
+
+    def undo(self) -> Optional[Tuple[int, str, object]]:
+        """Отмена последней правки (незаписанные сначала записываются)"""
+        if not self.flush():
+            return None
+        return db.undo_edit()
+
+    def redo(self) -> Optional[Tuple[int, str, object]]:
+        """Повтор последней отмененной правки"""
+        if not self.flush():
+            return None
+        return db.redo_edit()
@@ -0,0 +1,361 @@
+# load_test.py - Нагрузочная проверка одновременной работы нескольких клиентов с одной базой
+#
+# Запуск: python load_test.py [--writers 2] [--readers 4] [--importers 1] [--backups 1]
+#                             [--duration 10] [--threads] [--journal-mode wal] [--busy-timeout 5000]
+# По умолчанию каждый клиент - отдельный процесс, как приложение, импорт из командной
+# строки и резервное копирование, работающие с одним файлом; --threads запускает тех же
+# клиентов потоками одного процесса со своими соединениями (как сервер API).
+# Отчет: пропускная способность, задержки по операциям, доля ошибок блокировки
+# ("database is locked") и рост файла WAL. Код возврата 1, если доля ошибок
+# блокировки больше --max-busy-rate.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Tuple
+import database as db
+import query_check
+
+# Роли клиентов и их операции: (название, вес в смеси операций)
+ROLES = {
+    # Приложение: ввод и правка транзакций, отмена
+    'writer': [("add_transaction", 40), ("apply_transaction_edits", 30), ("update_transaction_category", 15),
+               ("delete_transaction", 5), ("undo_edit", 5), ("redo_edit", 5)],
+    # Импорт из командной строки: пакеты строк одной транзакцией
+    'importer': [("add_transactions_bulk", 1)],
+    # Окна приложения и сервер API: выборки за месяц, отчеты, опрос журнала изменений
+    'reader': [("get_transactions_for_period", 30), ("iter_transactions", 20), ("get_category_breakdown", 20),
+               ("get_monthly_statistics", 10), ("get_changes_since", 20)],
+    # Резервное копирование: копия всей базы через backup API SQLite
+    'backup': [("backup", 1)],
+}
+
+# Страниц базы, копируемых за один шаг резервного копирования
+BACKUP_PAGES = 256
+
+
+class Context:
+    """Состояние клиента: генератор случайных чисел и параметры операций"""
+
+    def __init__(self, role: str, index: int, options: dict):
+        self.role = role
+        self.random = random.Random(f"{role}-{index}")
+        self.options = options
+        self.category_ids = [cat[0] for cat in db.get_all_categories()]
+        self.first_day = date.today() - timedelta(days=5 * 365)
+        self.backup_dir = options['backup_dir']
+        self.index = index
+        self.number = 0
+
+    def day(self) -> str:
+        return (self.first_day + timedelta(days=self.random.randrange(5 * 365))).isoformat()
+
+    def month(self) -> Tuple[str, str]:
+        day = date.fromisoformat(self.day())
+        return db.get_month_range(day.year, day.month)
+
+    def transaction_id(self) -> int:
+        return self.random.randint(1, self.options['rows'])
+
+    def row(self) -> Tuple:
+        self.number += 1
+        return (round(self.random.uniform(10, 5000), 2), self.random.choice(self.category_ids), self.day(),
+                f"{self.random.choice(query_check.DESCRIPTIONS)} {self.role}-{self.index}-{self.number}",
+                None, db.BASE_CURRENCY, db.DEFAULT_ACCOUNT_ID)
+
+
+def _backup(ctx: Context) -> None:
+    """Копия базы по BACKUP_PAGES страниц, как у задания резервного копирования"""
+    path = os.path.join(ctx.backup_dir, f"backup-{ctx.role}-{ctx.index}.db")
+    target = sqlite3.connect(path)
+    try:
+        db._connection.backup(target, pages=BACKUP_PAGES)
+    finally:
+        target.close()
+
+
+def _edit(ctx: Context) -> None:
+    """Правка суммы и описания, как при записи правок из таблицы (прежние значения - для отмены)"""
+    transaction_id = ctx.transaction_id()
+    old = db.get_transaction_fields(transaction_id, ['amount', 'description'])
+    if old is None:
+        return
+    db.apply_transaction_edits([
+        (transaction_id, 'amount', old['amount'], round(ctx.random.uniform(10, 5000), 2)),
+        (transaction_id, 'description', old['description'], f"Правка {ctx.random.randrange(1000)}"),
+    ])
+
+
+# Операции: название -> вызов функций database.py
+OPERATIONS: Dict[str, Callable[[Context], object]] = {
+    "add_transaction": lambda ctx: db.add_transaction(*ctx.row()),
+    "apply_transaction_edits": lambda ctx: _edit(ctx),
+    "update_transaction_category": lambda ctx: db.update_transaction_category(
+        ctx.transaction_id(), ctx.random.choice(ctx.category_ids)),
+    "delete_transaction": lambda ctx: db.delete_transaction(ctx.transaction_id()),
+    "undo_edit": lambda ctx: db.undo_edit(),
+    "redo_edit": lambda ctx: db.redo_edit(),
+    "add_transactions_bulk": lambda ctx: db.add_transactions_bulk(
+        [ctx.row() for _ in range(ctx.options['batch'])], skip_duplicates=True),
+    "get_transactions_for_period": lambda ctx: db.get_transactions_for_period(*ctx.month()),
+    "iter_transactions": lambda ctx: db.iter_transactions(limit=1000).fetchall(),
+    "get_category_breakdown": lambda ctx: db.get_category_breakdown(*ctx.month()),
+    "get_monthly_statistics": lambda ctx: db.get_monthly_statistics(),
+    "get_changes_since": lambda ctx: (db.get_data_version(), db.get_changes_since(db.get_last_change_seq() - 100)),
+    "backup": _backup,
+}
+
+
+def _is_busy(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def run_client(role: str, index: int, options: dict, start_at: float) -> dict:
+    """Выполнение операций роли до истечения времени теста.
+
+    Возвращает задержки успешных операций (мс) и счетчики ошибок блокировки
+    и прочих ошибок по операциям.
+    """
+    mix = ROLES[role]
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    result = _empty_result(role, names)
+    ctx = Context(role, index, options)
+    pause = options['backup_interval'] if role == 'backup' else options['think_ms'] / 1000
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = start_at + options['duration']
+    while time.time() < deadline:
+        name = ctx.random.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            OPERATIONS[name](ctx)
+            result['latencies'][name].append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            _count_error(result, name, e)
+        if pause:
+            time.sleep(pause)
+    return result
+
+
+def _empty_result(role: str, names: List[str]) -> dict:
+    return {'role': role, 'latencies': {name: [] for name in names},
+            'busy': dict.fromkeys(names, 0), 'errors': dict.fromkeys(names, 0), 'messages': []}
+
+
+def _count_error(result: dict, name: str, error: Exception) -> None:
+    result['busy' if _is_busy(error) else 'errors'][name] += 1
+    message = f"{name}: {error}"
+    if message not in result['messages'] and len(result['messages']) < 5:
+        result['messages'].append(message)
+
+
+def _process_client(role: str, index: int, path: str, options: dict, start_at: float) -> dict:
+    """Клиент в отдельном процессе: свое соединение через initialize, как у приложения.
+
+    Сообщения database.py об ошибках не печатаются: они попадают в отчет.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            db.initialize(path)
+        except Exception as e:
+            # Открытие базы тоже пишет в нее (обновление схемы, очистка журналов)
+            result = _empty_result(role, ["initialize"])
+            _count_error(result, "initialize", e)
+            return result
+        try:
+            db.set_busy_timeout(options['busy_timeout'])
+            return run_client(role, index, options, start_at)
+        finally:
+            db.close_connection()
+
+
+def _thread_client(role: str, index: int, options: dict, start_at: float) -> dict:
+    """Клиент в потоке: отдельное соединение, подставленное функциям database.py"""
+    connection = db.open_connection(read_only=role in ('reader', 'backup'))
+    try:
+        with db.using_connection(connection):
+            db.set_busy_timeout(options['busy_timeout'])
+            return run_client(role, index, options, start_at)
+    finally:
+        connection.close()
+
+
+class FileSampler(threading.Thread):
+    """Периодическое измерение размера файлов базы и WAL во время нагрузки.
+
+    После окончания нагрузки клиенты закрывают соединения, и последний из них
+    переносит WAL в базу, поэтому запоминается размер на последнем замере.
+    """
+
+    def __init__(self, path: str, deadline: float, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.path = path
+        self.deadline = deadline
+        self.interval = interval
+        self.max_wal = 0
+        self.last_wal = 0
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval) and time.time() < self.deadline:
+            self.last_wal = self.size(self.path + "-wal")
+            self.max_wal = max(self.max_wal, self.last_wal)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Процентиль отсортированного списка (ближайший ранг)"""
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(results: List[dict], duration: float) -> dict:
+    """Сводка по операциям всех клиентов"""
+    operations = {}
+    for result in results:
+        for name, latencies in result['latencies'].items():
+            entry = operations.setdefault(name, {'role': result['role'], 'latencies': [], 'busy': 0, 'errors': 0})
+            entry['latencies'].extend(latencies)
+            entry['busy'] += result['busy'][name]
+            entry['errors'] += result['errors'][name]
+    summary = {}
+    for name, entry in operations.items():
+        latencies = sorted(entry['latencies'])
+        attempts = len(latencies) + entry['busy'] + entry['errors']
+        summary[name] = {
+            'role': entry['role'],
+            'count': len(latencies),
+            'ops_per_s': len(latencies) / duration,
+            'p50_ms': _percentile(latencies, 0.5),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'max_ms': latencies[-1] if latencies else 0.0,
+            'busy': entry['busy'],
+            'errors': entry['errors'],
+            'busy_rate': entry['busy'] / attempts if attempts else 0.0,
+        }
+    return summary
+
+
+def print_report(summary: dict, files: dict, duration: float, messages: List[str]) -> None:
+    print(f"{'Операция':30} {'роль':9} {'всего':>7} {'оп/с':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'max':>8} {'locked':>7} {'ошибки':>7}")
+    for name, entry in sorted(summary.items(), key=lambda item: (item[1]['role'], item[0])):
+        print(f"{name:30} {entry['role']:9} {entry['count']:7} {entry['ops_per_s']:8.1f} "
+              f"{entry['p50_ms']:8.1f} {entry['p95_ms']:8.1f} {entry['p99_ms']:8.1f} {entry['max_ms']:8.1f} "
+              f"{entry['busy']:7} {entry['errors']:7}")
+    total = sum(entry['count'] for entry in summary.values())
+    busy = sum(entry['busy'] for entry in summary.values())
+    errors = sum(entry['errors'] for entry in summary.values())
+    attempts = total + busy + errors
+    print(f"Выполнено операций: {total} ({total / duration:.1f} в секунду), задержки в мс")
+    print(f"Ошибки блокировки: {busy} ({busy / attempts if attempts else 0:.2%}), прочие ошибки: {errors}")
+    print(f"WAL: максимум {files['max_wal'] / 1024:.0f} КБ, в конце нагрузки {files['last_wal'] / 1024:.0f} КБ; "
+          f"база: {files['initial_db'] / 1024:.0f} -> {files['final_db'] / 1024:.0f} КБ")
+    for message in messages:
+        print(f"  {message}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка одновременной работы с базой")
+    parser.add_argument("--writers", type=int, default=2, help="Клиентов, вводящих и правящих транзакции")
+    parser.add_argument("--readers", type=int, default=4, help="Клиентов, читающих выборки и отчеты")
+    parser.add_argument("--importers", type=int, default=1, help="Клиентов пакетного импорта")
+    parser.add_argument("--backups", type=int, default=1, help="Клиентов резервного копирования")
+    parser.add_argument("--duration", type=float, default=10, help="Длительность теста в секундах")
+    parser.add_argument("--threads", action="store_true", help="Клиенты - потоки одного процесса")
+    parser.add_argument("--journal-mode", default="wal", choices=["wal", "delete", "truncate", "persist"])
+    parser.add_argument("--busy-timeout", type=int, default=5000, help="PRAGMA busy_timeout клиентов, мс")
+    parser.add_argument("--batch", type=int, default=500, help="Строк в одном пакете импорта")
+    parser.add_argument("--think-ms", type=float, default=0, help="Пауза между операциями клиента, мс")
+    parser.add_argument("--backup-interval", type=float, default=1.0, help="Пауза между копиями, с")
+    parser.add_argument("--rows", type=int, default=50000, help="Транзакций в синтетической базе")
+    parser.add_argument("--db", help="Копия этого файла базы вместо синтетической")
+    parser.add_argument("--max-busy-rate", type=float, default=0.0, help="Допустимая доля ошибок блокировки")
+    parser.add_argument("--json", help="Сохранить сводку в JSON для сравнения настроек")
+    args = parser.parse_args(argv)
+
+    clients = ([('writer', n) for n in range(args.writers)] + [('importer', n) for n in range(args.importers)]
+               + [('reader', n) for n in range(args.readers)] + [('backup', n) for n in range(args.backups)])
+    if not clients:
+        parser.error("не задано ни одного клиента")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "load.db")
+        if args.db:
+            shutil.copyfile(args.db, path)
+            db.initialize(path)
+        else:
+            print(f"Создание базы из {args.rows} транзакций...")
+            query_check.build_database(path, args.rows)
+        mode = db.set_journal_mode(args.journal_mode)
+        rows = db.count_transactions()
+        options = {'duration': args.duration, 'busy_timeout': args.busy_timeout, 'batch': args.batch,
+                   'think_ms': args.think_ms, 'backup_interval': args.backup_interval,
+                   'rows': rows, 'backup_dir': directory}
+        files = {'initial_db': FileSampler.size(path)}
+        kind = "потоков" if args.threads else "процессов"
+        print(f"Клиентов: {len(clients)} {kind}, журнал {mode}, busy_timeout {args.busy_timeout} мс, "
+              f"{args.duration:g} с")
+
+        # Клиенты начинают одновременно, когда все успели открыть базу
+        start_at = time.time() + 2.0 + 0.05 * len(clients)
+        sampler = FileSampler(path, start_at + args.duration)
+        sampler.start()
+        try:
+            if args.threads:
+                # Сообщения database.py об ошибках не печатаются: они попадают в отчет
+                with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(len(clients)) as executor:
+                    futures = [executor.submit(_thread_client, role, n, options, start_at) for role, n in clients]
+                    results = [future.result() for future in futures]
+                db.close_connection()
+            else:
+                db.close_connection()
+                with ProcessPoolExecutor(max_workers=len(clients)) as executor:
+                    futures = [executor.submit(_process_client, role, n, path, options, start_at)
+                               for role, n in clients]
+                    results = [future.result() for future in futures]
+        finally:
+            sampler.stop()
+        files['max_wal'] = sampler.max_wal
+        files['last_wal'] = sampler.last_wal
+        files['final_db'] = FileSampler.size(path)
+
+    summary = summarize(results, args.duration)
+    messages = list(dict.fromkeys(message for result in results for message in result['messages']))[:10]
+    print_report(summary, files, args.duration, messages)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({'settings': vars(args), 'journal_mode': mode, 'operations': summary, 'files': files},
+                      file, ensure_ascii=False, indent=2)
+
+    busy = sum(entry['busy'] for entry in summary.values())
+    attempts = sum(entry['count'] + entry['busy'] + entry['errors'] for entry in summary.values())
+    return 1 if attempts and busy / attempts > args.max_busy_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,43 @@
 
 import sys
 import os
+import argparse
 from PyQt6 import QtWidgets, QtGui, QtCore
 from PyQt6.QtCore import Qt, QDate
 from ui.main_window import Ui_MainWindow
 from ui.add_transaction import Ui_AddTransactionDialog
 import database as db
+from models import BudgetModel, StatisticsModel, TransactionTableModel, format_amount
+from transaction_store import TransactionFilter, TransactionStore
+from change_watcher import ChangeWatcher
+from edit_session import EditSession
+from startup_snapshot import TransactionLoader
+from description_index import DescriptionCompleter, DescriptionSuggestions
+from category_registry import CategoryRegistry, ID_ROLE, HIDDEN_ROLE
+from account_registry import AccountRegistry
+import recurring
+import columnar_io
+import charts
+import currency
+import maintenance
+import api_client
+import categorizer
+import startup_snapshot
+import backups
+from reports import ReportQuery, ReportService
+
+# Сколько транзакций держать в памяти; при большем объеме фильтры выполняются в SQL
+MEMORY_ROWS_LIMIT = 200000
+
+# Названия полей транзакции в сообщениях об отмене и повторе правок
+FIELD_TITLES = {
+    'date': "дата",
+    'category_id': "категория",
+    'amount': "сумма",
+    'description': "описание",
+    'receipt_path': "чек",
+    'account_id': "счет",
+}
 
 def get_resource_path(relative_path):
     """Получает абсолютный путь к ресурсу для работы как в режиме разработки, так и в режиме exe"""
@@ -68,8 +100,9 @@ class ReceiptViewerDialog(QtWidgets.QDialog):
 class AddTransactionDialog(QtWidgets.QDialog):
     """Диалоговое окно добавления транзакции"""
 
-    def __init__(self, parent=None):
+    def __init__(self, categories, accounts, parent=None, descriptions=None):
         super().__init__(parent)
+        self.categories = categories
         self.ui = Ui_AddTransactionDialog()
         self.ui.setupUi(self)
         
@@ -81,24 +114,85 @@ class AddTransactionDialog(QtWidgets.QDialog):
         
         # Настройка поля ввода суммы
         self.ui.amountSpin.setDecimals(2)  # Устанавливаем 2 знака после запятой
-        self.ui.amountSpin.setSuffix(" руб.")  # Добавляем суффикс "руб."
+        self.ui.amountSpin.setPrefix("")
         self.ui.amountSpin.setMinimum(0.00)  # Минимальное значение
         self.ui.amountSpin.setMaximum(999999999.99)  # Максимальное значение
         self.ui.amountSpin.setValue(0.00)  # Начальное значение
         
+        # Валюта суммы: базовая и те, для которых загружены курсы
+        self.currencyCombo = QtWidgets.QComboBox(self)
+        for code in accounts.currencies():
+            self.currencyCombo.addItem(code, code)
+        self.currencyCombo.currentIndexChanged.connect(self.update_currency_suffix)
+        self.ui.verticalLayout.itemAt(0).layout().addWidget(self.currencyCombo)
+        self.update_currency_suffix()
+        
+        # Счет транзакции; по умолчанию сумма вводится в валюте счета
+        self.accountCombo = QtWidgets.QComboBox(self)
+        for account_id, name, account_currency in accounts.accounts():
+            self.accountCombo.addItem(name, (account_id, account_currency))
+        self.accountCombo.currentIndexChanged.connect(self.update_account_currency)
+        self.ui.verticalLayout.insertWidget(0, self.accountCombo)
+        
         self.load_categories()
 
+        # Подсказка категории по описанию, пока категория не выбрана вручную
+        self.category_chosen = False
+        self.categoryHint = QtWidgets.QLabel(self)
+        self.ui.verticalLayout.itemAt(2).layout().addWidget(self.categoryHint)
+        self.ui.categoryCombo.activated.connect(self.on_category_chosen)
+        self.suggest_timer = QtCore.QTimer(self)
+        self.suggest_timer.setSingleShot(True)
+        self.suggest_timer.setInterval(200)
+        self.suggest_timer.timeout.connect(self.suggest_category)
+        self.ui.descriptionEdit.textChanged.connect(self.suggest_timer.start)
+
+        # Автодополнение описания по ранее введенным
+        if descriptions is not None:
+            self.ui.descriptionEdit.setCompleter(DescriptionCompleter(descriptions, self))
+
         # Подключение кнопок
         self.ui.buttonBox.accepted.connect(self.validate_input)
         self.ui.buttonBox.rejected.connect(self.reject)
         self.ui.loadReceiptButton.clicked.connect(self.load_receipt)
 
+    def update_currency_suffix(self, *args):
+        """Обозначение выбранной валюты в поле суммы"""
+        self.ui.amountSpin.setSuffix(f" {currency.currency_suffix(self.currencyCombo.currentData())}")
+
+    def update_account_currency(self, *args):
+        """Выбор валюты счета для суммы"""
+        _, account_currency = self.accountCombo.currentData()
+        index = self.currencyCombo.findData(account_currency)
+        if index < 0:
+            self.currencyCombo.addItem(account_currency, account_currency)
+            index = self.currencyCombo.count() - 1
+        self.currencyCombo.setCurrentIndex(index)
+
     def load_categories(self):
-        """Загрузка категорий из базы данных"""
-        categories = db.get_all_categories()
-        self.ui.categoryCombo.clear()
-        for cat in categories:
-            self.ui.categoryCombo.addItem(cat[1], cat[0])
+        """Подключение списка категорий к общему справочнику (без запросов к базе)"""
+        self.ui.categoryCombo.setModel(self.categories.visible_model)
+
+    def on_category_chosen(self, *args):
+        """Категория выбрана пользователем: подсказка ее больше не меняет"""
+        self.category_chosen = True
+        self.categoryHint.clear()
+
+    def suggest_category(self):
+        """Выбор категории по введенному описанию (после паузы в наборе)"""
+        if self.category_chosen:
+            return
+        try:
+            suggestion = categorizer.suggest_category(self.ui.descriptionEdit.text())
+        except Exception as e:
+            print(f"Ошибка подбора категории: {str(e)}")
+            return
+        index = self.ui.categoryCombo.findData(suggestion[0]) if suggestion else -1
+        if index < 0:
+            self.categoryHint.clear()
+            return
+        self.ui.categoryCombo.setCurrentIndex(index)
+        self.categoryHint.setText(f"по описанию, {suggestion[1]:.0%}")
 
     def load_receipt(self):
         """Загрузка изображения чека"""
@@ -139,10 +233,704 @@ class AddTransactionDialog(QtWidgets.QDialog):
             'category': self.ui.categoryCombo.currentData(),  # This will be the category_id
             'date': self.ui.dateEdit.date().toString("yyyy-MM-dd"),
             'description': self.ui.descriptionEdit.text(),
-            'receipt_path': self.receipt_path
+            'receipt_path': self.receipt_path,
+            'currency': self.currencyCombo.currentData(),
+            'account': self.accountCombo.currentData()[0]
         }
 
 
+class DescriptionDelegate(QtWidgets.QStyledItemDelegate):
+    """Отрисовка описания: перенос строк только в раскрытых строках, в остальных - многоточие.
+
+    Редактор описания получает автодополнение по ранее введенным описаниям.
+    """
+
+    def __init__(self, parent=None, descriptions=None):
+        super().__init__(parent)
+        self.expanded_rows = set()
+        self.descriptions = descriptions
+
+    def createEditor(self, parent, option, index):
+        editor = super().createEditor(parent, option, index)
+        if self.descriptions is not None and isinstance(editor, QtWidgets.QLineEdit):
+            editor.setCompleter(DescriptionCompleter(self.descriptions, editor))
+        return editor
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        if index.row() in self.expanded_rows:
+            option.features |= QtWidgets.QStyleOptionViewItem.ViewItemFeature.WrapText
+        else:
+            option.features &= ~QtWidgets.QStyleOptionViewItem.ViewItemFeature.WrapText
+            option.textElideMode = Qt.TextElideMode.ElideRight
+
+
+class RecurringRulesDialog(QtWidgets.QDialog):
+    """Диалоговое окно управления регулярными транзакциями"""
+
+    def __init__(self, categories, parent=None):
+        super().__init__(parent)
+        self.categories = categories
+        self.setWindowTitle("Регулярные транзакции")
+        self.setMinimumSize(700, 400)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        # Список правил
+        self.rulesTable = QtWidgets.QTableWidget(self)
+        self.rulesTable.setColumnCount(6)
+        self.rulesTable.setHorizontalHeaderLabels(
+            ["Описание", "Категория", "Сумма", "Периодичность", "Начало", "Создано по"]
+        )
+        self.rulesTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.rulesTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.rulesTable.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.rulesTable)
+        
+        # Форма нового правила
+        form_layout = QtWidgets.QHBoxLayout()
+        self.descriptionEdit = QtWidgets.QLineEdit(self)
+        self.descriptionEdit.setPlaceholderText("Описание")
+        form_layout.addWidget(self.descriptionEdit)
+        
+        self.categoryCombo = QtWidgets.QComboBox(self)
+        self.categoryCombo.setModel(self.categories.visible_model)
+        form_layout.addWidget(self.categoryCombo)
+        
+        self.amountSpin = QtWidgets.QDoubleSpinBox(self)
+        self.amountSpin.setDecimals(2)
+        self.amountSpin.setSuffix(f" {currency.currency_suffix(None)}")
+        self.amountSpin.setMaximum(999999999.99)
+        form_layout.addWidget(self.amountSpin)
+        
+        self.frequencyCombo = QtWidgets.QComboBox(self)
+        for key, title in recurring.FREQUENCIES.items():
+            self.frequencyCombo.addItem(title, key)
+        self.frequencyCombo.setCurrentIndex(self.frequencyCombo.findData('monthly'))
+        form_layout.addWidget(self.frequencyCombo)
+        
+        self.startDateEdit = QtWidgets.QDateEdit(QDate.currentDate(), self)
+        self.startDateEdit.setCalendarPopup(True)
+        form_layout.addWidget(self.startDateEdit)
+        layout.addLayout(form_layout)
+        
+        # Кнопки
+        buttons_layout = QtWidgets.QHBoxLayout()
+        add_button = QtWidgets.QPushButton("Добавить", self)
+        add_button.clicked.connect(self.add_rule)
+        buttons_layout.addWidget(add_button)
+        delete_button = QtWidgets.QPushButton("Удалить", self)
+        delete_button.clicked.connect(self.delete_rule)
+        buttons_layout.addWidget(delete_button)
+        buttons_layout.addStretch()
+        close_button = QtWidgets.QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.load_rules()
+
+    def load_rules(self):
+        """Загрузка правил из базы данных"""
+        rules = db.get_recurring_rules()
+        self.rulesTable.setRowCount(len(rules))
+        for row, rule in enumerate(rules):
+            rule_id, amount, category_id, description, frequency, start_date, _, last_generated, _ = rule
+            values = [
+                description or "",
+                self.categories.name(category_id),
+                format_amount(amount),
+                recurring.FREQUENCIES.get(frequency, frequency),
+                start_date,
+                last_generated or "",
+            ]
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(value)
+                item.setData(Qt.ItemDataRole.UserRole, rule_id)
+                self.rulesTable.setItem(row, column, item)
+
+    def add_rule(self):
+        """Добавление нового правила"""
+        if self.amountSpin.value() <= 0:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Сумма должна быть больше нуля!")
+            return
+        if not self.categoryCombo.currentData():
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите категорию!")
+            return
+        try:
+            db.add_recurring_rule(
+                amount=self.amountSpin.value(),
+                category_id=self.categoryCombo.currentData(),
+                frequency=self.frequencyCombo.currentData(),
+                start_date=self.startDateEdit.date().toString("yyyy-MM-dd"),
+                description=self.descriptionEdit.text()
+            )
+            self.descriptionEdit.clear()
+            self.amountSpin.setValue(0.00)
+            self.load_rules()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось добавить правило: {str(e)}")
+
+    def delete_rule(self):
+        """Удаление выбранного правила (созданные транзакции сохраняются)"""
+        item = self.rulesTable.item(self.rulesTable.currentRow(), 0)
+        if not item:
+            return
+        try:
+            db.delete_recurring_rule(item.data(Qt.ItemDataRole.UserRole))
+            self.load_rules()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось удалить правило: {str(e)}")
+
+
+class DuplicatesDialog(QtWidgets.QDialog):
+    """Диалоговое окно отчета о дубликатах транзакций"""
+
+    def __init__(self, categories, parent=None):
+        super().__init__(parent)
+        self.categories = categories
+        self.setWindowTitle("Дубликаты транзакций")
+        self.setMinimumSize(700, 400)
+        self.deleted_count = 0
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        self.summaryLabel = QtWidgets.QLabel(self)
+        layout.addWidget(self.summaryLabel)
+        
+        # Группы дубликатов: в каждой отмечены все строки, кроме самой ранней
+        self.groupsTree = QtWidgets.QTreeWidget(self)
+        self.groupsTree.setColumnCount(4)
+        self.groupsTree.setHeaderLabels(["Дата", "Категория", "Сумма", "Описание"])
+        self.groupsTree.header().setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.groupsTree)
+        
+        buttons_layout = QtWidgets.QHBoxLayout()
+        delete_button = QtWidgets.QPushButton("Удалить отмеченные", self)
+        delete_button.clicked.connect(self.delete_checked)
+        buttons_layout.addWidget(delete_button)
+        buttons_layout.addStretch()
+        close_button = QtWidgets.QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.load_groups()
+
+    def load_groups(self):
+        """Загрузка групп дубликатов из базы данных"""
+        groups = db.find_duplicate_groups()
+        self.groupsTree.clear()
+        for group in groups:
+            first = group[0]
+            parent_item = QtWidgets.QTreeWidgetItem(self.groupsTree, [
+                first[3],
+                self.categories.name(first[2]),
+                format_amount(first[1]),
+                f"{first[4] or ''} (записей: {len(group)})",
+            ])
+            for number, (trans_id, amount, category_id, date, description, _) in enumerate(group):
+                item = QtWidgets.QTreeWidgetItem(parent_item, [
+                    date, self.categories.name(category_id), format_amount(amount), description or ""
+                ])
+                item.setData(0, Qt.ItemDataRole.UserRole, trans_id)
+                item.setCheckState(0, Qt.CheckState.Checked if number else Qt.CheckState.Unchecked)
+            parent_item.setExpanded(True)
+        extra = sum(len(group) - 1 for group in groups)
+        self.summaryLabel.setText(f"Групп дубликатов: {len(groups)}, лишних записей: {extra}")
+
+    def delete_checked(self):
+        """Удаление отмеченных транзакций"""
+        transaction_ids = []
+        for group_index in range(self.groupsTree.topLevelItemCount()):
+            group_item = self.groupsTree.topLevelItem(group_index)
+            for child_index in range(group_item.childCount()):
+                item = group_item.child(child_index)
+                if item.checkState(0) == Qt.CheckState.Checked:
+                    transaction_ids.append(item.data(0, Qt.ItemDataRole.UserRole))
+        if not transaction_ids:
+            return
+        try:
+            for trans_id in transaction_ids:
+                db.delete_transaction(trans_id)
+            self.deleted_count += len(transaction_ids)
+            self.load_groups()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось удалить транзакции: {str(e)}")
+
+
+class CategoriesDialog(QtWidgets.QDialog):
+    """Диалоговое окно управления категориями"""
+
+    def __init__(self, categories, parent=None):
+        super().__init__(parent)
+        self.categories = categories
+        # Были ли объединения: у транзакций изменились категории
+        self.merged = False
+        self.setWindowTitle("Категории")
+        self.setMinimumSize(400, 400)
+        
+        layout = QtWidgets.QHBoxLayout(self)
+        
+        # Список всех категорий, включая скрытые (они показаны серым)
+        self.categoriesList = QtWidgets.QListView(self)
+        self.categoriesList.setModel(self.categories.model)
+        self.categoriesList.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.categoriesList, 1)
+        
+        buttons_layout = QtWidgets.QVBoxLayout()
+        for title, handler in (("Добавить...", self.add_category),
+                               ("Переименовать...", self.rename_category),
+                               ("Объединить с...", self.merge_category),
+                               ("Скрыть / показать", self.toggle_hidden)):
+            button = QtWidgets.QPushButton(title, self)
+            button.clicked.connect(handler)
+            buttons_layout.addWidget(button)
+        buttons_layout.addStretch()
+        close_button = QtWidgets.QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+    def current_category(self):
+        """ID и название выбранной категории или (None, None)"""
+        index = self.categoriesList.currentIndex()
+        if not index.isValid():
+            return None, None
+        return index.data(ID_ROLE), index.data()
+
+    def add_category(self):
+        """Добавление новой категории"""
+        name, ok = QtWidgets.QInputDialog.getText(self, "Новая категория", "Название:")
+        if not ok or not name.strip():
+            return
+        types = {"Расход": 'expense', "Доход": 'income'}
+        category_type, ok = QtWidgets.QInputDialog.getItem(self, "Новая категория", "Тип:", list(types), 0, False)
+        if not ok:
+            return
+        try:
+            self.categories.add(name.strip(), types[category_type])
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось добавить категорию: {str(e)}")
+
+    def rename_category(self):
+        """Переименование выбранной категории"""
+        category_id, name = self.current_category()
+        if category_id is None:
+            return
+        new_name, ok = QtWidgets.QInputDialog.getText(self, "Переименовать категорию", "Название:", text=name)
+        if not ok or not new_name.strip() or new_name.strip() == name:
+            return
+        try:
+            self.categories.rename(category_id, new_name.strip())
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось переименовать категорию: {str(e)}")
+
+    def merge_category(self):
+        """Перенос транзакций выбранной категории в другую и удаление выбранной"""
+        category_id, name = self.current_category()
+        if category_id is None:
+            return
+        targets = [cat for cat in self.categories.categories() if cat[0] != category_id]
+        target, ok = QtWidgets.QInputDialog.getItem(
+            self, "Объединить категории", f"Перенести транзакции категории \"{name}\" в:",
+            [cat[1] for cat in targets], 0, False
+        )
+        if not ok:
+            return
+        target_id = next(cat[0] for cat in targets if cat[1] == target)
+        try:
+            moved = self.categories.merge(category_id, target_id)
+            self.merged = True
+            QtWidgets.QMessageBox.information(self, "Категории", f"Перенесено транзакций: {moved}")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось объединить категории: {str(e)}")
+
+    def toggle_hidden(self):
+        """Скрытие категории из списков выбора или ее возврат"""
+        index = self.categoriesList.currentIndex()
+        if not index.isValid():
+            return
+        try:
+            self.categories.set_hidden(index.data(ID_ROLE), not index.data(HIDDEN_ROLE))
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось изменить категорию: {str(e)}")
+
+
+class AccountsDialog(QtWidgets.QDialog):
+    """Диалоговое окно счетов: остатки на дату и выписка с остатком после каждой транзакции"""
+
+    def __init__(self, categories, accounts, parent=None):
+        super().__init__(parent)
+        self.categories = categories
+        self.accounts = accounts
+        # Были ли переносы транзакций между счетами
+        self.moved = False
+        self.setWindowTitle("Счета и выписки")
+        self.setMinimumSize(800, 600)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        # Остатки всех счетов на выбранную дату
+        balance_layout = QtWidgets.QHBoxLayout()
+        balance_layout.addWidget(QtWidgets.QLabel("Остатки на", self))
+        self.balanceDateEdit = QtWidgets.QDateEdit(QDate.currentDate(), self)
+        self.balanceDateEdit.setCalendarPopup(True)
+        self.balanceDateEdit.dateChanged.connect(self.load_balances)
+        balance_layout.addWidget(self.balanceDateEdit)
+        balance_layout.addStretch()
+        add_button = QtWidgets.QPushButton("Добавить счет...", self)
+        add_button.clicked.connect(self.add_account)
+        balance_layout.addWidget(add_button)
+        layout.addLayout(balance_layout)
+        
+        self.accountsTable = QtWidgets.QTableWidget(self)
+        self.accountsTable.setColumnCount(2)
+        self.accountsTable.setHorizontalHeaderLabels(["Счет", "Остаток"])
+        self.accountsTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.accountsTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.accountsTable.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.accountsTable.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        self.accountsTable.setMaximumHeight(180)
+        self.accountsTable.itemSelectionChanged.connect(self.load_ledger)
+        layout.addWidget(self.accountsTable)
+        
+        # Выписка выбранного счета за период
+        period_layout = QtWidgets.QHBoxLayout()
+        period_layout.addWidget(QtWidgets.QLabel("Выписка с", self))
+        today = QDate.currentDate()
+        self.startDateEdit = QtWidgets.QDateEdit(QDate(today.year(), today.month(), 1), self)
+        self.startDateEdit.setCalendarPopup(True)
+        self.startDateEdit.dateChanged.connect(self.load_ledger)
+        period_layout.addWidget(self.startDateEdit)
+        period_layout.addWidget(QtWidgets.QLabel("по", self))
+        self.endDateEdit = QtWidgets.QDateEdit(today, self)
+        self.endDateEdit.setCalendarPopup(True)
+        self.endDateEdit.dateChanged.connect(self.load_ledger)
+        period_layout.addWidget(self.endDateEdit)
+        period_layout.addStretch()
+        layout.addLayout(period_layout)
+        
+        self.ledgerTable = QtWidgets.QTableWidget(self)
+        self.ledgerTable.setColumnCount(5)
+        self.ledgerTable.setHorizontalHeaderLabels(["Дата", "Категория", "Описание", "Сумма", "Остаток"])
+        self.ledgerTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.ledgerTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.ledgerTable.horizontalHeader().setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.ledgerTable)
+        
+        buttons_layout = QtWidgets.QHBoxLayout()
+        move_button = QtWidgets.QPushButton("Перенести на счет...", self)
+        move_button.clicked.connect(self.move_selected)
+        buttons_layout.addWidget(move_button)
+        buttons_layout.addStretch()
+        close_button = QtWidgets.QPushButton("Закрыть", self)
+        close_button.clicked.connect(self.accept)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.load_balances()
+        self.accountsTable.selectRow(0)
+
+    def current_account(self):
+        """ID и валюта выбранного счета или (None, None)"""
+        rows = self.accountsTable.selectionModel().selectedRows()
+        if not rows:
+            return None, None
+        return rows[0].data(Qt.ItemDataRole.UserRole)
+
+    def load_balances(self, *args):
+        """Остатки всех счетов на конец выбранного дня"""
+        selected = self.accountsTable.selectionModel().selectedRows()
+        row = selected[0].row() if selected else 0
+        balances = db.get_balances(self.balanceDateEdit.date().toString("yyyy-MM-dd"))
+        self.accountsTable.blockSignals(True)
+        self.accountsTable.setRowCount(len(balances))
+        for number, (account_id, name, account_currency, balance) in enumerate(balances):
+            name_item = QtWidgets.QTableWidgetItem(name)
+            name_item.setData(Qt.ItemDataRole.UserRole, (account_id, account_currency))
+            self.accountsTable.setItem(number, 0, name_item)
+            balance_item = QtWidgets.QTableWidgetItem(format_amount(balance, account_currency))
+            balance_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            self.accountsTable.setItem(number, 1, balance_item)
+        self.accountsTable.selectRow(min(row, len(balances) - 1))
+        self.accountsTable.blockSignals(False)
+
+    def load_ledger(self, *args):
+        """Транзакции выбранного счета за период с остатком после каждой"""
+        account_id, account_currency = self.current_account()
+        if account_id is None:
+            return
+        end = self.endDateEdit.date().addDays(1).toString("yyyy-MM-dd")
+        rows = db.get_account_ledger(self.startDateEdit.date().toString("yyyy-MM-dd"), end, account_id)
+        self.ledgerTable.setRowCount(len(rows))
+        for number, (trans_id, _, date, amount, category_id, description, row_currency, balance) in enumerate(rows):
+            values = [
+                date,
+                self.categories.name(category_id),
+                description or "",
+                format_amount(amount, row_currency),
+                format_amount(balance, account_currency),
+            ]
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(value)
+                item.setData(Qt.ItemDataRole.UserRole, trans_id)
+                if column >= 3:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.ledgerTable.setItem(number, column, item)
+
+    def add_account(self):
+        """Добавление нового счета"""
+        name, ok = QtWidgets.QInputDialog.getText(self, "Новый счет", "Название:")
+        if not ok or not name.strip():
+            return
+        codes = self.accounts.currencies()
+        account_currency, ok = QtWidgets.QInputDialog.getItem(self, "Новый счет", "Валюта:", codes, 0, False)
+        if not ok:
+            return
+        try:
+            self.accounts.add(name.strip(), account_currency)
+            self.load_balances()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось добавить счет: {str(e)}")
+
+    def move_selected(self):
+        """Перенос выбранных транзакций выписки на другой счет"""
+        account_id, _ = self.current_account()
+        rows = sorted({index.row() for index in self.ledgerTable.selectionModel().selectedRows()})
+        if account_id is None or not rows:
+            return
+        targets = [acc for acc in self.accounts.accounts() if acc[0] != account_id]
+        if not targets:
+            return
+        target, ok = QtWidgets.QInputDialog.getItem(
+            self, "Перенести на счет", "Счет:", [acc[1] for acc in targets], 0, False
+        )
+        if not ok:
+            return
+        target_id = next(acc[0] for acc in targets if acc[1] == target)
+        try:
+            for row in rows:
+                db.update_transaction_account(self.ledgerTable.item(row, 0).data(Qt.ItemDataRole.UserRole),
+                                              target_id)
+            self.moved = True
+            self.load_balances()
+            self.load_ledger()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось перенести транзакции: {str(e)}")
+
+
+class ChartsPanel(QtWidgets.QWidget):
+    """Панель графиков: изображение строится в фоне, переключение берет его из кэша"""
+
+    def __init__(self, reports, parent=None):
+        super().__init__(parent)
+        self.renderer = charts.ChartRenderer(reports, self)
+        self.renderer.chartReady.connect(self.on_chart_ready)
+        self.current_key = None
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        controls_layout = QtWidgets.QHBoxLayout()
+        self.chartCombo = QtWidgets.QComboBox(self)
+        for key, title in charts.CHART_TYPES.items():
+            self.chartCombo.addItem(title, key)
+        self.chartCombo.currentIndexChanged.connect(self.refresh)
+        controls_layout.addWidget(self.chartCombo, 1)
+        
+        self.yearCombo = QtWidgets.QComboBox(self)
+        self.yearCombo.addItem("Все годы", 0)
+        self.yearCombo.currentIndexChanged.connect(self.refresh)
+        controls_layout.addWidget(self.yearCombo)
+        layout.addLayout(controls_layout)
+        
+        self.imageLabel = QtWidgets.QLabel(self)
+        self.imageLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.imageLabel.setMinimumSize(300, 250)
+        self.imageLabel.setSizePolicy(QtWidgets.QSizePolicy.Policy.Ignored,
+                                      QtWidgets.QSizePolicy.Policy.Ignored)
+        layout.addWidget(self.imageLabel, 1)
+        
+        # Перестроение после изменения размера - когда пользователь закончит тянуть
+        self.resizeTimer = QtCore.QTimer(self)
+        self.resizeTimer.setSingleShot(True)
+        self.resizeTimer.setInterval(200)
+        self.resizeTimer.timeout.connect(self.refresh)
+
+    def set_years(self, years):
+        """Обновление списка лет без лишних перерисовок"""
+        current = self.yearCombo.currentData()
+        self.yearCombo.blockSignals(True)
+        self.yearCombo.clear()
+        self.yearCombo.addItem("Все годы", 0)
+        for year in sorted(years, reverse=True):
+            self.yearCombo.addItem(str(year), year)
+        index = self.yearCombo.findData(current)
+        self.yearCombo.setCurrentIndex(max(index, 0))
+        self.yearCombo.blockSignals(False)
+
+    def refresh(self, *args):
+        """Показ выбранного графика: из кэша сразу, иначе после фоновой отрисовки"""
+        if not self.isVisible():
+            return
+        size = self.imageLabel.size()
+        year = self.yearCombo.currentData() or None
+        key, image = self.renderer.request(self.chartCombo.currentData(), year,
+                                           size.width(), size.height())
+        self.current_key = key
+        if image is not None:
+            self.show_image(image)
+        elif self.imageLabel.pixmap().isNull():
+            self.imageLabel.setText("Построение графика...")
+        # Остальные графики того же года готовятся заранее
+        for chart_type in charts.CHART_TYPES:
+            self.renderer.request(chart_type, year, size.width(), size.height())
+
+    def on_chart_ready(self, key, image):
+        if key == self.current_key:
+            if image:
+                self.show_image(image)
+            else:
+                self.imageLabel.setText("Не удалось построить график")
+
+    def show_image(self, image):
+        pixmap = QtGui.QPixmap()
+        pixmap.loadFromData(image, "PNG")
+        self.imageLabel.setPixmap(pixmap)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resizeTimer.start()
+
+
+class BudgetDialog(QtWidgets.QDialog):
+    """Диалог установки лимита расходов категории на месяц или год"""
+
+    def __init__(self, categories, category_id=None, period=None, amount_limit=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Лимит расходов")
+        
+        layout = QtWidgets.QFormLayout(self)
+        self.categoryCombo = QtWidgets.QComboBox(self)
+        for cat_id, name, category_type, _ in categories.categories():
+            if category_type == 'expense':
+                self.categoryCombo.addItem(name, cat_id)
+        self.categoryCombo.setCurrentIndex(max(self.categoryCombo.findData(category_id), 0))
+        layout.addRow("Категория:", self.categoryCombo)
+        
+        self.periodCombo = QtWidgets.QComboBox(self)
+        self.periodCombo.addItem("Месяц", 'month')
+        self.periodCombo.addItem("Год", 'year')
+        self.periodCombo.setCurrentIndex(max(self.periodCombo.findData(period), 0))
+        layout.addRow("Период:", self.periodCombo)
+        
+        self.limitSpinBox = QtWidgets.QDoubleSpinBox(self)
+        self.limitSpinBox.setRange(0.01, 1000000000)
+        self.limitSpinBox.setDecimals(2)
+        self.limitSpinBox.setSuffix(f" {currency.currency_suffix(None)}")
+        self.limitSpinBox.setValue(amount_limit or 10000)
+        layout.addRow("Лимит:", self.limitSpinBox)
+        
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.StandardButton.Ok | QtWidgets.QDialogButtonBox.StandardButton.Cancel,
+            self
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def get_data(self):
+        """(ID категории, период, лимит)"""
+        return self.categoryCombo.currentData(), self.periodCombo.currentData(), self.limitSpinBox.value()
+
+
+class BudgetPanel(QtWidgets.QWidget):
+    """Панель бюджетов: расходы категорий за месяц или год с подсветкой превышения лимита"""
+
+    def __init__(self, categories, parent=None):
+        super().__init__(parent)
+        self.categories = categories
+        self.model = BudgetModel(self)
+        
+        layout = QtWidgets.QVBoxLayout(self)
+        
+        self.summaryLabel = QtWidgets.QLabel(self)
+        layout.addWidget(self.summaryLabel)
+        
+        self.budgetTable = QtWidgets.QTableView(self)
+        self.budgetTable.setModel(self.model)
+        self.budgetTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.budgetTable.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.budgetTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.budgetTable.verticalHeader().hide()
+        self.budgetTable.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        self.budgetTable.doubleClicked.connect(self.set_budget)
+        layout.addWidget(self.budgetTable, 1)
+        
+        buttons_layout = QtWidgets.QHBoxLayout()
+        set_button = QtWidgets.QPushButton("Установить лимит...", self)
+        set_button.clicked.connect(self.set_budget)
+        buttons_layout.addWidget(set_button)
+        delete_button = QtWidgets.QPushButton("Удалить лимит", self)
+        delete_button.clicked.connect(self.delete_budget)
+        buttons_layout.addWidget(delete_button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+    def refresh(self, *args):
+        """Пересчет состояния бюджетов (только если панель открыта).
+
+        Суммы читаются из поддерживаемых триггерами итогов по категориям,
+        поэтому обновление дешево и выполняется после каждой правки.
+        """
+        if not self.isVisible():
+            return
+        self.model.update_data(db.get_budget_status())
+        over = self.model.over_limit_count()
+        self.summaryLabel.setText(f"Превышено лимитов: {over}" if over else "Все расходы в пределах лимитов")
+        self.summaryLabel.setStyleSheet("color: red;" if over else "")
+
+    def selected_budget(self):
+        """Категория, период и лимит выбранной строки или (None, None, None)"""
+        rows = self.budgetTable.selectionModel().selectedRows()
+        if not rows:
+            return None, None, None
+        return self.model.row_budget(rows[0].row())
+
+    def set_budget(self, *args):
+        """Установка или изменение лимита выбранной категории"""
+        dialog = BudgetDialog(self.categories, *self.selected_budget(), parent=self)
+        if dialog.exec() != QtWidgets.QDialog.DialogCode.Accepted:
+            return
+        category_id, period, amount_limit = dialog.get_data()
+        if category_id is None:
+            return
+        try:
+            db.set_budget(category_id, amount_limit, period)
+            self.refresh()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось установить лимит: {str(e)}")
+
+    def delete_budget(self):
+        """Удаление лимита выбранной строки"""
+        category_id, period, _ = self.selected_budget()
+        if period is None:
+            return
+        try:
+            db.delete_budget(category_id, period)
+            self.refresh()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось удалить лимит: {str(e)}")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     """Главное окно приложения"""
 
@@ -156,14 +944,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 background-color: #2b2b2b;
                 color: #ffffff;
             }
-            QTableWidget {
+            QTableView {
                 background-color: #2b2b2b;
                 color: #ffffff;
                 gridline-color: #3d3d3d;
                 selection-background-color: #3d3d3d;
                 selection-color: #ffffff;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
             }
             QHeaderView::section {
@@ -229,18 +1017,74 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.setWindowTitle("Учет личных финансов")
         self.setMinimumSize(800, 800)
 
+        # Фильтр таблицы транзакций; признаки частичной загрузки данных
+        # и загрузки с фильтром, выполненным в SQL
+        self.transaction_filter = TransactionFilter()
+        self.partial_load = False
+        self.store_filtered = False
+
+        # Отслеживание изменений, сделанных другими клиентами базы
+        self.change_watcher = ChangeWatcher(parent=self)
+        self.change_watcher.transactionsChanged.connect(self.on_external_transactions_changed)
+        self.change_watcher.categoriesChanged.connect(self.on_external_categories_changed)
+        self.change_watcher.reloadRequired.connect(self.load_data)
+
+        # Статистика на экране и отметка состояния базы, при которой она рассчитана
+        self.statistics = ([], [])
+        # Полная загрузка транзакций в фоне после показа снимка
+        self.background_load = False
+        self.transaction_loader = TransactionLoader(self)
+        self.transaction_loader.loaded.connect(self.on_transactions_loaded)
+        self.transaction_loader.failed.connect(self.on_transactions_load_failed)
+        # Отчеты для детализации и графиков: повторный показ берется из кэша
+        self.reports = ReportService()
+        # Плановые резервные копии (только при прямой работе с файлом базы)
+        self.backup_scheduler = None
+
         try:
             # Инициализация базы данных
             db.initialize()
+            
+            # Снимок первого экрана, сохраненный при прошлом закрытии
+            snapshot_file = startup_snapshot.snapshot_path()
+            snapshot = startup_snapshot.load_snapshot(snapshot_file) if snapshot_file else None
+            
+            # Справочник категорий: читается один раз, общий для всех окон
+            self.categories = CategoryRegistry(self, snapshot.categories if snapshot else None)
+            self.categories.changed.connect(self.on_categories_changed)
+            # Справочник счетов и валют для диалогов: читается при первом открытии
+            self.accounts = AccountRegistry(self)
+            self.change_watcher.dataVersionChanged.connect(self.accounts.reload)
+            
+            # Правки из таблицы пишутся в базу пачками и могут быть отменены
+            self.edit_session = EditSession(parent=self)
+            self.edit_session.flushed.connect(self.on_edits_flushed)
+            self.edit_session.failed.connect(self.on_edits_failed)
+            # Переход в другое окно (диалог, меню, другое приложение) записывает правки
+            QtGui.QGuiApplication.instance().focusWindowChanged.connect(
+                lambda window: self.edit_session.flush()
+            )
+            
+            # Индекс описаний для автодополнения (строится при первом вводе)
+            self.descriptions = DescriptionSuggestions(self)
+            
+            # Создание регулярных транзакций, наступивших с прошлого запуска
+            self.generate_recurring_transactions()
 
-            # Настройка меню Файл
+            # Настройка меню Файл и Правка
             self.setup_file_menu()
+            self.setup_edit_menu()
 
             # Настройка основной таблицы транзакций
             self.setup_transactions_table()
             
+            # Панель фильтров над таблицей транзакций
+            self.setup_filter_bar()
+            
             # Создание и настройка таблицы статистики
             self.setup_statistics_table()
+            self.setup_charts_panel()
+            self.setup_budget_panel()
 
             # Подключение обработчиков
             self.addButton.clicked.connect(self.add_transaction)
@@ -252,8 +1096,28 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self.addAction.setShortcut("Ctrl+N")
             self.addAction.triggered.connect(self.add_transaction)
 
-            # Загрузка данных
-            self.load_data()
+            # Освобождение страниц базы в простое
+            self.maintenanceTimer = QtCore.QTimer(self)
+            self.maintenanceTimer.setInterval(30000)
+            self.maintenanceTimer.timeout.connect(self.run_idle_maintenance)
+
+            # Сжатые резервные копии раз в день в фоновом потоке
+            directory = backups.backup_dir()
+            if directory is not None:
+                self.backup_scheduler = backups.BackupScheduler(directory, parent=self)
+                self.backup_scheduler.finished.connect(self.on_backup_finished)
+                self.backup_scheduler.failed.connect(self.on_backup_failed)
+
+            # Загрузка данных; при наличии снимка окно сразу показывает его,
+            # а проверка и чтение базы выполняются после первой отрисовки
+            if snapshot is None:
+                self.load_data()
+            else:
+                self.show_snapshot(snapshot)
+            self.change_watcher.start()
+            self.maintenanceTimer.start()
+            if self.backup_scheduler is not None:
+                self.backup_scheduler.start()
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка инициализации приложения: {str(e)}")
 
@@ -268,26 +1132,108 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         export_action.triggered.connect(self.export_to_excel)
         self.menuFile.addAction(export_action)
 
+        # Экспорт и импорт в колоночных форматах для аналитики
+        columnar_export_action = QtGui.QAction("Экспорт в Parquet/Arrow...", self)
+        columnar_export_action.triggered.connect(self.export_columnar)
+        self.menuFile.addAction(columnar_export_action)
+
+        columnar_import_action = QtGui.QAction("Импорт из Parquet/Arrow...", self)
+        columnar_import_action.triggered.connect(self.import_columnar)
+        self.menuFile.addAction(columnar_import_action)
+
+        # Курсы валют для пересчета статистики в базовую валюту
+        rates_action = QtGui.QAction("Импорт курсов валют...", self)
+        rates_action.triggered.connect(self.import_fx_rates)
+        self.menuFile.addAction(rates_action)
+
         # Создать резервную копию
         backup_action = QtGui.QAction("Создать резервную копию...", self)
         backup_action.setShortcut("Ctrl+B")
         backup_action.triggered.connect(self.create_backup)
+        # При работе через сервер API файл базы находится у сервера
+        backup_action.setEnabled(api_client.active() is None)
         self.menuFile.addAction(backup_action)
 
         # Восстановить из резервной копии
         restore_action = QtGui.QAction("Восстановить из резервной копии...", self)
         restore_action.setShortcut("Ctrl+R")
         restore_action.triggered.connect(self.restore_from_backup)
+        restore_action.setEnabled(api_client.active() is None)
         self.menuFile.addAction(restore_action)
 
         self.menuFile.addSeparator()
 
+        # Архив закрытых лет
+        archive_action = QtGui.QAction("Перенести год в архив...", self)
+        archive_action.triggered.connect(self.archive_year)
+        self.menuFile.addAction(archive_action)
+
+        unarchive_action = QtGui.QAction("Вернуть год из архива...", self)
+        unarchive_action.triggered.connect(self.unarchive_year)
+        self.menuFile.addAction(unarchive_action)
+
+        # Регулярные транзакции
+        recurring_action = QtGui.QAction("Регулярные транзакции...", self)
+        recurring_action.triggered.connect(self.manage_recurring_rules)
+        self.menuFile.addAction(recurring_action)
+
+        # Справочник категорий
+        categories_action = QtGui.QAction("Категории...", self)
+        categories_action.triggered.connect(self.manage_categories)
+        self.menuFile.addAction(categories_action)
+
+        # Счета, остатки и выписки
+        accounts_action = QtGui.QAction("Счета и выписки...", self)
+        accounts_action.setShortcut("Ctrl+L")
+        accounts_action.triggered.connect(self.show_accounts)
+        self.menuFile.addAction(accounts_action)
+
+        # Графики
+        charts_action = QtGui.QAction("Графики", self)
+        charts_action.setShortcut("Ctrl+G")
+        charts_action.triggered.connect(self.toggle_charts_panel)
+        self.menuFile.addAction(charts_action)
+
+        # Бюджеты
+        budgets_action = QtGui.QAction("Бюджеты", self)
+        budgets_action.setShortcut("Ctrl+U")
+        budgets_action.triggered.connect(self.toggle_budget_panel)
+        self.menuFile.addAction(budgets_action)
+
+        # Поиск дубликатов
+        duplicates_action = QtGui.QAction("Найти дубликаты...", self)
+        duplicates_action.triggered.connect(self.find_duplicates)
+        self.menuFile.addAction(duplicates_action)
+
+        self.menuFile.addSeparator()
+
+        # Обслуживание файла базы
+        vacuum_action = QtGui.QAction("Сжать базу данных...", self)
+        vacuum_action.triggered.connect(self.vacuum_database)
+        self.menuFile.addAction(vacuum_action)
+
+        self.menuFile.addSeparator()
+
         # Выход
         exit_action = QtGui.QAction("Выход", self)
         exit_action.setShortcut("Alt+F4")
         exit_action.triggered.connect(self.close)
         self.menuFile.addAction(exit_action)
 
+    def setup_edit_menu(self):
+        """Настройка меню Правка: отмена и повтор правок транзакций"""
+        self.menuEdit = self.menubar.addMenu("Правка")
+
+        undo_action = QtGui.QAction("Отменить", self)
+        undo_action.setShortcut(QtGui.QKeySequence.StandardKey.Undo)
+        undo_action.triggered.connect(self.undo_edit)
+        self.menuEdit.addAction(undo_action)
+
+        redo_action = QtGui.QAction("Повторить", self)
+        redo_action.setShortcuts([QtGui.QKeySequence("Ctrl+Y"), QtGui.QKeySequence.StandardKey.Redo])
+        redo_action.triggered.connect(self.redo_edit)
+        self.menuEdit.addAction(redo_action)
+
     def export_to_excel(self):
         """Экспорт данных в Excel"""
         try:
@@ -310,12 +1256,13 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             
             # Создаем DataFrame
             data = []
-            for trans_id, amount, category_id, date, description, receipt_path in transactions:
-                category_name = db.get_category_name(category_id)
+            for trans_id, amount, category_id, date, description, receipt_path, code in transactions:
+                category_name = self.categories.name(category_id)
                 data.append({
                     'Дата': date,
                     'Категория': category_name,
                     'Сумма': amount,
+                    'Валюта': code,
                     'Описание': description,
                     'Чек': 'Да' if receipt_path else 'Нет'
                 })
@@ -339,8 +1286,81 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 f"Не удалось экспортировать данные: {str(e)}"
             )
 
+    def export_columnar(self):
+        """Экспорт данных в Parquet или Arrow IPC"""
+        try:
+            formats = {
+                "Parquet": ('parquet', False),
+                "Parquet, по годам": ('parquet', True),
+                "Arrow IPC": ('arrow', False),
+                "Arrow IPC, по годам": ('arrow', True),
+            }
+            choice, ok = QtWidgets.QInputDialog.getItem(
+                self, "Экспорт", "Формат:", list(formats), 0, False
+            )
+            if not ok:
+                return
+
+            directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Каталог для экспорта")
+            if not directory:
+                return
+
+            file_format, by_year = formats[choice]
+            count = columnar_io.export_data(directory, file_format, by_year)
+            QtWidgets.QMessageBox.information(
+                self,
+                "Экспорт завершен",
+                f"Экспортировано транзакций: {count}\nКаталог: {directory}"
+            )
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(
+                self,
+                "Ошибка",
+                f"Не удалось экспортировать данные: {str(e)}"
+            )
+
+    def import_columnar(self):
+        """Импорт данных из каталога Parquet или Arrow IPC"""
+        try:
+            directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Каталог с данными для импорта")
+            if not directory:
+                return
+
+            result = columnar_io.import_data(directory, columnar_io.detect_format(directory))
+            self.descriptions.invalidate()
+            self.load_data()
+            message = (f"Импортировано транзакций: {result.inserted}\n"
+                       f"Пропущено дубликатов: {result.duplicates}")
+            if result.categorized or result.uncertain:
+                message += (f"\nКатегория определена по описанию: {result.categorized}\n"
+                            f"Отнесено к запасной категории: {result.uncertain}")
+            QtWidgets.QMessageBox.information(self, "Импорт завершен", message)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(
+                self,
+                "Ошибка",
+                f"Не удалось импортировать данные: {str(e)}"
+            )
+
+    def import_fx_rates(self):
+        """Загрузка курсов валют из CSV (date, currency, rate)"""
+        try:
+            file_path, _ = QtWidgets.QFileDialog.getOpenFileName(
+                self, "Файл курсов валют", "", "CSV (*.csv);;Все файлы (*)"
+            )
+            if not file_path:
+                return
+
+            count = currency.import_rates_csv(file_path)
+            self.accounts.reload()
+            self.chartsPanel.renderer.invalidate()
+            self.update_statistics()
+            self.statusbar.showMessage(f"Загружено курсов валют: {count}", 5000)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить курсы валют: {str(e)}")
+
     def create_backup(self):
-        """Создание резервной копии базы данных"""
+        """Создание резервной копии базы данных и ее архивов"""
         try:
             # Запрашиваем путь для сохранения
             file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
@@ -356,14 +1376,16 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             if not file_path.endswith('.db'):
                 file_path += '.db'
 
-            # Создаем резервную копию
-            import shutil
-            shutil.copy2('finance.db', file_path)
+            # Согласованная копия средствами SQLite: с изменениями из журнала WAL
+            # и архивами прошлых лет рядом с файлом копии
+            self.edit_session.flush()
+            years = backups.copy_database(file_path)
+            archives = f"\nАрхивы: {', '.join(str(year) for year in years)}" if years else ""
             
             QtWidgets.QMessageBox.information(
                 self,
                 "Резервное копирование",
-                f"Резервная копия успешно создана:\n{file_path}"
+                f"Резервная копия успешно создана:\n{file_path}{archives}"
             )
         except Exception as e:
             QtWidgets.QMessageBox.critical(
@@ -404,43 +1426,26 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             if not os.path.exists(file_path):
                 raise FileNotFoundError("Файл резервной копии не найден")
 
-            # Закрываем текущее соединение с базой данных
+            db_file = db.get_database_file()
+            self.edit_session.flush()
+            # Фоновые задачи закрывают свои соединения до замены файлов базы
+            self.stop_background_work()
+            QtWidgets.QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
             db.close_connection()
-
-            # Создаем временную копию текущей базы данных
-            import shutil
-            temp_backup = "finance_temp_backup.db"
-            if os.path.exists("finance.db"):
-                shutil.copy2("finance.db", temp_backup)
-
             try:
-                # Копируем файл резервной копии
-                shutil.copy2(file_path, "finance.db")
-                
-                # Переинициализируем соединение с базой данных
-                db.initialize()
-                
-                # Перезагружаем данные
-                self.load_data()
-                
-                # Удаляем временную копию
-                if os.path.exists(temp_backup):
-                    os.remove(temp_backup)
-                
-                QtWidgets.QMessageBox.information(
-                    self,
-                    "Восстановление завершено",
-                    "Данные успешно восстановлены из резервной копии"
-                )
-            except Exception as e:
-                # В случае ошибки восстанавливаем из временной копии
-                if os.path.exists(temp_backup):
-                    shutil.copy2(temp_backup, "finance.db")
-                    os.remove(temp_backup)
-                    db.initialize()
-                    self.load_data()
-                raise Exception(f"Ошибка при восстановлении: {str(e)}")
-                
+                # При ошибке прежние файлы базы и архивов возвращаются на место
+                backups.restore_copy(file_path, db_file)
+            finally:
+                db.initialize(db_file)
+                QtWidgets.QApplication.restoreOverrideCursor()
+                self.reload_restored_data()
+                self.start_background_work()
+
+            QtWidgets.QMessageBox.information(
+                self,
+                "Восстановление завершено",
+                "Данные успешно восстановлены из резервной копии"
+            )
         except Exception as e:
             QtWidgets.QMessageBox.critical(
                 self,
@@ -448,213 +1453,631 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 f"Не удалось восстановить данные: {str(e)}"
             )
 
+    def stop_background_work(self):
+        """Остановка опроса базы и ожидание фоновых задач, читающих ее своими соединениями"""
+        self.change_watcher.stop()
+        self.maintenanceTimer.stop()
+        self.background_load = False
+        self.transaction_loader.wait()
+        self.descriptions.wait()
+        if self.backup_scheduler is not None:
+            self.backup_scheduler.stop()
+
+    def start_background_work(self):
+        self.change_watcher.start()
+        self.maintenanceTimer.start()
+        if self.backup_scheduler is not None:
+            self.backup_scheduler.start()
+
+    def reload_restored_data(self):
+        """Перечитывание справочников, кэшей и таблицы после замены базы"""
+        self.reports.clear()
+        self.chartsPanel.renderer.invalidate()
+        self.descriptions.invalidate()
+        self.accounts.reload()
+        self.categories.reload()
+        self.load_data()
+
+    def archive_year(self):
+        """Перенос закрытого года в архивный файл"""
+        try:
+            years = [str(year) for year in db.get_archivable_years()]
+            if not years:
+                QtWidgets.QMessageBox.information(self, "Архив", "Нет прошедших лет для переноса в архив")
+                return
+            year, ok = QtWidgets.QInputDialog.getItem(
+                self, "Перенести год в архив", "Год:", years, 0, False
+            )
+            if not ok:
+                return
+
+            count = db.archive_year(int(year))
+            self.load_data()
+            QtWidgets.QMessageBox.information(
+                self,
+                "Архив",
+                f"В архив перенесено транзакций: {count}\n"
+                f"Они по-прежнему учитываются в статистике и доступны через фильтр по периоду"
+            )
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось перенести год в архив: {str(e)}")
+
+    def unarchive_year(self):
+        """Возврат года из архива в основную базу"""
+        try:
+            years = [str(year) for year in db.get_archived_years()]
+            if not years:
+                QtWidgets.QMessageBox.information(self, "Архив", "Архив пуст")
+                return
+            year, ok = QtWidgets.QInputDialog.getItem(
+                self, "Вернуть год из архива", "Год:", years, 0, False
+            )
+            if not ok:
+                return
+
+            count = db.unarchive_year(int(year))
+            self.load_data()
+            self.statusbar.showMessage(f"Из архива возвращено транзакций: {count}", 5000)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось вернуть год из архива: {str(e)}")
+
+    def vacuum_database(self):
+        """Полное сжатие базы с отчетом о размере и фрагментации"""
+        try:
+            self.edit_session.flush()
+            current = maintenance.format_storage_stats(db.get_storage_stats(detailed=True))
+            reply = QtWidgets.QMessageBox.question(
+                self,
+                "Сжатие базы данных",
+                f"Сейчас: {current}\n\nПерепаковать файл базы? Это может занять некоторое время.",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No,
+                QtWidgets.QMessageBox.StandardButton.Yes
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.No:
+                return
+            QtWidgets.QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                before, after = db.vacuum_database()
+            finally:
+                QtWidgets.QApplication.restoreOverrideCursor()
+            QtWidgets.QMessageBox.information(self, "Сжатие базы данных",
+                                              maintenance.format_vacuum_report(before, after))
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось сжать базу данных: {str(e)}")
+
+    def run_idle_maintenance(self):
+        """Шаг освобождения страниц базы, если пользователь ничего не правит"""
+        if self.edit_session.has_pending() or QtWidgets.QApplication.activeModalWidget():
+            return
+        try:
+            maintenance.vacuum_step()
+        except Exception as e:
+            print(f"Ошибка обслуживания базы данных: {str(e)}")
+
+    def on_backup_finished(self, report):
+        """Сообщение о плановой резервной копии"""
+        if report.entry is None:
+            return
+        if report.verified:
+            self.statusbar.showMessage(
+                f"Создана резервная копия: {maintenance.format_size(report.entry.stored)}", 5000)
+        else:
+            QtWidgets.QMessageBox.warning(self, "Резервное копирование",
+                                          f"Резервная копия {report.entry.name} не прошла проверку")
+
+    def on_backup_failed(self, error):
+        print(f"Ошибка резервного копирования: {error}")
+        self.statusbar.showMessage(f"Не удалось создать резервную копию: {error}", 5000)
+
+    def generate_recurring_transactions(self):
+        """Создание наступивших регулярных транзакций одной пакетной вставкой"""
+        try:
+            count = recurring.generate_due_transactions()
+            if count:
+                self.statusbar.showMessage(f"Добавлено регулярных транзакций: {count}", 5000)
+            return count
+        except Exception as e:
+            print(f"Ошибка при создании регулярных транзакций: {str(e)}")
+            return 0
+
+    def manage_categories(self):
+        """Открытие окна управления категориями"""
+        dialog = CategoriesDialog(self.categories, self)
+        dialog.exec()
+        if dialog.merged:
+            self.load_data()
+
+    def show_accounts(self):
+        """Открытие окна счетов и выписок"""
+        dialog = AccountsDialog(self.categories, self.accounts, self)
+        dialog.exec()
+        if dialog.moved:
+            self.load_data()
+
+    def find_duplicates(self):
+        """Открытие отчета о дубликатах транзакций"""
+        dialog = DuplicatesDialog(self.categories, self)
+        dialog.exec()
+        if dialog.deleted_count:
+            self.load_data()
+            self.statusbar.showMessage(f"Удалено дубликатов: {dialog.deleted_count}", 5000)
+
+    def manage_recurring_rules(self):
+        """Открытие окна управления регулярными транзакциями"""
+        dialog = RecurringRulesDialog(self.categories, self)
+        dialog.exec()
+        if self.generate_recurring_transactions():
+            self.load_data()
+
     def setup_transactions_table(self):
         """Настройка основной таблицы транзакций"""
-        self.tableWidget.setColumnCount(5)
-        self.tableWidget.setHorizontalHeaderLabels(["Дата", "Категория", "Сумма", "Описание", "Чек"])
+        # Таблица работает поверх модели с колоночным хранилищем
+        self.transactionModel = TransactionTableModel(self)
+        self.transactionModel.descriptionEdited.connect(self.on_description_edited)
+        self.tableView.setModel(self.transactionModel)
         
         # Устанавливаем размеры столбцов
-        self.tableWidget.setColumnWidth(0, 100)  # Дата
-        self.tableWidget.setColumnWidth(1, 150)  # Категория
-        self.tableWidget.setColumnWidth(2, 120)  # Сумма
-        self.tableWidget.setColumnWidth(4, 150)  # Чек
-        self.tableWidget.horizontalHeader().setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeMode.Stretch)  # Описание
-
-        # Настраиваем выравнивание заголовков
-        header = self.tableWidget.horizontalHeader()
-        for i in range(5):
-            header_item = self.tableWidget.horizontalHeaderItem(i)
-            if header_item:
-                header_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # Настройка таблицы для поддержки переноса текста
-        self.tableWidget.setWordWrap(True)
-        self.tableWidget.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
-        
-        # Настройка автоматического изменения размера ячеек
-        self.tableWidget.resizeRowsToContents()
-        self.tableWidget.cellChanged.connect(self.on_cell_changed)
+        self.tableView.setColumnWidth(0, 100)  # Дата
+        self.tableView.setColumnWidth(1, 150)  # Категория
+        self.tableView.setColumnWidth(2, 120)  # Сумма
+        self.tableView.setColumnWidth(4, 150)  # Чек
+        self.tableView.horizontalHeader().setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeMode.Stretch)  # Описание
+        
+        # Строки одинаковой высоты: длинное описание сокращается многоточием,
+        # полный текст - во всплывающей подсказке и в раскрытой текущей строке
+        self.tableView.setWordWrap(False)
+        self.tableView.setTextElideMode(Qt.TextElideMode.ElideRight)
+        self.descriptionDelegate = DescriptionDelegate(self.tableView, self.descriptions)
+        self.tableView.setItemDelegateForColumn(3, self.descriptionDelegate)
+        vertical_header = self.tableView.verticalHeader()
+        vertical_header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+        vertical_header.setDefaultSectionSize(self.tableView.fontMetrics().height() + 12)
+        self.expanded_row = None
+        self.tableView.selectionModel().currentRowChanged.connect(self.on_current_row_changed)
+        self.transactionModel.modelReset.connect(self.collapse_expanded_row)
+        
+        # Описание редактируется по двойному клику, остальные ячейки - через диалоги
+        self.tableView.setEditTriggers(
+            QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked |
+            QtWidgets.QAbstractItemView.EditTrigger.EditKeyPressed
+        )
         
         # Подключаем обработчик клика по ячейке
-        self.tableWidget.cellClicked.connect(self.handle_cell_click)
+        self.tableView.clicked.connect(self.handle_cell_click)
+
+        # Сортировка по клику на заголовок, по умолчанию - по дате от новых к старым
+        self.tableView.horizontalHeader().setSortIndicator(0, Qt.SortOrder.DescendingOrder)
+        self.tableView.setSortingEnabled(True)
 
         # Включаем множественное выделение
-        self.tableWidget.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.tableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tableView.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+
+    def on_current_row_changed(self, current, previous):
+        """Раскрытие текущей строки до полного описания"""
+        # Переход к другой строке завершает правки предыдущей
+        if previous.isValid() and current.row() != previous.row():
+            self.edit_session.flush()
+        self.collapse_expanded_row()
+        if current.isValid():
+            self.expand_row(current.row())
+
+    def expand_row(self, row):
+        """Увеличение высоты строки под описание с переносом; измеряется только эта строка"""
+        text = self.transactionModel.data(self.transactionModel.index(row, 3)) or ""
+        width = max(self.tableView.columnWidth(3) - 10, 50)
+        rect = self.tableView.fontMetrics().boundingRect(
+            QtCore.QRect(0, 0, width, 100000), Qt.TextFlag.TextWordWrap, text
+        )
+        vertical_header = self.tableView.verticalHeader()
+        height = rect.height() + 12
+        if height <= vertical_header.defaultSectionSize():
+            return
+        self.descriptionDelegate.expanded_rows.add(row)
+        vertical_header.resizeSection(row, height)
+        self.expanded_row = row
+
+    def collapse_expanded_row(self):
+        """Возврат раскрытой строки к стандартной высоте"""
+        row = self.expanded_row
+        self.expanded_row = None
+        self.descriptionDelegate.expanded_rows.clear()
+        if row is not None and row < self.transactionModel.rowCount():
+            vertical_header = self.tableView.verticalHeader()
+            vertical_header.resizeSection(row, vertical_header.defaultSectionSize())
+
+    def setup_filter_bar(self):
+        """Создание панели фильтров таблицы транзакций"""
+        self.filterLayout = QtWidgets.QHBoxLayout()
+        
+        # Категория
+        self.filterLayout.addWidget(QtWidgets.QLabel("Категория:", self))
+        self.filterCategoryCombo = QtWidgets.QComboBox(self)
+        self.filterCategoryCombo.addItem("Все категории", None)
+        self.filterLayout.addWidget(self.filterCategoryCombo)
+        
+        # Период
+        self.filterPeriodCheck = QtWidgets.QCheckBox("Период с", self)
+        self.filterLayout.addWidget(self.filterPeriodCheck)
+        self.filterStartDate = QtWidgets.QDateEdit(QDate.currentDate().addMonths(-1), self)
+        self.filterStartDate.setCalendarPopup(True)
+        self.filterLayout.addWidget(self.filterStartDate)
+        self.filterLayout.addWidget(QtWidgets.QLabel("по", self))
+        self.filterEndDate = QtWidgets.QDateEdit(QDate.currentDate(), self)
+        self.filterEndDate.setCalendarPopup(True)
+        self.filterLayout.addWidget(self.filterEndDate)
+        
+        # Наличие чека
+        self.filterReceiptCombo = QtWidgets.QComboBox(self)
+        self.filterReceiptCombo.addItem("Все чеки", None)
+        self.filterReceiptCombo.addItem("С чеком", True)
+        self.filterReceiptCombo.addItem("Без чека", False)
+        self.filterLayout.addWidget(self.filterReceiptCombo)
+        self.filterLayout.addStretch()
+        
+        # Панель располагается сразу под кнопками управления
+        self.verticalLayout.insertLayout(1, self.filterLayout)
+        
+        self.filterCategoryCombo.currentIndexChanged.connect(self.on_filter_bar_changed)
+        self.filterPeriodCheck.toggled.connect(self.on_filter_bar_changed)
+        self.filterStartDate.dateChanged.connect(self.on_filter_bar_changed)
+        self.filterEndDate.dateChanged.connect(self.on_filter_bar_changed)
+        self.filterReceiptCombo.currentIndexChanged.connect(self.on_filter_bar_changed)
+
+    def populate_filter_categories(self, categories):
+        """Заполнение списка категорий в панели фильтров"""
+        current = self.filterCategoryCombo.currentData()
+        self.filterCategoryCombo.blockSignals(True)
+        self.filterCategoryCombo.clear()
+        self.filterCategoryCombo.addItem("Все категории", None)
+        for cat in categories:
+            self.filterCategoryCombo.addItem(cat[1], cat[0])
+        index = self.filterCategoryCombo.findData(current)
+        self.filterCategoryCombo.setCurrentIndex(max(index, 0))
+        self.filterCategoryCombo.blockSignals(False)
+
+    def on_filter_bar_changed(self, *args):
+        """Применение фильтра, заданного на панели фильтров"""
+        start_date = end_date = None
+        if self.filterPeriodCheck.isChecked():
+            start_date = self.filterStartDate.date().toString("yyyy-MM-dd")
+            # Конечная дата на панели включительная, в фильтре - исключительная
+            end_date = self.filterEndDate.date().addDays(1).toString("yyyy-MM-dd")
+        category_id = self.filterCategoryCombo.currentData()
+        self.apply_filter(TransactionFilter(
+            start_date=start_date,
+            end_date=end_date,
+            category_ids=[category_id] if category_id is not None else None,
+            has_receipt=self.filterReceiptCombo.currentData()
+        ))
+
+    def sync_filter_bar(self):
+        """Отображение текущего фильтра на панели фильтров"""
+        flt = self.transaction_filter
+        widgets = [self.filterCategoryCombo, self.filterPeriodCheck, self.filterStartDate,
+                   self.filterEndDate, self.filterReceiptCombo]
+        for widget in widgets:
+            widget.blockSignals(True)
+        
+        self.filterPeriodCheck.setChecked(bool(flt.start_date and flt.end_date))
+        if flt.start_date and flt.end_date:
+            self.filterStartDate.setDate(QDate.fromString(flt.start_date, "yyyy-MM-dd"))
+            self.filterEndDate.setDate(QDate.fromString(flt.end_date, "yyyy-MM-dd").addDays(-1))
+        category_id = next(iter(flt.category_ids)) if flt.category_ids else None
+        self.filterCategoryCombo.setCurrentIndex(max(self.filterCategoryCombo.findData(category_id), 0))
+        self.filterReceiptCombo.setCurrentIndex(max(self.filterReceiptCombo.findData(flt.has_receipt), 0))
+        
+        for widget in widgets:
+            widget.blockSignals(False)
+
+    def apply_filter(self, flt):
+        """Применение фильтра к таблице транзакций"""
+        self.transaction_filter = flt
+        if self.partial_load or self.store_filtered or self.filter_needs_archive(flt):
+            # В памяти только часть данных - условия выполняются в SQL по индексам
+            self.load_transactions()
+        else:
+            self.transactionModel.set_filter(flt)
+
+    def filter_needs_archive(self, flt):
+        """Затрагивает ли период фильтра архивные годы"""
+        archived_years = db.get_archived_years()
+        if not archived_years or not flt.start_date:
+            return False
+        return int(flt.start_date[:4]) <= max(archived_years)
 
     def setup_statistics_table(self):
         """Создание и настройка таблицы статистики"""
-        # Создаем виджет для таблицы статистики
-        self.statsTable = QtWidgets.QTableWidget(self)
+        # Таблица статистики работает поверх модели с агрегатами
+        self.statsModel = StatisticsModel(self)
+        self.statsTable = QtWidgets.QTableView(self)
+        self.statsTable.setModel(self.statsModel)
         self.statsTable.setMinimumHeight(200)  # Минимальная высота таблицы
         
         # Добавляем таблицу в вертикальный layout после основной таблицы
         self.verticalLayout.addWidget(self.statsTable)
         
-        # Настраиваем заголовок
-        self.statsTable.setColumnCount(13)  # 12 месяцев + столбец года
-        headers = ["Год"] + [f"{i:02d}" for i in range(1, 13)]  # Год и месяцы 01-12
-        self.statsTable.setHorizontalHeaderLabels(headers)
-        
         # Настройка внешнего вида
         self.statsTable.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignCenter)
         self.statsTable.verticalHeader().setVisible(False)
+        self.statsTable.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.statsTable.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
         
         # Устанавливаем размеры столбцов
         self.statsTable.setColumnWidth(0, 80)  # Год
         for i in range(1, 13):
             self.statsTable.setColumnWidth(i, 90)  # Месяцы
+        
+        # Подсветка при наведении задается один раз
+        self.statsTable.setStyleSheet("""
+            QTableView::item:hover {
+                background-color: #e6f3ff;
+            }
+        """)
+        
+        # Клик по месяцу - фильтр транзакций и разбивка по категориям
+        self.statsTable.clicked.connect(self.on_statistics_clicked)
+        
+        # Панель детализации выбранного месяца
+        self.breakdownLayout = QtWidgets.QHBoxLayout()
+        self.breakdownLabel = QtWidgets.QLabel(self)
+        self.breakdownLabel.setWordWrap(True)
+        self.breakdownLayout.addWidget(self.breakdownLabel, 1)
+        self.resetPeriodButton = QtWidgets.QPushButton("Показать все", self)
+        self.resetPeriodButton.clicked.connect(self.reset_period_filter)
+        self.breakdownLayout.addWidget(self.resetPeriodButton)
+        self.verticalLayout.addLayout(self.breakdownLayout)
+        self.show_breakdown(None, [])
+
+    def setup_charts_panel(self):
+        """Создание панели графиков (по умолчанию скрыта)"""
+        self.chartsPanel = ChartsPanel(self.reports, self)
+        self.chartsDock = QtWidgets.QDockWidget("Графики", self)
+        self.chartsDock.setWidget(self.chartsPanel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.chartsDock)
+        self.chartsDock.hide()
+
+    def toggle_charts_panel(self):
+        """Показ или скрытие панели графиков"""
+        self.chartsDock.setVisible(not self.chartsDock.isVisible())
+
+    def setup_budget_panel(self):
+        """Создание панели бюджетов (по умолчанию скрыта)"""
+        self.budgetPanel = BudgetPanel(self.categories, self)
+        self.budgetDock = QtWidgets.QDockWidget("Бюджеты", self)
+        self.budgetDock.setWidget(self.budgetPanel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.budgetDock)
+        self.budgetDock.hide()
+
+    def toggle_budget_panel(self):
+        """Показ или скрытие панели бюджетов"""
+        self.budgetDock.setVisible(not self.budgetDock.isVisible())
 
     def update_statistics(self):
         """Обновление таблицы статистики"""
         try:
-            # Получаем статистику по годам и месяцам
-            stats = db.get_monthly_statistics()
-            
-            # Очищаем таблицу
-            self.statsTable.setRowCount(0)
-            
-            # Заполняем таблицу данными
-            current_row = -1
-            current_year = None
-            
-            for year, month, total in stats:
-                if year != current_year:
-                    current_year = year
-                    current_row += 1
-                    self.statsTable.insertRow(current_row)
-                    
-                    # Добавляем год
-                    year_item = QtWidgets.QTableWidgetItem(str(year))
-                    year_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    year_item.setFlags(year_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                    self.statsTable.setItem(current_row, 0, year_item)
-                    
-                    # Инициализируем ячейки месяцев
-                    for i in range(1, 13):
-                        month_item = QtWidgets.QTableWidgetItem("0.00 руб.")
-                        month_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                        month_item.setFlags(month_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                        self.statsTable.setItem(current_row, i, month_item)
-                
-                # Обновляем сумму для месяца
-                if total is not None:
-                    amount_str = f"{total:.2f} руб."
-                    month_item = QtWidgets.QTableWidgetItem(amount_str)
-                    month_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                    month_item.setFlags(month_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                    self.statsTable.setItem(current_row, month, month_item)
+            # Отметка берется до расчета: с ней статистика попадет в снимок при закрытии
+            stamp = db.get_data_stamp()
+            # Получаем статистику по годам и месяцам и обновляем модель на месте
+            self.show_statistics(db.get_monthly_statistics(), stamp)
+            # Состояние бюджетов - тем же поводом, из итогов по категориям
+            self.budgetPanel.refresh()
+        except Exception as e:
+            print(f"Ошибка при обновлении статистики: {str(e)}")
+
+    def show_statistics(self, stats, stamp):
+        """Показ статистики по годам и месяцам"""
+        self.statistics = (stamp, stats)
+        self.statsModel.update_data(stats)
+        # Графики перестраиваются, только если панель открыта
+        self.chartsPanel.set_years({row[0] for row in stats})
+        self.chartsPanel.refresh()
+
+    def on_statistics_clicked(self, index):
+        """Обработка клика по ячейке статистики"""
+        try:
+            period = self.statsModel.cell_period(index)
+            if period is None:
+                # Клик по столбцу года сбрасывает фильтр
+                self.reset_period_filter()
+                return
             
-            # Добавляем подсветку при наведении
-            self.statsTable.setStyleSheet("""
-                QTableWidget::item:hover {
-                    background-color: #e6f3ff;
-                }
-            """)
+            year, month = period
+            start_date, end_date = db.get_month_range(year, month)
+            breakdown = self.reports.run(ReportQuery.for_month(year, month, group_by='category'))
+            self.show_breakdown(period, breakdown)
             
+            flt = self.transaction_filter
+            self.apply_filter(TransactionFilter(start_date, end_date, flt.category_ids, flt.has_receipt))
+            self.sync_filter_bar()
         except Exception as e:
-            print(f"Ошибка при обновлении статистики: {str(e)}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка при выборе месяца: {str(e)}")
+
+    def reset_period_filter(self):
+        """Сброс фильтра транзакций по месяцу"""
+        flt = self.transaction_filter
+        self.statsTable.clearSelection()
+        self.show_breakdown(None, [])
+        self.apply_filter(TransactionFilter(category_ids=flt.category_ids, has_receipt=flt.has_receipt))
+        self.sync_filter_bar()
+
+    def show_breakdown(self, period, breakdown):
+        """Отображение расходов выбранного месяца по категориям"""
+        if period is None:
+            self.breakdownLabel.setText("Выберите месяц в таблице статистики для детализации")
+            self.resetPeriodButton.setEnabled(False)
+            return
+        
+        year, month = period
+        if breakdown:
+            parts = [f"{name}: {self.format_amount(total)}" for _, name, total in breakdown]
+            details = "; ".join(parts)
+        else:
+            details = "расходов нет"
+        self.breakdownLabel.setText(f"{month:02d}.{year} - {details}")
+        self.resetPeriodButton.setEnabled(True)
 
     def format_amount(self, amount) -> str:
         """Форматирование суммы в нужный формат"""
+        return format_amount(amount)
+
+    def on_description_edited(self, transaction_id, old_description, new_description):
+        """Сохранение описания, измененного в таблице (модель уже обновлена)"""
+        self.edit_session.set_field(transaction_id, 'description', old_description, new_description)
+        self.descriptions.add(new_description)
+
+    def edit_field(self, transaction_id, field, old_value, new_value):
+        """Правка поля транзакции: таблица обновляется сразу, база - при записи правок"""
+        self.edit_session.set_field(transaction_id, field, old_value, new_value)
+        if not self.transactionModel.set_field(transaction_id, field, new_value):
+            self.load_data()
+
+    def on_edits_flushed(self, transaction_ids):
+        """Правки записаны в базу - пересчет статистики"""
+        self.update_statistics()
+
+    def on_edits_failed(self, message):
+        """Правки не записаны - таблица возвращается к данным базы"""
+        QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить изменения: {message}")
+        self.load_data()
+
+    def undo_edit(self):
+        """Отмена последней правки транзакции (Ctrl+Z)"""
         try:
-            if amount is None:
-                return "0.00 руб."
-            amount_float = float(amount)
-            # Форматируем число с двумя знаками после запятой
-            formatted = f"{amount_float:,.2f}".replace(',', ' ')
-            return f"{formatted} руб."
-        except (ValueError, TypeError):
-            return "0.00 руб."
-
-    def on_cell_changed(self, row, column):
-        """Обработчик изменения содержимого ячейки"""
-        try:
-            if column == 3:  # Колонка описания
-                self.tableWidget.resizeRowToContents(row)
-                # Если описание изменилось, сохраняем его в базе данных
-                new_description = self.tableWidget.item(row, column).text()
-                transaction_id = self.tableWidget.item(row, 0).data(Qt.ItemDataRole.UserRole)
-                if transaction_id:
-                    db.update_transaction_description(transaction_id, new_description)
+            result = self.edit_session.undo()
         except Exception as e:
-            print(f"Ошибка при обновлении высоты строки: {str(e)}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось отменить правку: {str(e)}")
+            return
+        self.apply_journal_step(result, "Отменено", "Нечего отменять")
+
+    def redo_edit(self):
+        """Повтор отмененной правки транзакции (Ctrl+Y)"""
+        try:
+            result = self.edit_session.redo()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось повторить правку: {str(e)}")
+            return
+        self.apply_journal_step(result, "Повторено", "Нечего повторять")
+
+    def apply_journal_step(self, result, done_message, empty_message):
+        """Отображение отмененной или повторенной правки в таблице и статистике"""
+        if result is None:
+            self.statusbar.showMessage(empty_message, 3000)
+            return
+        transaction_id, field, value = result
+        if not self.transactionModel.set_field(transaction_id, field, value):
+            self.load_data()
+        self.update_statistics()
+        self.statusbar.showMessage(f"{done_message}: {FIELD_TITLES.get(field, field)}", 3000)
 
     def load_data(self):
         """Загрузка данных в таблицу"""
+        # Незаписанные правки сначала попадают в базу
+        self.edit_session.flush()
+        # Все, что есть в базе на этот момент, попадет в загрузку
+        self.change_watcher.reset()
+        self.load_transactions()
+        
+        # Обновляем статистику
+        self.update_statistics()
+
+    def load_transactions(self):
+        """Загрузка транзакций в колоночное хранилище модели"""
+        # Результат фоновой загрузки, если она еще идет, уже не нужен
+        self.background_load = False
         try:
-            self.tableWidget.setRowCount(0)
-            transactions = db.get_all_transactions()
+            flt = self.transaction_filter
+            include_archive = self.filter_needs_archive(flt)
+            self.partial_load = db.count_transactions() > MEMORY_ROWS_LIMIT
+            self.store_filtered = self.partial_load or include_archive
+            if self.store_filtered:
+                # Загружаем только самые новые транзакции, удовлетворяющие фильтру;
+                # архивные годы читаются, только если их затрагивает период фильтра
+                rows = db.iter_transactions(flt.start_date, flt.end_date, flt.category_ids,
+                                            flt.has_receipt, limit=MEMORY_ROWS_LIMIT,
+                                            include_archive=include_archive)
+            else:
+                rows = db.iter_transactions()
+            categories = self.categories.categories()
+            self.populate_filter_categories(categories)
+            self.transactionModel.set_data(TransactionStore(rows), categories, flt)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
 
-            for row, transaction in enumerate(transactions):
-                try:
-                    self.tableWidget.insertRow(row)
-                    
-                    # Проверяем, что у нас достаточно данных
-                    if len(transaction) < 6:
-                        continue
-                    
-                    # Распаковываем данные транзакции
-                    trans_id, amount, category_id, date, description, receipt_path = transaction
-                    
-                    # Дата
-                    date_item = QtWidgets.QTableWidgetItem(str(date))
-                    date_item.setData(Qt.ItemDataRole.UserRole, trans_id)
-                    date_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.tableWidget.setItem(row, 0, date_item)
-                    
-                    # Категория
-                    category_name = db.get_category_name(category_id)
-                    category_item = QtWidgets.QTableWidgetItem(category_name)
-                    category_item.setData(Qt.ItemDataRole.UserRole, category_id)
-                    category_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.tableWidget.setItem(row, 1, category_item)
-                    
-                    # Сумма
-                    amount_str = self.format_amount(amount)
-                    amount_item = QtWidgets.QTableWidgetItem(amount_str)
-                    amount_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                    self.tableWidget.setItem(row, 2, amount_item)
-                    
-                    # Описание
-                    desc_item = QtWidgets.QTableWidgetItem(str(description) if description else "")
-                    desc_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-                    desc_item.setFlags(desc_item.flags() | Qt.ItemFlag.ItemIsEditable)
-                    self.tableWidget.setItem(row, 3, desc_item)
-                    
-                    # Чек
-                    if receipt_path and isinstance(receipt_path, str) and os.path.exists(receipt_path):
-                        receipt_item = QtWidgets.QTableWidgetItem("Просмотреть чек")
-                        receipt_item.setData(Qt.ItemDataRole.UserRole, receipt_path)
-                        receipt_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                        receipt_item.setForeground(QtGui.QBrush(QtGui.QColor("blue")))
-                        font = receipt_item.font()
-                        font.setUnderline(True)
-                        receipt_item.setFont(font)
-                    else:
-                        receipt_item = QtWidgets.QTableWidgetItem("Нет")
-                        receipt_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.tableWidget.setItem(row, 4, receipt_item)
-
-                    # Устанавливаем высоту строки в зависимости от содержимого
-                    self.tableWidget.resizeRowToContents(row)
+    def show_snapshot(self, snapshot):
+        """Показ снимка прошлого запуска без чтения транзакций и статистики из базы"""
+        categories = self.categories.categories()
+        self.populate_filter_categories(categories)
+        # Пока в таблице только последние транзакции, фильтры выполняются в SQL
+        self.partial_load = not snapshot.is_complete()
+        self.store_filtered = False
+        self.transactionModel.set_data(TransactionStore(snapshot.rows), categories, self.transaction_filter)
+        self.show_statistics(snapshot.statistics, snapshot.stamp)
+        QtCore.QTimer.singleShot(0, lambda: self.finish_warm_start(snapshot))
+
+    def finish_warm_start(self, snapshot):
+        """Проверка снимка по отметке состояния базы и дозагрузка транзакций (после первой отрисовки)"""
+        try:
+            if db.get_data_stamp() != snapshot.stamp:
+                # База менялась после закрытия (другой клиент, импорт, регулярные
+                # транзакции): перечитывание справочника обновляет и статистику
+                self.categories.reload()
+            elif snapshot.is_complete():
+                return
+            self.background_load = True
+            self.transaction_loader.load(MEMORY_ROWS_LIMIT)
+        except Exception as e:
+            print(f"Ошибка проверки снимка: {str(e)}")
+            self.load_data()
 
-                except Exception as e:
-                    print(f"Ошибка при добавлении строки {row}: {str(e)}")
-                    continue
+    def on_transactions_loaded(self, store, seq, partial):
+        """Замена снимка полным набором транзакций, загруженным в фоне"""
+        if not self.background_load:
+            # Данные уже перезагружены (фильтр, обновление)
+            return
+        self.background_load = False
+        self.edit_session.flush()
+        self.partial_load = self.store_filtered = partial
+        self.transactionModel.set_data(store, self.categories.categories(), self.transaction_filter)
+        # Изменения, записанные после чтения строк, подтягиваются из журнала
+        self.change_watcher.reset(seq)
+        self.change_watcher.poll()
+
+    def on_transactions_load_failed(self, message):
+        """Фоновая загрузка не удалась - обычная загрузка"""
+        print(f"Ошибка фоновой загрузки транзакций: {message}")
+        if self.background_load:
+            self.load_data()
 
-            # Финальная подгонка размеров
-            self.tableWidget.resizeRowsToContents()
-            
-            # Обновляем статистику
+    def on_external_transactions_changed(self, rows, deleted_ids):
+        """Применение транзакций, измененных другими клиентами базы"""
+        try:
+            if not self.filter_needs_archive(self.transaction_filter):
+                # В таблице нет архивных лет: незагруженные транзакции архивных лет
+                # (правки архива другим клиентом) в нее не добавляются
+                archived = {f"{year:04d}" for year in db.get_archived_years()}
+                rows = [row for row in rows
+                        if row[3][:4] not in archived or self.transactionModel.has_transaction(row[0])]
+            self.transactionModel.apply_changes(rows, deleted_ids)
             self.update_statistics()
-            
         except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
+            print(f"Ошибка при применении изменений: {str(e)}")
 
-    def handle_cell_click(self, row, column):
+    def on_external_categories_changed(self):
+        """Обновление справочника категорий, измененного другими клиентами базы"""
+        self.categories.reload()
+
+    def on_categories_changed(self):
+        """Применение изменений справочника категорий к таблице, фильтрам и статистике"""
+        categories = self.categories.categories()
+        self.populate_filter_categories(categories)
+        self.transactionModel.set_categories(categories)
+        self.update_statistics()
+
+    def handle_cell_click(self, index):
         """Обработка клика по ячейке таблицы"""
         try:
+            row, column = index.row(), index.column()
             if column == 0:  # Дата
                 self.edit_date(row)
             elif column == 1:  # Категория
@@ -662,28 +2085,22 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             elif column == 2:  # Сумма
                 self.edit_amount(row)
             elif column == 4:  # Чек
-                item = self.tableWidget.item(row, column)
-                if item:
-                    receipt_path = item.data(Qt.ItemDataRole.UserRole)
-                    if receipt_path and isinstance(receipt_path, str) and os.path.exists(receipt_path):
-                        # Если чек существует, открываем его для просмотра
-                        viewer = ReceiptViewerDialog(receipt_path, self)
-                        viewer.exec()
-                    else:
-                        # Если чека нет, открываем диалог для его добавления
-                        self.add_receipt(row)
+                receipt_path = self.transactionModel.receipt_path(row)
+                if receipt_path:
+                    # Если чек существует, открываем его для просмотра
+                    viewer = ReceiptViewerDialog(receipt_path, self)
+                    viewer.exec()
+                else:
+                    # Если чека нет, открываем диалог для его добавления
+                    self.add_receipt(row)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка при обработке клика: {str(e)}")
 
     def edit_date(self, row):
         """Редактирование даты транзакции"""
         try:
-            item = self.tableWidget.item(row, 0)
-            if not item:
-                return
-                
-            current_date = item.text()
-            transaction_id = item.data(Qt.ItemDataRole.UserRole)
+            current_date = self.transactionModel.date(row)
+            transaction_id = self.transactionModel.transaction_id(row)
             if not transaction_id:
                 return
             
@@ -710,8 +2127,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             if date_dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
                 new_date = date_edit.date().toString("yyyy-MM-dd")
                 try:
-                    db.update_transaction_date(transaction_id, new_date)
-                    self.load_data()
+                    self.edit_field(transaction_id, 'date', current_date, new_date)
                 except Exception as e:
                     QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось обновить дату: {str(e)}")
         except Exception as e:
@@ -720,13 +2136,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def edit_category(self, row):
         """Редактирование категории транзакции"""
         try:
-            date_item = self.tableWidget.item(row, 0)
-            category_item = self.tableWidget.item(row, 1)
-            if not date_item or not category_item:
-                return
-                
-            transaction_id = date_item.data(Qt.ItemDataRole.UserRole)
-            current_category_id = category_item.data(Qt.ItemDataRole.UserRole)
+            transaction_id = self.transactionModel.transaction_id(row)
+            current_category_id = self.transactionModel.category_id(row)
             if not transaction_id:
                 return
             
@@ -734,12 +2145,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             category_dialog.setWindowTitle("Изменить категорию")
             layout = QtWidgets.QVBoxLayout(category_dialog)
             
+            # Список берется из общего справочника - без запросов к базе
             category_combo = QtWidgets.QComboBox(category_dialog)
-            categories = db.get_all_categories()
-            for cat in categories:
-                category_combo.addItem(cat[1], cat[0])
-                if cat[0] == current_category_id:
-                    category_combo.setCurrentIndex(category_combo.count() - 1)
+            category_combo.setModel(self.categories.visible_model)
+            category_combo.setCurrentIndex(self.categories.row_for(current_category_id))
             layout.addWidget(category_combo)
             
             buttons = QtWidgets.QDialogButtonBox(
@@ -753,8 +2162,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             if category_dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
                 new_category_id = category_combo.currentData()
                 try:
-                    db.update_transaction_category(transaction_id, new_category_id)
-                    self.load_data()
+                    self.edit_field(transaction_id, 'category_id', current_category_id, new_category_id)
                 except Exception as e:
                     QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось обновить категорию: {str(e)}")
         except Exception as e:
@@ -763,22 +2171,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def edit_amount(self, row):
         """Редактирование суммы транзакции"""
         try:
-            date_item = self.tableWidget.item(row, 0)
-            amount_item = self.tableWidget.item(row, 2)
-            
-            if not date_item or not amount_item:
-                return
-                
-            transaction_id = date_item.data(Qt.ItemDataRole.UserRole)
+            transaction_id = self.transactionModel.transaction_id(row)
             if not transaction_id:
                 return
 
             # Получаем текущую сумму
-            current_amount_str = amount_item.text().replace(" руб.", "").strip()
-            try:
-                current_amount = float(current_amount_str)
-            except ValueError:
-                current_amount = 0.0
+            current_amount = self.transactionModel.amount(row)
 
             # Создаем диалог для редактирования суммы
             amount_dialog = QtWidgets.QDialog(self)
@@ -789,7 +2187,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             # Создаем спиннер для суммы
             amount_spin = QtWidgets.QDoubleSpinBox(amount_dialog)
             amount_spin.setDecimals(2)
-            amount_spin.setSuffix(" руб.")
+            amount_spin.setSuffix(f" {currency.currency_suffix(self.transactionModel.currency(row))}")
             amount_spin.setMinimum(0.00)
             amount_spin.setMaximum(999999999.99)
             amount_spin.setValue(current_amount)
@@ -807,41 +2205,47 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             if amount_dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
                 new_amount = amount_spin.value()
                 try:
-                    # Обновляем сумму в базе данных
-                    self.update_transaction_amount(transaction_id, new_amount)
-                    self.load_data()
+                    self.edit_field(transaction_id, 'amount', current_amount, new_amount)
                 except Exception as e:
                     QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось обновить сумму: {str(e)}")
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка при редактировании суммы: {str(e)}")
 
-    def update_transaction_amount(self, transaction_id: int, new_amount: float):
-        """Обновление суммы транзакции в базе данных"""
-        try:
-            db.update_transaction_amount(transaction_id, new_amount)
-        except Exception as e:
-            raise Exception(f"Ошибка обновления суммы: {str(e)}")
-
     def add_transaction(self):
         """Добавление новой транзакции"""
-        dialog = AddTransactionDialog(self)
+        dialog = AddTransactionDialog(self.categories, self.accounts, self, self.descriptions)
         if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
             data = dialog.get_data()
             try:
+                # Та же операция уже могла быть введена вручную или импортирована
+                if db.count_duplicates(data['amount'], data['category'], data['date'], data['description'],
+                                       data['currency']):
+                    reply = QtWidgets.QMessageBox.question(
+                        self,
+                        "Возможный дубликат",
+                        "Транзакция с такой датой, суммой, категорией и описанием уже есть. Добавить еще одну?",
+                        QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No,
+                        QtWidgets.QMessageBox.StandardButton.No
+                    )
+                    if reply == QtWidgets.QMessageBox.StandardButton.No:
+                        return
                 db.add_transaction(
                     amount=data['amount'],
                     category_id=data['category'],
                     date=data['date'],
                     description=data['description'],
-                    receipt_path=data['receipt_path']
+                    receipt_path=data['receipt_path'],
+                    currency=data['currency'],
+                    account_id=data['account']
                 )
+                self.descriptions.add(data['description'], data['date'])
                 self.load_data()
             except Exception as e:
                 QtWidgets.QMessageBox.critical(self, "Ошибка", f"Не удалось добавить транзакцию: {str(e)}")
 
     def delete_transaction(self):
         """Удаление выбранных транзакций"""
-        selected_rows = self.tableWidget.selectionModel().selectedRows()
+        selected_rows = self.tableView.selectionModel().selectedRows()
         if not selected_rows:
             return
 
@@ -861,7 +2265,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             # Собираем ID всех выбранных транзакций
             transaction_ids = []
             for row_index in sorted([index.row() for index in selected_rows], reverse=True):
-                transaction_id = self.tableWidget.item(row_index, 0).data(Qt.ItemDataRole.UserRole)
+                transaction_id = self.transactionModel.transaction_id(row_index)
                 if transaction_id:
                     transaction_ids.append(transaction_id)
 
@@ -890,30 +2294,50 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         """Обновление данных в таблице"""
         try:
             # Сохраняем текущую выбранную строку
-            current_row = self.tableWidget.currentRow()
+            current_row = self.tableView.currentIndex().row()
             
             # Перезагружаем данные
             self.load_data()
             
             # Восстанавливаем выбранную строку, если она существует
-            if current_row >= 0 and current_row < self.tableWidget.rowCount():
-                self.tableWidget.selectRow(current_row)
+            if current_row >= 0 and current_row < self.transactionModel.rowCount():
+                self.tableView.selectRow(current_row)
                 
-            # Показываем уведомление об успешном обновлении
-            QtWidgets.QMessageBox.information(self, "Обновление", "Данные успешно обновлены")
+            # Показываем уведомление об успешном обновлении в строке состояния
+            self.statusbar.showMessage("Данные успешно обновлены", 3000)
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "Ошибка", f"Ошибка при обновлении данных: {str(e)}")
 
     def closeEvent(self, event):
         """Обработка закрытия окна"""
+        self.edit_session.flush()
+        self.maintenanceTimer.stop()
+        self.change_watcher.stop()
+        self.chartsPanel.renderer.shutdown()
+        self.descriptions.shutdown()
+        self.transaction_loader.shutdown()
+        if self.backup_scheduler is not None:
+            self.backup_scheduler.shutdown()
+        self.save_startup_snapshot()
         db.close_connection()
         event.accept()
 
+    def save_startup_snapshot(self):
+        """Сохранение первого экрана для следующего запуска"""
+        path = startup_snapshot.snapshot_path()
+        stamp, stats = self.statistics
+        if path is None or not stamp:
+            return
+        try:
+            startup_snapshot.save_snapshot(path, stamp, self.categories.categories(), stats)
+        except Exception as e:
+            print(f"Ошибка сохранения снимка: {str(e)}")
+
     def add_receipt(self, row):
         """Добавление чека к транзакции"""
         try:
             # Получаем ID транзакции
-            transaction_id = self.tableWidget.item(row, 0).data(Qt.ItemDataRole.UserRole)
+            transaction_id = self.transactionModel.transaction_id(row)
             if not transaction_id:
                 return
 
@@ -927,10 +2351,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 if selected_files:
                     receipt_path = selected_files[0]
                     
-                    # Обновляем путь к чеку в базе данных
+                    # Путь к чеку записывается вместе с остальными правками
                     try:
-                        db.update_transaction_receipt(transaction_id, receipt_path)
-                        self.load_data()
+                        self.edit_field(transaction_id, 'receipt_path',
+                                        self.transactionModel.receipt_path(row, existing_only=False), receipt_path)
                         QtWidgets.QMessageBox.information(
                             self,
                             "Чек добавлен",
@@ -947,7 +2371,19 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
 
 if __name__ == "__main__":
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Учет личных финансов")
+    parser.add_argument("--server", default=os.environ.get("FINANCE_SERVER"),
+                        help="Адрес сервера API (python cli.py serve) вместо локального finance.db")
+    parser.add_argument("--token", default=os.environ.get("FINANCE_SERVER_TOKEN"),
+                        help="Ключ доступа к серверу API")
+    args, qt_args = parser.parse_known_args()
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    if args.server:
+        try:
+            api_client.install(args.server, args.token)
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(None, "Ошибка", f"Сервер API недоступен: {str(e)}")
+            sys.exit(1)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,50 @@
+# maintenance.py - Обслуживание файла базы: постепенное освобождение страниц и отчеты о размере
+
+from typing import Dict
+import database as db
+
+# Свободных страниц меньше этого числа не стоят отдельной записи на диск
+MIN_FREE_PAGES = 64
+# Сколько страниц освобождать за один шаг, чтобы не задерживать интерфейс
+STEP_PAGES = 256
+
+
+def format_size(size: int) -> str:
+    """Размер в байтах в удобных единицах"""
+    for unit in ("байт", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "байт" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def format_storage_stats(stats: Dict[str, object]) -> str:
+    """Строка отчета о размере и фрагментации базы"""
+    page_count = stats['page_count'] or 1
+    free_share = stats['freelist_count'] / page_count * 100
+    text = (f"{format_size(stats['file_size'])}, свободных страниц {stats['freelist_count']} "
+            f"({free_share:.1f}%)")
+    unused = stats.get('unused_bytes')
+    if unused is not None:
+        text += f", незаполнено в страницах {unused / (page_count * stats['page_size']) * 100:.1f}%"
+    return text
+
+
+def format_vacuum_report(before: Dict[str, object], after: Dict[str, object]) -> str:
+    """Отчет о сжатии базы: состояние до и после"""
+    return (f"До: {format_storage_stats(before)}\n"
+            f"После: {format_storage_stats(after)}\n"
+            f"Освобождено: {format_size(max(before['file_size'] - after['file_size'], 0))}")
+
+
+def vacuum_step(max_pages: int = STEP_PAGES) -> int:
+    """Один небольшой шаг освобождения страниц (для вызова в простое).
+
+    Проверка - несколько PRAGMA без чтения данных; страницы освобождаются, только если база в
+    режиме инкрементального сжатия и их накопилось не меньше MIN_FREE_PAGES.
+    Возвращает количество освобожденных страниц.
+    """
+    stats = db.get_storage_stats()
+    if stats['auto_vacuum'] != 2 or stats['freelist_count'] < MIN_FREE_PAGES:
+        return 0
+    return db.incremental_vacuum(max_pages)
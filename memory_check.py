@@ -0,0 +1,285 @@
+# memory_check.py - Потребление памяти главного окна на синтетических базах разного объема
+#
+# Запуск: python memory_check.py [--rows 10000 50000 100000] [--top 5] [--json memory.json]
+# Для каждого объема создается база (как в query_check.py), и под tracemalloc
+# выполняются пути главного окна: запуск окна, load_data, update_statistics и
+# export_to_excel. По каждому шагу записываются пик и оставшийся после него
+# прирост памяти с разбивкой по строкам исходного кода. Код возврата 1, если
+# какой-либо шаг превышает бюджет BUDGETS.
+#
+# tracemalloc видит только выделения Python-объектов: память Qt и SQLite (C++ и C)
+# в отчет не попадает. Импорт pandas и openpyxl выполняется до измерений - это
+# постоянная добавка, не зависящая от объема данных.
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+from typing import Callable, List, Optional, Tuple
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6 import QtWidgets
+import database as db
+import main as app_main
+import query_check
+
+# Бюджеты шагов: (постоянная часть, байт на транзакцию) для пика и для
+# оставшейся после шага памяти, примерно вдвое выше измеренного. Пик включает
+# временные объекты шага; load_data заменяет прежнее хранилище, поэтому
+# после него память почти не растет. Статистика считается в SQL и от объема
+# не зависит, экспорт в Excel держит все строки сразу в нескольких видах.
+BUDGETS = {
+    'window': ((8 << 20, 300), (4 << 20, 120)),
+    'load_data': ((4 << 20, 200), (1 << 20, 10)),
+    'update_statistics': ((2 << 20, 5), (1 << 20, 1)),
+    'export_to_excel': ((16 << 20, 5000), (4 << 20, 10)),
+}
+
+PHASE_TITLES = {
+    'window': "Запуск окна",
+    'load_data': "load_data",
+    'update_statistics': "update_statistics",
+    'export_to_excel': "export_to_excel",
+}
+
+# Строки с приростом меньше этого в разбивку не попадают
+MIN_LINE_SIZE = 64 << 10
+# Снимок для разбивки пика делается, когда память выросла во столько раз с
+# предыдущего снимка: последний снимок содержит не меньше 80% пика, а все
+# снимки вместе стоят не больше нескольких последних
+SNAPSHOT_GROWTH = 1.25
+
+# Строки самого профилировщика в разбивку не попадают
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+]
+
+
+class PeakSampler(threading.Thread):
+    """Снимок tracemalloc в момент, близкий к пику шага.
+
+    tracemalloc сообщает только величину пика, но не то, из чего он состоит:
+    поток каждые interval секунд проверяет объем отслеживаемой памяти и делает
+    снимок, когда он заметно превышает предыдущий максимум. Снимок, сделанный
+    при наибольшем объеме, показывает, какие строки держали память на пике.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self._best = tracemalloc.get_traced_memory()[0]
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            current = tracemalloc.get_traced_memory()[0]
+            if current > max(self._best * SNAPSHOT_GROWTH, self._best + (1 << 20)):
+                self.snapshot = tracemalloc.take_snapshot()
+                self._best = tracemalloc.get_traced_memory()[0]
+
+    def stop(self) -> Optional[tracemalloc.Snapshot]:
+        self._stopped.set()
+        self.join()
+        return self.snapshot
+
+
+def _top_lines(snapshot: Optional[tracemalloc.Snapshot], before: tracemalloc.Snapshot,
+               top: int) -> List[Tuple[str, int]]:
+    """Строки кода с наибольшим приростом памяти относительно снимка before"""
+    if snapshot is None:
+        return []
+    stats = snapshot.filter_traces(_FILTERS).compare_to(before.filter_traces(_FILTERS), 'lineno')
+    result = []
+    for stat in stats[:top]:
+        if stat.size_diff < MIN_LINE_SIZE:
+            break
+        frame = stat.traceback[0]
+        result.append((f"{_short_path(frame.filename)}:{frame.lineno}", stat.size_diff))
+    return result
+
+
+def _short_path(filename: str) -> str:
+    """Путь относительно проекта или каталога установленных пакетов"""
+    project = os.path.dirname(os.path.abspath(__file__))
+    if filename.startswith(project + os.sep):
+        return os.path.relpath(filename, project)
+    parts = filename.split(os.sep)
+    for marker in ("site-packages", "lib"):
+        if marker in parts:
+            # Часть пути после последнего вхождения marker
+            return os.sep.join(parts[len(parts) - parts[::-1].index(marker):])
+    return filename
+
+
+def _excel_available() -> bool:
+    """Импорт зависимостей экспорта в Excel заранее, вне измерений"""
+    try:
+        import pandas
+        import openpyxl
+        return True
+    except ImportError:
+        return False
+
+
+def measure(name: str, func: Callable, top: int) -> dict:
+    """Пик и оставшаяся память одного шага с разбивкой по строкам кода"""
+    gc.collect()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    start = tracemalloc.get_traced_memory()[0]
+    sampler = PeakSampler()
+    sampler.start()
+    try:
+        func()
+    finally:
+        peak_snapshot = sampler.stop()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    # Снимок в конце шага - на случай, если пик пришелся на самый конец
+    end_snapshot = tracemalloc.take_snapshot()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - start
+    after = tracemalloc.take_snapshot()
+    return {
+        'phase': name,
+        'peak': peak,
+        'retained': retained,
+        'peak_lines': _top_lines(peak_snapshot or end_snapshot, before, top),
+        'retained_lines': _top_lines(after, before, top),
+    }
+
+
+def run_window_phases(rows: int, directory: str, top: int, excel: bool) -> List[dict]:
+    """Шаги главного окна на базе directory/finance.db"""
+    results = []
+    errors = []
+    window = None
+
+    def create_window():
+        nonlocal window
+        window = app_main.MainWindow()
+
+    def export():
+        path = os.path.join(directory, "export.xlsx")
+        with mock.patch.object(QtWidgets.QFileDialog, "getSaveFileName", return_value=(path, "")), \
+                mock.patch.object(QtWidgets.QMessageBox, "information"), \
+                mock.patch.object(QtWidgets.QMessageBox, "critical",
+                                  side_effect=lambda parent, title, text: errors.append(text)):
+            window.export_to_excel()
+
+    phases = [('window', create_window), ('load_data', lambda: window.load_data()),
+              ('update_statistics', lambda: window.update_statistics())]
+    if excel:
+        phases.append(('export_to_excel', export))
+    try:
+        for name, func in phases:
+            result = measure(name, func, top)
+            result['rows'] = rows
+            if name == 'export_to_excel' and errors:
+                result['error'] = errors[-1]
+            results.append(result)
+    finally:
+        if window is not None:
+            window.close()
+    return results
+
+
+def check_budget(result: dict) -> List[str]:
+    """Нарушения бюджета шага"""
+    (peak_base, peak_per_row), (retained_base, retained_per_row) = BUDGETS[result['phase']]
+    errors = []
+    title = f"{PHASE_TITLES[result['phase']]}, {result['rows']} транзакций"
+    if 'error' in result:
+        errors.append(f"{title}: {result['error']}")
+    peak_budget = peak_base + peak_per_row * result['rows']
+    if result['peak'] > peak_budget:
+        errors.append(f"{title}: пик {_mb(result['peak'])}, бюджет {_mb(peak_budget)}")
+    retained_budget = retained_base + retained_per_row * result['rows']
+    if result['retained'] > retained_budget:
+        errors.append(f"{title}: осталось {_mb(result['retained'])}, бюджет {_mb(retained_budget)}")
+    return errors
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1 << 20):.1f} МБ"
+
+
+def print_report(results: List[dict], verbose: bool) -> None:
+    """Таблица пиков и оставшейся памяти по объемам и разбивка по строкам кода"""
+    sizes = sorted({result['rows'] for result in results})
+    print(f"{'Шаг':20} {'транзакций':>10} {'пик':>10} {'осталось':>10} {'пик, Б/строку':>14}")
+    for phase in BUDGETS:
+        for result in (item for item in results if item['phase'] == phase):
+            print(f"{PHASE_TITLES[phase]:20} {result['rows']:10} {_mb(result['peak']):>10} "
+                  f"{_mb(result['retained']):>10} {result['peak'] / result['rows']:14.0f}")
+    # Прирост пика на транзакцию между крайними объемами - без постоянной части шага
+    if len(sizes) > 1:
+        print("Рост пика на транзакцию между наименьшим и наибольшим объемом:")
+        for phase in BUDGETS:
+            by_size = {item['rows']: item['peak'] for item in results if item['phase'] == phase}
+            if sizes[0] in by_size and sizes[-1] in by_size and by_size[sizes[0]] > 0:
+                slope = (by_size[sizes[-1]] - by_size[sizes[0]]) / (sizes[-1] - sizes[0])
+                print(f"  {PHASE_TITLES[phase]:20} {slope:8.0f} Б на транзакцию")
+    for result in results:
+        if not verbose and result['rows'] != sizes[-1]:
+            continue
+        print(f"{PHASE_TITLES[result['phase']]}, {result['rows']} транзакций:")
+        for label, lines in (("пик", result['peak_lines']), ("осталось", result['retained_lines'])):
+            for location, size in lines:
+                print(f"  {label:8} {_mb(size):>10}  {location}")
+        if not result['peak_lines'] and not result['retained_lines']:
+            print(f"  нет строк с приростом больше {MIN_LINE_SIZE >> 10} КБ")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Память главного окна на синтетических базах")
+    parser.add_argument("--rows", type=int, nargs="+", default=[5000, 20000, 50000],
+                        help="Объемы синтетических баз")
+    parser.add_argument("--top", type=int, default=5, help="Строк кода в разбивке каждого шага")
+    parser.add_argument("--frames", type=int, default=1, help="Глубина стека, сохраняемая tracemalloc")
+    parser.add_argument("--verbose", action="store_true", help="Разбивка по строкам для всех объемов")
+    parser.add_argument("--json", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    excel = _excel_available()
+    if not excel:
+        print("pandas или openpyxl не установлены: export_to_excel не проверяется")
+    results = []
+    cwd = os.getcwd()
+    for rows in sorted(args.rows):
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"Создание базы из {rows} транзакций...")
+            query_check.build_database(os.path.join(directory, "finance.db"), rows)
+            db.close_connection()
+            # Главное окно открывает finance.db в текущем каталоге
+            os.chdir(directory)
+            tracemalloc.start(args.frames)
+            try:
+                results.extend(run_window_phases(rows, directory, args.top, excel))
+            finally:
+                tracemalloc.stop()
+                os.chdir(cwd)
+                app.processEvents()
+    print_report(results, args.verbose)
+
+    errors = [error for result in results for error in check_budget(result)]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=1)
+    for error in errors:
+        print(error)
+    print("Все шаги укладываются в бюджеты памяти" if not errors else f"Нарушений: {len(errors)}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,442 @@
+# models.py - Модели данных Qt для представлений главного окна
+
+import os
+from array import array
+from typing import Dict, List, Optional, Tuple
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtCore import Qt
+from transaction_store import TransactionFilter, TransactionStore
+from currency import currency_suffix
+
+
+class StatisticsModel(QtCore.QAbstractTableModel):
+    """Модель таблицы статистики: строки - годы, столбцы - год и 12 месяцев"""
+
+    HEADERS = ["Год"] + [f"{i:02d}" for i in range(1, 13)]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._years: List[int] = []
+        self._totals: Dict[int, List[Optional[float]]] = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._years)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        year = self._years[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(year)
+            total = self._totals[year][column - 1]
+            return f"{total or 0:.2f} {currency_suffix(None)}"
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if column == 0:
+                return Qt.AlignmentFlag.AlignCenter
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.UserRole:
+            return self.cell_period(index)
+        return None
+
+    def cell_period(self, index) -> Optional[Tuple[int, int]]:
+        """Год и месяц ячейки; None для столбца года"""
+        if not index.isValid() or index.column() == 0:
+            return None
+        return self._years[index.row()], index.column()
+
+    def update_data(self, stats: List[Tuple[int, int, float]]) -> None:
+        """Обновление агрегатов; изменившиеся ячейки обновляются на месте"""
+        totals: Dict[int, List[Optional[float]]] = {}
+        for year, month, total in stats:
+            if year is None or month is None:
+                continue
+            totals.setdefault(year, [None] * 12)[month - 1] = total
+        years = sorted(totals, reverse=True)
+
+        if years != self._years:
+            # Набор лет изменился - перестраиваем модель целиком
+            self.beginResetModel()
+            self._years = years
+            self._totals = totals
+            self.endResetModel()
+            return
+
+        # Набор лет прежний - сообщаем только об изменившихся ячейках
+        for row, year in enumerate(years):
+            old_row = self._totals[year]
+            new_row = totals[year]
+            changed = [month for month in range(12) if old_row[month] != new_row[month]]
+            self._totals[year] = new_row
+            if changed:
+                self.dataChanged.emit(
+                    self.index(row, changed[0] + 1),
+                    self.index(row, changed[-1] + 1),
+                    [Qt.ItemDataRole.DisplayRole]
+                )
+
+
+class BudgetModel(QtCore.QAbstractTableModel):
+    """Модель панели бюджетов: расходы категорий за период и остаток лимита"""
+
+    HEADERS = ["Категория", "Лимит", "Потрачено", "Осталось"]
+    PERIOD_NAMES = {'month': "месяц", 'year': "год"}
+    # Доля лимита, после которой строка подсвечивается как близкая к превышению
+    WARNING_SHARE = 0.9
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # (категория, название, период или None, лимит или None, потрачено)
+        self._rows: List[Tuple] = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        _, name, period, limit, spent = self._rows[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return f"{name} ({self.PERIOD_NAMES[period]})" if period else name
+            if column == 1:
+                return format_amount(limit) if limit is not None else ""
+            if column == 2:
+                return format_amount(spent)
+            return format_amount(limit - spent) if limit is not None else ""
+        if role == Qt.ItemDataRole.TextAlignmentRole and column > 0:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.BackgroundRole and limit is not None:
+            if spent > limit:
+                return QtGui.QBrush(QtGui.QColor("#f4c7c3"))
+            if spent >= limit * self.WARNING_SHARE:
+                return QtGui.QBrush(QtGui.QColor("#fce8b2"))
+        if role == Qt.ItemDataRole.ForegroundRole and column == 3 and limit is not None and spent > limit:
+            return QtGui.QBrush(QtGui.QColor("red"))
+        return None
+
+    def row_budget(self, row: int) -> Tuple[int, Optional[str], Optional[float]]:
+        """Категория, период и лимит строки"""
+        category_id, _, period, limit, _ = self._rows[row]
+        return category_id, period, limit
+
+    def over_limit_count(self) -> int:
+        return sum(1 for _, _, _, limit, spent in self._rows if limit is not None and spent > limit)
+
+    def update_data(self, status: List[Tuple]) -> None:
+        status = [tuple(row) for row in status]
+        keys = [row[:3] for row in status]
+        if keys != [row[:3] for row in self._rows]:
+            # Изменился набор бюджетов или категорий - перестраиваем модель целиком
+            self.beginResetModel()
+            self._rows = status
+            self.endResetModel()
+            return
+
+        # Строки прежние - сообщаем только об изменившихся суммах
+        for row, values in enumerate(status):
+            if values != self._rows[row]:
+                self._rows[row] = values
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+
+def format_amount(amount, currency: Optional[str] = None) -> str:
+    """Форматирование суммы в нужный формат (по умолчанию в базовой валюте)"""
+    suffix = currency_suffix(currency)
+    try:
+        if amount is None:
+            return f"0.00 {suffix}"
+        amount_float = float(amount)
+        # Форматируем число с двумя знаками после запятой
+        formatted = f"{amount_float:,.2f}".replace(',', ' ')
+        return f"{formatted} {suffix}"
+    except (ValueError, TypeError):
+        return f"0.00 {suffix}"
+
+
+class TransactionTableModel(QtCore.QAbstractTableModel):
+    """Модель таблицы транзакций поверх колоночного хранилища TransactionStore"""
+
+    HEADERS = ["Дата", "Категория", "Сумма", "Описание", "Чек"]
+    DATE_COLUMN, CATEGORY_COLUMN, AMOUNT_COLUMN, DESCRIPTION_COLUMN, RECEIPT_COLUMN = range(5)
+
+    # Описание изменено пользователем в таблице: (id транзакции, прежний текст, новый текст)
+    descriptionEdited = QtCore.pyqtSignal(int, str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._store = TransactionStore()
+        self._rows = array('i')
+        self._category_names: Dict[int, str] = {}
+        self._filter = TransactionFilter()
+        self._sort_column = self.DATE_COLUMN
+        self._sort_order = Qt.SortOrder.DescendingOrder
+        self._sort_keys: Dict[int, array] = {}
+        self._sort_keys_version = -1
+        self._receipt_exists: Dict[str, bool] = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return self.HEADERS[section]
+            if role == Qt.ItemDataRole.TextAlignmentRole:
+                return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.DESCRIPTION_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        pos = self._rows[index.row()]
+        column = index.column()
+
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            if column == self.DATE_COLUMN:
+                return self._store.date(pos)
+            if column == self.CATEGORY_COLUMN:
+                return self._category_names.get(self._store.category_ids[pos], "")
+            if column == self.AMOUNT_COLUMN:
+                return format_amount(self._store.amount(pos), self._store.currency(pos))
+            if column == self.DESCRIPTION_COLUMN:
+                return self._store.description(pos)
+            return "Просмотреть чек" if self._has_receipt(pos) else "Нет"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            # Полный текст описания, сокращенного в таблице
+            if column == self.DESCRIPTION_COLUMN:
+                return self._store.description(pos) or None
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            if column == self.DATE_COLUMN:
+                return self._store.ids[pos]
+            if column == self.CATEGORY_COLUMN:
+                return self._store.category_ids[pos]
+            if column == self.RECEIPT_COLUMN and self._has_receipt(pos):
+                return self._store.receipt_path(pos)
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if column == self.AMOUNT_COLUMN:
+                return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            if column == self.DESCRIPTION_COLUMN:
+                return Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+            return Qt.AlignmentFlag.AlignCenter
+        if column == self.RECEIPT_COLUMN and self._has_receipt(pos):
+            # Ссылка на чек выделяется синим подчеркнутым текстом
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return QtGui.QBrush(QtGui.QColor("blue"))
+            if role == Qt.ItemDataRole.FontRole:
+                font = QtGui.QFont()
+                font.setUnderline(True)
+                return font
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        if index.column() != self.DESCRIPTION_COLUMN:
+            return False
+        pos = self._rows[index.row()]
+        new_description = str(value) if value else ""
+        old_description = self._store.description(pos)
+        if new_description == old_description:
+            return False
+        self._store.set_description(pos, new_description)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+        self.descriptionEdited.emit(self._store.ids[pos], old_description, new_description)
+        return True
+
+    def set_field(self, transaction_id: int, field: str, value) -> bool:
+        """Изменение поля загруженной транзакции без обращения к базе.
+
+        Поле называется как столбец базы. Возвращает False, если транзакция
+        не загружена.
+        """
+        pos = self._store.position(transaction_id)
+        if pos < 0:
+            return False
+        if field == 'description':
+            self._store.set_description(pos, value)
+            if pos in self._rows:
+                row = self._rows.index(pos)
+                index = self.index(row, self.DESCRIPTION_COLUMN)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+            return True
+        setters = {
+            'date': self._store.set_date,
+            'amount': self._store.set_amount,
+            'category_id': self._store.set_category,
+            'receipt_path': self._store.set_receipt,
+        }
+        if field not in setters:
+            return False
+        # Дата, сумма и категория влияют на фильтр и порядок строк
+        self.beginResetModel()
+        setters[field](pos, value)
+        if field == 'receipt_path' and value:
+            self._receipt_exists.pop(value, None)
+        self._rows = self._visible_rows()
+        self.endResetModel()
+        return True
+
+    def _has_receipt(self, pos: int) -> bool:
+        """Есть ли у транзакции чек, доступный на диске"""
+        receipt_path = self._store.receipt_path(pos)
+        if not receipt_path:
+            return False
+        exists = self._receipt_exists.get(receipt_path)
+        if exists is None:
+            exists = os.path.exists(receipt_path)
+            self._receipt_exists[receipt_path] = exists
+        return exists
+
+    def set_data(self, store: TransactionStore, categories: List[Tuple],
+                 flt: Optional[TransactionFilter] = None) -> None:
+        """Замена хранилища, справочника категорий и, при необходимости, фильтра"""
+        self.beginResetModel()
+        self._store = store
+        if flt is not None:
+            self._filter = flt
+        self._category_names = {cat[0]: cat[1] for cat in categories}
+        self._sort_keys = {}
+        self._receipt_exists = {}
+        self._rows = self._visible_rows()
+        self.endResetModel()
+
+    def set_categories(self, categories: List[Tuple]) -> None:
+        """Обновление справочника названий категорий"""
+        self._category_names = {cat[0]: cat[1] for cat in categories}
+        self._sort_keys.pop(self.CATEGORY_COLUMN, None)
+        if self._rows:
+            self.dataChanged.emit(
+                self.index(0, self.CATEGORY_COLUMN),
+                self.index(len(self._rows) - 1, self.CATEGORY_COLUMN),
+                [Qt.ItemDataRole.DisplayRole]
+            )
+
+    def has_transaction(self, transaction_id: int) -> bool:
+        """Загружена ли транзакция в хранилище модели"""
+        return self._store.position(transaction_id) >= 0
+
+    def apply_changes(self, rows: List[Tuple], deleted_ids: List[int]) -> None:
+        """Применение изменившихся и удаленных транзакций без перечитывания базы"""
+        self.beginResetModel()
+        self._store.remove(deleted_ids)
+        for row in rows:
+            self._store.upsert(row)
+            if row[5]:
+                self._receipt_exists.pop(row[5], None)
+        self._rows = self._visible_rows()
+        self.endResetModel()
+
+    def set_filter(self, flt: TransactionFilter) -> None:
+        """Применение фильтра к загруженным транзакциям"""
+        if flt == self._filter:
+            return
+        self.beginResetModel()
+        self._filter = flt
+        self._rows = self._visible_rows()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Сортировка по предвычисленным числовым ключам колонки"""
+        if column < 0:
+            column, order = self.DATE_COLUMN, Qt.SortOrder.DescendingOrder
+        self.beginResetModel()
+        self._sort_column = column
+        self._sort_order = order
+        self._rows = self._visible_rows()
+        self.endResetModel()
+
+    def _sort_key(self, column: int) -> array:
+        """Числовой ключ сортировки колонки; строится один раз на версию хранилища"""
+        store = self._store
+        if self._sort_keys_version != store.version:
+            self._sort_keys = {}
+            self._sort_keys_version = store.version
+        keys = self._sort_keys.get(column)
+        if keys is not None:
+            return keys
+
+        if column == self.DATE_COLUMN:
+            keys = store.dates
+        elif column == self.AMOUNT_COLUMN:
+            keys = store.amounts
+        elif column == self.CATEGORY_COLUMN:
+            # Ранг названия категории вместо сравнения строк
+            names = sorted(self._category_names, key=lambda cat_id: self._category_names[cat_id].casefold())
+            ranks = {cat_id: rank for rank, cat_id in enumerate(names)}
+            missing = len(ranks)
+            keys = array('i', [ranks.get(cat_id, missing) for cat_id in store.category_ids])
+        elif column == self.DESCRIPTION_COLUMN:
+            keys = store.description_ranks()
+        else:
+            keys = store.receipt_flags()
+        self._sort_keys[column] = keys
+        return keys
+
+    def _visible_rows(self) -> array:
+        """Видимые позиции хранилища с учетом фильтра и сортировки"""
+        store = self._store
+        positions = store.filter_positions(self._filter)
+        positions.reverse()
+        # Базовый порядок - по дате от новых к старым, при равных датах - по убыванию ID
+        rows = store.sorted_positions(store.dates, descending=True, positions=positions)
+        descending = self._sort_order == Qt.SortOrder.DescendingOrder
+        if self._sort_column == self.DATE_COLUMN:
+            if not descending:
+                rows.reverse()
+            return rows
+        # Сортировка устойчива: при равных ключах сохраняется порядок по дате
+        return array('i', sorted(rows, key=self._sort_key(self._sort_column).__getitem__, reverse=descending))
+
+    def transaction_id(self, row: int) -> int:
+        return self._store.ids[self._rows[row]]
+
+    def category_id(self, row: int) -> int:
+        return self._store.category_ids[self._rows[row]]
+
+    def date(self, row: int) -> str:
+        return self._store.date(self._rows[row])
+
+    def amount(self, row: int) -> float:
+        return self._store.amount(self._rows[row])
+
+    def currency(self, row: int) -> str:
+        return self._store.currency(self._rows[row])
+
+    def receipt_path(self, row: int, existing_only: bool = True) -> Optional[str]:
+        """Путь к чеку строки; при existing_only - только если файл есть на диске"""
+        pos = self._rows[row]
+        if existing_only and not self._has_receipt(pos):
+            return None
+        return self._store.receipt_path(pos)
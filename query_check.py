@@ -0,0 +1,270 @@
+# query_check.py - Проверка планов и времени запросов database.py на синтетической базе
+#
+# Запуск: python query_check.py [--rows 200000] [--verbose]
+# Код возврата 1, если какой-либо запрос полностью сканирует таблицу там, где
+# должен работать по индексу, не укладывается в бюджет времени или правка
+# архивной транзакции не меняет отметку состояния данных.
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, List, Tuple
+import database as db
+from reports import ReportQuery, ReportService
+
+# Таблицы-справочники, полное сканирование которых допустимо всегда
+SMALL_TABLES = {'categories', 'c', 'recurring_rules', 'archives'}
+
+# Валюты части синтетических транзакций (каждой десятой)
+CURRENCIES = ["USD", "EUR"]
+
+DESCRIPTIONS = ["Продукты в магазине", "Такси", "Кофе", "Аптека", "Кино", "Коммунальные услуги",
+                "Обед", "Бензин", "Книги", "Подарок", ""]
+
+
+def build_database(path: str, rows: int, seed: int = 1) -> None:
+    """Создание базы с rows случайными транзакциями за пять лет"""
+    db.initialize(path)
+    random.seed(seed)
+    category_ids = [cat[0] for cat in db.get_all_categories()]
+    card_id = db.add_account("Карта")
+    first_day = date.today() - timedelta(days=5 * 365)
+
+    def generate():
+        for number in range(rows):
+            day = first_day + timedelta(days=random.randrange(5 * 365))
+            yield (round(random.uniform(10, 5000), 2),
+                   random.choice(category_ids),
+                   day.isoformat(),
+                   f"{random.choice(DESCRIPTIONS)} {number % 97}",
+                   f"receipts/{number}.jpg" if number % 20 == 0 else None,
+                   CURRENCIES[number % len(CURRENCIES)] if number % 10 == 0 else db.BASE_CURRENCY,
+                   card_id if number % 3 == 0 else db.DEFAULT_ACCOUNT_ID)
+
+    db.add_transactions_bulk(generate())
+    # Курсы на каждый рабочий день, чтобы пересчет валют шел через поиск "на дату"
+    db.add_fx_rates(
+        (code, (first_day + timedelta(days=offset)).isoformat(), 50 + offset % 50)
+        for code in CURRENCIES for offset in range(5 * 365) if offset % 7 < 5
+    )
+    # Лимиты на месяц и год: состояние бюджетов читает итоги за оба периода
+    db.set_budget(category_ids[0], 10000)
+    db.set_budget(category_ids[1], 100000, 'year')
+    db.analyze()
+
+
+def _plan(statement: str) -> List[str]:
+    """Строки EXPLAIN QUERY PLAN для выполненного запроса"""
+    cursor = db._connection.execute(f"EXPLAIN QUERY PLAN {statement}")
+    return [row[3] for row in cursor.fetchall()]
+
+
+def _full_scans(plan: List[str], allowed: set) -> List[str]:
+    """Шаги плана, которые читают таблицу целиком.
+
+    Чтение промежуточных результатов (подзапросов, CTE) сканированием таблицы
+    не считается: их размер уже ограничен шагами, которые их построили.
+    """
+    intermediate = set()
+    for detail in plan:
+        match = re.match(r"(?:MATERIALIZE|CO-ROUTINE) (\S+)", detail)
+        if match:
+            intermediate.add(match.group(1))
+    result = []
+    for detail in plan:
+        match = re.match(r"SCAN (\S+)", detail)
+        if not match:
+            continue
+        name = match.group(1)
+        if name in SMALL_TABLES | allowed | intermediate or name.startswith("(") or name == "CONSTANT":
+            continue
+        result.append(detail)
+    return result
+
+
+def run_check(name: str, func: Callable, allowed_scans: set, budget_ms: float, scaled: bool,
+              rows: int, verbose: bool = False) -> List[str]:
+    """Выполнение одной функции с записью ее запросов и проверкой планов и времени.
+
+    budget_ms задан на 100 000 транзакций; для запросов, время которых по
+    природе растет с объемом (scaled), бюджет увеличивается пропорционально
+    числу строк, остальные должны укладываться в него при любом объеме.
+    """
+    statements = []
+    db._connection.set_trace_callback(statements.append)
+    try:
+        start = time.perf_counter()
+        result = func()
+        if hasattr(result, 'fetchall'):
+            result.fetchall()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    finally:
+        db._connection.set_trace_callback(None)
+
+    errors = []
+    # Повторные выполнения одного запроса проверяются один раз
+    for statement in dict.fromkeys(statements):
+        # Служебные команды и строки, выполненные триггерами, не проверяются
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", statement, re.IGNORECASE):
+            continue
+        plan = _plan(statement)
+        if verbose:
+            print(f"  {' '.join(statement.split())[:100]}")
+            for detail in plan:
+                print(f"    {detail}")
+        for detail in _full_scans(plan, allowed_scans):
+            errors.append(f"{name}: полное сканирование '{detail}'")
+
+    budget = budget_ms * max(rows / 100000, 1) if scaled else budget_ms
+    if elapsed_ms > budget:
+        errors.append(f"{name}: {elapsed_ms:.1f} мс, бюджет {budget:.1f} мс")
+    print(f"{'ОШИБКА' if errors else 'OK':6} {name}: {elapsed_ms:.1f} мс")
+    return errors
+
+
+def build_checks(rows: int) -> List[Tuple[str, Callable, set, float, bool]]:
+    """Проверяемые функции: (название, вызов, допустимые сканирования, бюджет в мс, масштабируется ли бюджет)"""
+    today = date.today()
+    month_start, month_end = db.get_month_range(today.year, today.month)
+    year_start = f"{today.year - 1:04d}-01-01"
+    year_end = f"{today.year:04d}-01-01"
+    category_id, other_id = [cat[0] for cat in db.get_all_categories()[:2]]
+    some_id = rows // 2
+    ids = list(range(1, rows, max(rows // 1000, 1)))
+    seq = db.get_last_change_seq()
+
+    return [
+        # Горячие пути: выборки и изменения только по индексам
+        ("Транзакции за месяц", lambda: db.get_transactions_for_period(month_start, month_end), set(), 50, False),
+        ("Фильтр по периоду", lambda: db.iter_transactions(month_start, month_end), set(), 50, False),
+        ("Фильтр по категории за год",
+         lambda: db.iter_transactions(year_start, year_end, [category_id]), set(), 100, False),
+        ("Разбивка месяца по категориям",
+         lambda: db.get_category_breakdown(month_start, month_end), set(), 50, False),
+        ("Отчет по категориям за месяц",
+         lambda: db.get_report(month_start, month_end, group_by='category'), set(), 50, False),
+        ("Отчет по категории за год",
+         lambda: db.get_report(year_start, year_end, [category_id], 'month', 'average'), set(), 50, False),
+        ("Транзакции по списку ID", lambda: db.get_transactions_by_ids(ids), set(), 50, False),
+        ("Журнал изменений", lambda: db.get_changes_since(seq), set(), 20, False),
+        ("Поиск дубликата", lambda: db.count_duplicates(100, category_id, month_start, "Кофе"), set(), 5, False),
+        ("Годы для архива", db.get_archivable_years, set(), 20, False),
+        ("Изменение суммы", lambda: db.update_transaction_amount(some_id, 123.45), set(), 20, False),
+        ("Изменение описания", lambda: db.update_transaction_description(some_id, "Проверка"), set(), 20, False),
+        ("Изменение даты", lambda: db.update_transaction_date(some_id, month_start), set(), 20, False),
+        ("Изменение категории", lambda: db.update_transaction_category(some_id, category_id), set(), 20, False),
+        ("Удаление транзакции", lambda: db.delete_transaction(some_id + 1), set(), 20, False),
+        ("Запись пачки правок", lambda: db.apply_transaction_edits([
+            (some_id, 'amount', 123.45, 99.0),
+            (some_id, 'description', "Проверка", "Пачка правок"),
+            (some_id + 2, 'date', year_start, month_start),
+        ]), set(), 20, False),
+        ("Отмена правки", db.undo_edit, set(), 20, False),
+        ("Повтор правки", db.redo_edit, set(), 20, False),
+        ("Название категории", lambda: db.get_category_name(category_id), set(), 5, False),
+        ("Состояние бюджетов", db.get_budget_status, set(), 5, False),
+        ("Признаки описания для категории",
+         lambda: db.get_category_token_counts(db.description_tokens("Продукты в магазине 12")), set(), 5, False),
+        # Первый расчет остатка строит контрольные точки, следующие берут ближайшую из них
+        ("Остаток на дату (контрольные точки)",
+         lambda: db.get_balance(db.DEFAULT_ACCOUNT_ID, month_start), set(), 300, True),
+        ("Остаток на дату", lambda: db.get_balance(db.DEFAULT_ACCOUNT_ID, year_start), set(), 20, False),
+        ("Выписка по счету за месяц",
+         lambda: db.get_account_ledger(month_start, month_end, db.DEFAULT_ACCOUNT_ID), set(), 50, False),
+        # Чтение индекса даты в обратном порядке останавливается после limit строк
+        ("Последние транзакции с лимитом", lambda: db.iter_transactions(limit=1000), {'t'}, 50, False),
+
+        # Отчеты по всей истории: чтение всей таблицы или покрывающего индекса
+        ("Количество транзакций", db.count_transactions, {'transactions'}, 20, True),
+        ("Статистика по месяцам", db.get_monthly_statistics, set(), 300, True),
+        ("Доходы и расходы по месяцам", db.get_monthly_income_expense, set(), 300, True),
+        ("Отчет по дням за всю историю",
+         lambda: db.get_report(group_by='day'), {'main.transactions'}, 300, True),
+        ("Поиск групп дубликатов", db.find_duplicate_groups, set(), 300, True),
+        ("Описания для автодополнения", db.get_description_stats, {'main.transactions'}, 300, True),
+        ("Экспорт", db.iter_export_rows, {'main.transactions'}, 1500, True),
+        # Последней: удаляет категорию, с которой работают проверки выше. Переносит
+        # заметную долю транзакций с пересчетом отпечатков; индекс признаков читается целиком
+        ("Объединение категорий", lambda: db.merge_categories(category_id, other_id),
+         {'category_tokens'}, 1500, True),
+    ]
+
+
+def check_archive_edits(verbose: bool = False) -> List[str]:
+    """Правки архивных транзакций меняют отметку состояния данных.
+
+    Кэши отчетов, графиков и снимок первого экрана сбрасываются по отметке:
+    если правка строки архивного года ее не меняет, они показывают прежние данные.
+    """
+    year = date.today().year - 4
+    db.archive_year(year)
+    query = ReportQuery.for_year(year, group_by='total')
+    reports = ReportService()
+    reports.run(query)
+    # Расходная транзакция: ее сумма входит в отчет по расходам
+    trans_id = db._connection.execute(
+        f"""SELECT MIN(t.id) FROM {db._archive_schema(year)}.transactions t
+            JOIN categories c ON t.category_id = c.id WHERE c.type = 'expense'""").fetchone()[0]
+    edits = [
+        ("Изменение суммы архивной транзакции", lambda: db.update_transaction_amount(trans_id, 999999.0)),
+        ("Пачка правок архивной транзакции",
+         lambda: db.apply_transaction_edits([(trans_id, 'amount', 999999.0, 1.0),
+                                             (trans_id, 'description', None, "Архивная правка")])),
+        ("Удаление архивной транзакции", lambda: db.delete_transaction(trans_id)),
+    ]
+    # Поиск дубликата при импорте и вводе идет по индексам основной базы и архива
+    errors = run_check("Поиск дубликата с архивом",
+                       lambda: db.count_duplicates(100, db.get_all_categories()[0][0], f"{year:04d}-06-01", "Кофе"),
+                       set(), 5, False, 0, verbose)
+    # Повтор архивной транзакции, добавленный в основную базу, входит в одну группу с ней
+    amount, category, day, description, currency = db._connection.execute(
+        f"""SELECT amount, category_id, date, description, currency
+            FROM {db._archive_schema(year)}.transactions WHERE id = ?""", (trans_id,)).fetchone()
+    db.add_transaction(amount, category, day, description, None, currency)
+    errors.extend(run_check("Поиск групп дубликатов с архивом", db.find_duplicate_groups,
+                            set(), 300, False, 0, verbose))
+    if not any(len(group) > 1 and trans_id in [row[0] for row in group] for group in db.find_duplicate_groups()):
+        errors.append("Поиск групп дубликатов с архивом: повтор архивной транзакции не найден")
+    for name, edit in edits:
+        stamp = db.get_data_stamp()
+        edit()
+        stale = []
+        if db.get_data_stamp() == stamp:
+            stale.append("отметка состояния данных не изменилась")
+        if reports.run(query) != db.get_report(query.start, query.end, group_by='total'):
+            stale.append("отчет из кэша устарел")
+        errors.extend(f"{name}: {problem}" for problem in stale)
+        print(f"{'ОШИБКА' if stale else 'OK':6} {name}")
+    return errors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Проверка планов запросов на синтетической базе")
+    parser.add_argument("--rows", type=int, default=100000, help="Количество синтетических транзакций")
+    parser.add_argument("--verbose", action="store_true", help="Печатать запросы и их планы")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Создание базы из {args.rows} транзакций...")
+        build_database(os.path.join(directory, "check.db"), args.rows)
+        errors = []
+        try:
+            for name, func, allowed_scans, budget_ms, scaled in build_checks(args.rows):
+                errors.extend(run_check(name, func, allowed_scans, budget_ms, scaled, args.rows, args.verbose))
+            errors.extend(check_archive_edits(args.verbose))
+        finally:
+            db.close_connection()
+
+    for error in errors:
+        print(error)
+    print("Все запросы используют индексы" if not errors else f"Нарушений: {len(errors)}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
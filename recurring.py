@@ -0,0 +1,97 @@
+# recurring.py - Генерация регулярных транзакций по правилам
+
+import calendar
+from datetime import date, timedelta
+from typing import List, Optional
+import database as db
+
+FREQUENCIES = {
+    'daily': "Ежедневно",
+    'weekly': "Еженедельно",
+    'monthly': "Ежемесячно",
+    'yearly': "Ежегодно",
+}
+
+
+def _add_months(start: date, months: int) -> date:
+    """Сдвиг даты на months месяцев; число месяца ограничивается его длиной"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def occurrence(frequency: str, start: date, number: int) -> date:
+    """Дата number-го повторения правила (0 - дата начала)"""
+    if frequency == 'daily':
+        return start + timedelta(days=number)
+    if frequency == 'weekly':
+        return start + timedelta(weeks=number)
+    if frequency == 'monthly':
+        return _add_months(start, number)
+    if frequency == 'yearly':
+        return _add_months(start, 12 * number)
+    raise ValueError(f"Неизвестная периодичность: {frequency}")
+
+
+def _periods_between(frequency: str, start: date, end: date) -> int:
+    """Примерное число периодов между двумя датами (не больше точного)"""
+    if frequency == 'daily':
+        return (end - start).days
+    if frequency == 'weekly':
+        return (end - start).days // 7
+    if frequency == 'monthly':
+        return (end.year - start.year) * 12 + end.month - start.month
+    if frequency == 'yearly':
+        return end.year - start.year
+    raise ValueError(f"Неизвестная периодичность: {frequency}")
+
+
+def due_occurrences(frequency: str, start_date: str, last_generated: Optional[str],
+                    until: date, end_date: Optional[str] = None) -> List[date]:
+    """Даты повторений после last_generated и не позже until/end_date"""
+    start = date.fromisoformat(start_date)
+    limit = until
+    if end_date:
+        limit = min(limit, date.fromisoformat(end_date))
+    after = date.fromisoformat(last_generated) if last_generated else None
+
+    result = []
+    # Начинаем сразу с периода, предшествующего последнему сгенерированному
+    number = _periods_between(frequency, start, after) - 1 if after else 0
+    number = max(number, 0)
+    while True:
+        current = occurrence(frequency, start, number)
+        if current > limit:
+            break
+        if after is None or current > after:
+            result.append(current)
+        number += 1
+    return result
+
+
+def generate_due_transactions(today: Optional[date] = None) -> int:
+    """Создание всех наступивших транзакций по активным правилам.
+
+    Все пропущенные периоды (например, после долгого перерыва) вставляются
+    одной транзакцией БД. Повторный запуск ничего не дублирует: период
+    правила уникален в таблице транзакций.
+    Возвращает количество добавленных транзакций.
+    """
+    today = today or date.today()
+    rows = []
+    last_generated = []
+    for rule in db.get_recurring_rules(active_only=True):
+        rule_id, amount, category_id, description, frequency, start_date, end_date, last, _ = rule
+        dates = due_occurrences(frequency, start_date, last, today, end_date)
+        if not dates:
+            continue
+        for current in dates:
+            period = current.isoformat()
+            rows.append((amount, category_id, period, description or "", rule_id, period))
+        last_generated.append((dates[-1].isoformat(), rule_id))
+
+    if not rows:
+        return 0
+    return db.insert_recurring_transactions(rows, last_generated)
@@ -0,0 +1,113 @@
+# reports.py - Отчеты по транзакциям с кэшем результатов до изменения данных
+
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import database as db
+
+# Сколько результатов отчетов хранить в памяти
+CACHE_SIZE = 128
+
+GROUPINGS = ('total', 'category', 'year', 'month', 'day')
+METRICS = ('total', 'count', 'average')
+
+
+class ReportQuery(NamedTuple):
+    """Параметры отчета: период [start, end), категории (None - все категории типа),
+    группировка строк и показатель. Неизменяемый и хешируемый - служит ключом кэша"""
+    start: Optional[str] = None
+    end: Optional[str] = None
+    category_ids: Optional[Tuple[int, ...]] = None
+    group_by: str = 'category'
+    metric: str = 'total'
+    category_type: str = 'expense'
+
+    @classmethod
+    def for_year(cls, year: Optional[int], **kwargs) -> "ReportQuery":
+        """Отчет за календарный год (None - за всю историю)"""
+        if year is None:
+            return cls(**kwargs)
+        return cls(f"{year:04d}-01-01", f"{year + 1:04d}-01-01", **kwargs)
+
+    @classmethod
+    def for_month(cls, year: int, month: int, **kwargs) -> "ReportQuery":
+        return cls(*db.get_month_range(year, month), **kwargs)
+
+    def normalized(self) -> "ReportQuery":
+        """Проверенный запрос с упорядоченным набором категорий: равные запросы - равные ключи"""
+        if self.group_by not in GROUPINGS:
+            raise ValueError(f"Неизвестная группировка отчета: {self.group_by}")
+        if self.metric not in METRICS:
+            raise ValueError(f"Неизвестный показатель отчета: {self.metric}")
+        if self.category_ids is None:
+            return self
+        return self._replace(category_ids=tuple(sorted(set(self.category_ids))))
+
+
+class ReportCacheStats(NamedTuple):
+    """Счетчики кэша отчетов"""
+    hits: int
+    misses: int
+    # Сброшено результатов из-за изменения данных и вытеснено по размеру кэша
+    invalidated: int
+    evicted: int
+    size: int
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ReportService:
+    """Отчеты с LRU-кэшем результатов.
+
+    Ключ кэша - запрос и отметка состояния данных (get_data_stamp: последняя
+    запись журнала изменений и сводка курсов валют). Пока данные не меняются,
+    повторный показ того же отчета не обращается к базе, кроме чтения отметки;
+    после изменения результаты прежней версии сбрасываются при первом обращении.
+    """
+
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.capacity = capacity
+        self._cache: "OrderedDict[Tuple, List[Tuple]]" = OrderedDict()
+        self._stamp: Optional[Tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evicted = 0
+
+    def run(self, query: ReportQuery) -> List[Tuple]:
+        """Строки отчета (ключ, подпись, значение) из кэша или из базы.
+
+        Список общий для всех вызывающих с тем же запросом - его нельзя изменять.
+        """
+        query = query.normalized()
+        stamp = tuple(db.get_data_stamp())
+        if stamp != self._stamp:
+            self.invalidated += len(self._cache)
+            self._cache.clear()
+            self._stamp = stamp
+        key = (query, stamp)
+        rows = self._cache.get(key)
+        if rows is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return rows
+        self.misses += 1
+        rows = db.get_report(query.start, query.end, query.category_ids, query.group_by,
+                             query.metric, query.category_type)
+        self._cache[key] = rows
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evicted += 1
+        return rows
+
+    def totals(self, query: ReportQuery) -> Dict:
+        """Отчет как словарь ключ -> значение"""
+        return {key: value for key, _, value in self.run(query)}
+
+    def stats(self) -> ReportCacheStats:
+        return ReportCacheStats(self.hits, self.misses, self.invalidated, self.evicted, len(self._cache))
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._stamp = None
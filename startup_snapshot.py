@@ -0,0 +1,146 @@
+# startup_snapshot.py - Снимок первого экрана для мгновенного запуска
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from PyQt6 import QtCore
+import database as db
+from transaction_store import TransactionStore
+
+# Формат файла снимка; снимок другой версии не читается
+SNAPSHOT_VERSION = 1
+# Сколько самых новых транзакций сохраняется для первого экрана
+PAGE_ROWS = 200
+
+
+class StartupSnapshot(NamedTuple):
+    """Данные первого экрана на момент закрытия приложения"""
+    # Отметка состояния базы (get_data_stamp), которой соответствуют данные
+    stamp: list
+    # Самые новые транзакции (в порядке ID) и общее их количество в основной базе
+    rows: List[Tuple]
+    row_count: int
+    categories: List[Tuple]
+    statistics: List[Tuple]
+
+    def is_complete(self) -> bool:
+        """В снимке все транзакции основной базы"""
+        return self.row_count <= len(self.rows)
+
+
+def snapshot_path() -> Optional[str]:
+    """Файл снимка рядом с файлом базы (None при работе через сервер API)"""
+    db_file = db.get_database_file()
+    if db_file is None:
+        return None
+    base, _ = os.path.splitext(db_file)
+    return f"{base}.snapshot.json"
+
+
+def load_snapshot(path: str) -> Optional[StartupSnapshot]:
+    """Чтение снимка; None, если файла нет, он поврежден или от другой базы"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get('version') != SNAPSHOT_VERSION or data.get('database') != db.get_database_file():
+            return None
+        return StartupSnapshot(
+            data['stamp'],
+            [tuple(row) for row in data['rows']],
+            data['row_count'],
+            [tuple(row) for row in data['categories']],
+            [tuple(row) for row in data['statistics']],
+        )
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Снимок первого экрана не прочитан: {str(e)}")
+        return None
+
+
+def save_snapshot(path: str, stamp: list, categories: List[Tuple], statistics: List[Tuple]) -> None:
+    """Запись снимка: самые новые транзакции читаются по индексу даты.
+
+    stamp - отметка, при которой была рассчитана статистика. Если с тех пор
+    база изменилась, снимок при следующем запуске окажется устаревшим
+    и будет обновлен, поэтому более новые строки и категории ему не вредят.
+    Файл заменяется целиком, так что оборванная запись не портит прежний снимок.
+    """
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'database': db.get_database_file(),
+        'stamp': stamp,
+        'rows': list(db.iter_transactions(limit=PAGE_ROWS)),
+        'row_count': db.count_transactions(),
+        'categories': categories,
+        'statistics': statistics,
+    }
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Ошибка записи снимка первого экрана: {str(e)}")
+
+
+def _read_store(limit: int) -> Tuple[TransactionStore, int, bool]:
+    """Загрузка транзакций отдельным соединением (вызывается в рабочем потоке).
+
+    Номер записи журнала читается до строк: изменения, попавшие между ними,
+    будут прочитаны из журнала повторно, что для хранилища безвредно.
+    """
+    connection = db.open_reader_connection()
+    try:
+        with db.using_connection(connection):
+            seq = db.get_last_change_seq()
+            partial = db.count_transactions() > limit
+            rows = db.iter_transactions(limit=limit) if partial else db.iter_transactions()
+            return TransactionStore(rows), seq, partial
+    finally:
+        connection.close()
+
+
+class TransactionLoader(QtCore.QObject):
+    """Загрузка всех транзакций в хранилище в фоновом потоке.
+
+    Пока окно показывает снимок, полный набор строк читается и раскладывается
+    по колонкам вне потока интерфейса.
+    """
+
+    # Хранилище, номер записи журнала, по которую оно загружено, и признак частичной загрузки
+    loaded = QtCore.pyqtSignal(object, int, bool)
+    # Загрузка не удалась (текст ошибки)
+    failed = QtCore.pyqtSignal(str)
+    # Внутренний сигнал из рабочего потока: доставляется в поток интерфейса
+    _done = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transactions")
+        self._done.connect(self._on_done)
+
+    def load(self, limit: int) -> None:
+        future = self._executor.submit(_read_store, limit)
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future) -> None:
+        """Завершение загрузки (вызывается в рабочем потоке)"""
+        try:
+            self._done.emit(future.result(), None)
+        except Exception as e:
+            self._done.emit(None, str(e))
+
+    def _on_done(self, result, error) -> None:
+        if result is None:
+            self.failed.emit(error)
+        else:
+            self.loaded.emit(*result)
+
+    def wait(self) -> None:
+        """Ожидание начатой загрузки: ее соединение закрывается до замены файла базы"""
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,242 @@
+# transaction_store.py - Компактное колоночное хранилище транзакций в памяти
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+from database import BASE_CURRENCY
+
+
+def date_to_int(date: str) -> int:
+    """Преобразование даты 'yyyy-MM-dd' в число yyyymmdd"""
+    try:
+        return int(date[0:4]) * 10000 + int(date[5:7]) * 100 + int(date[8:10])
+    except (TypeError, ValueError):
+        return 0
+
+
+def int_to_date(value: int) -> str:
+    """Преобразование числа yyyymmdd обратно в дату 'yyyy-MM-dd'"""
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+def amount_to_cents(amount) -> int:
+    """Сумма в копейках (целое число)"""
+    try:
+        return int(round(float(amount) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TransactionFilter:
+    """Условия фильтрации транзакций: период [start_date, end_date), категории, наличие чека"""
+
+    __slots__ = ('start_date', 'end_date', 'category_ids', 'has_receipt')
+
+    def __init__(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 category_ids: Optional[Iterable[int]] = None, has_receipt: Optional[bool] = None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.category_ids = frozenset(category_ids) if category_ids else None
+        self.has_receipt = has_receipt
+
+    def is_empty(self) -> bool:
+        return (not self.start_date and not self.end_date
+                and not self.category_ids and self.has_receipt is None)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TransactionFilter) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+
+class TransactionStore:
+    """Колоночное хранилище транзакций.
+
+    Строки хранятся в порядке возрастания ID в массивах array: ID, даты (yyyymmdd),
+    суммы (в копейках) и ID категорий. Описания лежат одним блоком UTF-8 со
+    смещениями и превращаются в строки только при обращении. Пути к чекам
+    и валюты хранятся в словарях только для транзакций, у которых чек есть
+    или валюта отличается от базовой.
+    """
+
+    __slots__ = ('ids', 'dates', 'amounts', 'category_ids',
+                 '_descriptions', '_offsets', '_edited_descriptions', 'receipts', 'currencies', 'version')
+
+    def __init__(self, rows: Iterable[Tuple] = ()):
+        self.ids = array('q')
+        self.dates = array('i')
+        self.amounts = array('q')
+        self.category_ids = array('i')
+        self._descriptions = bytearray()
+        self._offsets = array('I', [0])
+        self._edited_descriptions: Dict[int, str] = {}
+        self.receipts: Dict[int, str] = {}
+        self.currencies: Dict[int, str] = {}
+        # Счетчик изменений: по нему сбрасываются закэшированные ключи сортировки
+        self.version = 0
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extend(self, rows: Iterable[Tuple]) -> None:
+        """Добавление строк (id, amount, category_id, date, description, receipt_path, currency)"""
+        self.version += 1
+        for trans_id, amount, category_id, date, description, receipt_path, currency in rows:
+            if self.ids and trans_id <= self.ids[-1]:
+                # Строка не по порядку ID - вставляем через общий путь
+                self.upsert((trans_id, amount, category_id, date, description, receipt_path, currency))
+                continue
+            self.ids.append(trans_id)
+            self.dates.append(date_to_int(date))
+            self.amounts.append(amount_to_cents(amount))
+            self.category_ids.append(category_id)
+            self._descriptions += (description or "").encode('utf-8')
+            self._offsets.append(len(self._descriptions))
+            if receipt_path:
+                self.receipts[trans_id] = receipt_path
+            if currency and currency != BASE_CURRENCY:
+                self.currencies[trans_id] = currency
+
+    def position(self, transaction_id: int) -> int:
+        """Позиция транзакции в хранилище или -1"""
+        pos = bisect_left(self.ids, transaction_id)
+        if pos < len(self.ids) and self.ids[pos] == transaction_id:
+            return pos
+        return -1
+
+    def date(self, pos: int) -> str:
+        return int_to_date(self.dates[pos])
+
+    def amount(self, pos: int) -> float:
+        return self.amounts[pos] / 100
+
+    def description(self, pos: int) -> str:
+        """Описание транзакции; строка создается только при обращении"""
+        edited = self._edited_descriptions.get(pos)
+        if edited is not None:
+            return edited
+        return self._descriptions[self._offsets[pos]:self._offsets[pos + 1]].decode('utf-8')
+
+    def receipt_path(self, pos: int) -> Optional[str]:
+        return self.receipts.get(self.ids[pos])
+
+    def currency(self, pos: int) -> str:
+        return self.currencies.get(self.ids[pos], BASE_CURRENCY)
+
+    def set_date(self, pos: int, date: str) -> None:
+        self.version += 1
+        self.dates[pos] = date_to_int(date)
+
+    def set_amount(self, pos: int, amount: float) -> None:
+        self.version += 1
+        self.amounts[pos] = amount_to_cents(amount)
+
+    def set_category(self, pos: int, category_id: int) -> None:
+        self.version += 1
+        self.category_ids[pos] = category_id
+
+    def set_description(self, pos: int, description: str) -> None:
+        self.version += 1
+        self._edited_descriptions[pos] = description or ""
+
+    def set_receipt(self, pos: int, receipt_path: Optional[str]) -> None:
+        self.version += 1
+        if receipt_path:
+            self.receipts[self.ids[pos]] = receipt_path
+        else:
+            self.receipts.pop(self.ids[pos], None)
+
+    def upsert(self, row: Tuple) -> int:
+        """Вставка или обновление одной строки с сохранением порядка ID"""
+        trans_id, amount, category_id, date, description, receipt_path, currency = row
+        pos = self.position(trans_id)
+        if pos < 0:
+            pos = bisect_left(self.ids, trans_id)
+            if pos == len(self.ids):
+                self.extend([row])
+                return pos
+            # Вставка в середину: сдвигаем колонки и перестраиваем блок описаний
+            descriptions = [self.description(i) for i in range(len(self.ids))]
+            self.ids.insert(pos, trans_id)
+            self.dates.insert(pos, 0)
+            self.amounts.insert(pos, 0)
+            self.category_ids.insert(pos, 0)
+            descriptions.insert(pos, "")
+            self._pack_descriptions(descriptions)
+        self.dates[pos] = date_to_int(date)
+        self.amounts[pos] = amount_to_cents(amount)
+        self.category_ids[pos] = category_id
+        self.set_description(pos, description)
+        self.set_receipt(pos, receipt_path)
+        if currency and currency != BASE_CURRENCY:
+            self.currencies[trans_id] = currency
+        else:
+            self.currencies.pop(trans_id, None)
+        return pos
+
+    def remove(self, transaction_ids: Iterable[int]) -> None:
+        """Удаление транзакций по ID"""
+        doomed = {pos for pos in map(self.position, transaction_ids) if pos >= 0}
+        if not doomed:
+            return
+        self.version += 1
+        keep = [pos for pos in range(len(self.ids)) if pos not in doomed]
+        descriptions = [self.description(pos) for pos in keep]
+        for trans_id in (self.ids[pos] for pos in doomed):
+            self.receipts.pop(trans_id, None)
+            self.currencies.pop(trans_id, None)
+        self.ids = array('q', (self.ids[pos] for pos in keep))
+        self.dates = array('i', (self.dates[pos] for pos in keep))
+        self.amounts = array('q', (self.amounts[pos] for pos in keep))
+        self.category_ids = array('i', (self.category_ids[pos] for pos in keep))
+        self._pack_descriptions(descriptions)
+
+    def _pack_descriptions(self, descriptions) -> None:
+        """Повторная упаковка описаний в один блок"""
+        self._descriptions = bytearray()
+        self._offsets = array('I', [0])
+        self._edited_descriptions = {}
+        for description in descriptions:
+            self._descriptions += description.encode('utf-8')
+            self._offsets.append(len(self._descriptions))
+
+    def sorted_positions(self, column: array, descending: bool = False,
+                         positions: Optional[array] = None) -> array:
+        """Позиции, упорядоченные по числовой колонке (даты, суммы, категории)"""
+        if positions is None:
+            # Обратный порядок ID при равных ключах, как у последних добавленных
+            positions = range(len(self.ids) - 1, -1, -1) if descending else range(len(self.ids))
+        return array('i', sorted(positions, key=column.__getitem__, reverse=descending))
+
+    def filter_positions(self, flt: TransactionFilter, positions: Optional[Iterable[int]] = None) -> array:
+        """Позиции транзакций, удовлетворяющих фильтру; каждое условие - один проход по колонке"""
+        result = array('i', positions if positions is not None else range(len(self.ids)))
+        if flt.start_date or flt.end_date:
+            dates = self.dates
+            low = date_to_int(flt.start_date) if flt.start_date else 0
+            high = date_to_int(flt.end_date) if flt.end_date else 99999999
+            result = array('i', [pos for pos in result if low <= dates[pos] < high])
+        if flt.category_ids:
+            category_ids = self.category_ids
+            wanted = flt.category_ids
+            result = array('i', [pos for pos in result if category_ids[pos] in wanted])
+        if flt.has_receipt is not None:
+            ids = self.ids
+            receipts = self.receipts
+            has_receipt = flt.has_receipt
+            result = array('i', [pos for pos in result if (ids[pos] in receipts) == has_receipt])
+        return result
+
+    def description_ranks(self) -> array:
+        """Ранг описания каждой позиции в алфавитном порядке (без учета регистра)"""
+        ordered = sorted(range(len(self.ids)), key=lambda pos: self.description(pos).casefold())
+        ranks = array('i', bytes(4 * len(ordered)))
+        for rank, pos in enumerate(ordered):
+            ranks[pos] = rank
+        return ranks
+
+    def receipt_flags(self) -> array:
+        """Признак наличия чека для каждой позиции (0 или 1)"""
+        receipts = self.receipts
+        return array('b', [trans_id in receipts for trans_id in self.ids])
@@ -39,13 +39,11 @@ class Ui_MainWindow(object):
         
         self.verticalLayout.addLayout(self.controlsLayout)
         
-        # Table widget
-        self.tableWidget = QtWidgets.QTableWidget(self.centralwidget)
-        self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(4)
-        self.tableWidget.setHorizontalHeaderLabels(["Дата", "Категория", "Сумма", "Описание"])
-        self.tableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
-        self.verticalLayout.addWidget(self.tableWidget)
+        # Table view
+        self.tableView = QtWidgets.QTableView(self.centralwidget)
+        self.tableView.setObjectName("tableView")
+        self.tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.verticalLayout.addWidget(self.tableView)
         
         # Chart widget
         self.chartWidget = QtWidgets.QWidget(self.centralwidget)